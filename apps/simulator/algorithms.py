@@ -1,19 +1,33 @@
+import heapq
+import warnings
 import numpy as np
-from scipy.cluster.hierarchy import dendrogram, linkage, fcluster
-from scipy.spatial.distance import pdist, cdist
+from scipy.cluster.hierarchy import fcluster
+from scipy.linalg import eigh
+from scipy.spatial import cKDTree
+from scipy.sparse import coo_matrix, diags, identity
+from scipy.sparse.csgraph import connected_components
+from scipy.sparse.linalg import eigsh, lobpcg
+
+from . import jit
+from .birch import DEFAULT_BRANCHING, DEFAULT_MAX_SUBCLUSTERS, birch_precluster, grow_cf_tree
+from .distances import as_compute, nearest, paired_sq_distances, radius_sums, radius_threshold, within_radius
+from .hierarchy import DENDROGRAM_LEAVES, build_linkage, dendrogram_lod
+from .history import HistoryRecorder
+from .mixture import e_step, ellipse_axes, full_covariances, m_step
+from .parallel import parallel_map
 
 def normalize_points(points):
     """
     Convert points from list of dicts [{'x': 1, 'y': 2}] or list of lists 
     to numpy array [[1, 2]].
     """
-    if not points:
-        return np.array([])
-    
     # If already numpy array, just return
     if isinstance(points, np.ndarray):
         return points
 
+    if not points:
+        return np.array([])
+
     # Check first element to see format
     first = points[0]
     if isinstance(first, dict) and 'x' in first and 'y' in first:
@@ -23,62 +37,353 @@ def normalize_points(points):
     
     return np.array(points)
 
-def kmeans_step(points, k):
+
+# Iteration caps of the iterative engines
+KMEANS_MAX_ITERS = 100
+MEAN_SHIFT_MAX_ITERS = 100
+GMM_MAX_ITERS = 100
+
+# Points visited between progress reports inside a DBSCAN cluster expansion
+DBSCAN_PROGRESS_EVERY = 1000
+
+# Per-step fields each stepping algorithm yields (HistoryRecorder layout)
+STEP_FIELDS = {
+    'kmeans': {'centroids': True, 'scalars': {'inertia': float}},
+    'dbscan': {'scalars': {'current': int}, 'index_lists': ('neighbors',)},
+    'forel': {'scalars': {'radius': float}, 'points': ('center',), 'index_lists': ('active_indices',)},
+    'agglomerative': {},
+    'meanshift': {'centroids': True},
+    'birch': {'centroids': True, 'scalars': {'threshold': float, 'subclusters': int}},
+    'spectral': {'centroids': True, 'scalars': {'embedding_inertia': float}, 'point_lists': ('embedding',)},
+    'gmm': {'centroids': True, 'scalars': {'log_likelihood': float}, 'point_lists': ('axes',),
+            'value_lists': ('confidence',)},
+}
+
+
+# Smallest accepted max_frames: room for two frames of one kind plus the final state
+MIN_FRAMES = 3
+
+
+def _thin_frames(recorder, frames, strides, budget):
+    """
+    Halve the frames of one kind (doubling its stride) until the recorder
+    has a slot left for the final state. Ordinary frames go first;
+    keyframes only once they fill more than half of the budget.
+    """
+    while len(frames) >= budget:
+        n_key = sum(key for key, _ in frames)
+        kind = (n_key > budget // 2 and n_key > 1) or len(frames) - n_key <= 1
+        strides[kind] *= 2
+        keep = [j for j, (key, ordinal) in enumerate(frames)
+                if key != kind or ordinal % strides[kind] == 0]
+        recorder.select(keep)
+        frames = [frames[j] for j in keep]
+    return frames
+
+
+def run_steps(algorithm, points, steps, max_steps=None, every=1, final_only=False, max_frames=None,
+              progress=None):
+    """
+    Drain a step generator into a ``HistoryRecorder``.
+
+    ``max_steps`` stops the algorithm early (the generator is closed, so no
+    further work is done); ``every`` keeps every n-th step; ``final_only``
+    records just the last one. The last step produced is always kept.
+
+    ``max_frames`` bounds the recorded steps whatever the run length. Steps
+    flagged ``keyframe`` (a finished cluster) are kept in preference to
+    ordinary ones; each kind is thinned to every n-th step, with n doubling
+    whenever the budget fills up, so the kept frames stay evenly spread.
+
+    ``progress(i, step)`` is called for every step produced (see
+    ``progress.ProgressReporter``, which throttles what it publishes).
+
+    Generators yield live arrays that they keep mutating, so each step is
+    copied into the recorder before the generator is advanced; a skipped
+    step is only recorded at the end if it turns out to be the last one,
+    at which point its arrays no longer change.
+    """
     X = normalize_points(points)
+    n_features = X.shape[1] if X.ndim == 2 else 2
+    recorder = HistoryRecorder(len(X), n_features, **STEP_FIELDS[algorithm])
+    every = max(1, int(every))
+    budget = None if max_frames is None else max(MIN_FRAMES, int(max_frames))
+    # (is keyframe, ordinal within its kind) per recorded step; a step is
+    # kept while its ordinal is a multiple of its kind's stride
+    frames, strides, seen = [], {False: 1, True: 1}, {False: 0, True: 0}
+
+    last, last_recorded = None, True
+    for i, step in enumerate(steps):
+        if max_steps is not None and i >= max_steps:
+            steps.close()
+            break
+        last = step
+        if progress is not None:
+            progress(i, step)
+        last_recorded = not final_only and i % every == 0
+        if last_recorded and budget is not None:
+            kind = bool(step.get('keyframe'))
+            frame = (kind, seen[kind])
+            seen[kind] += 1
+            last_recorded = frame[1] % strides[kind] == 0
+        if last_recorded:
+            recorder.record(**step)
+            if budget is not None:
+                frames = _thin_frames(recorder, frames + [frame], strides, budget)
+                last_recorded = bool(frames) and frames[-1] == frame
+
+    if last is not None and not last_recorded:
+        recorder.record(**last)
+    return recorder
+
+
+def make_steps(algorithm, points, params, seed=None, init=None, Z=None, progress=None):
+    """
+    Step generator for an algorithm with request-style params (``k``,
+    ``eps``, ``minPts``, ``radius``, ``linkage``, ``bandwidth``,
+    ``threshold``, ``branching``, ``maxSubclusters``, ``precluster``,
+    ``neighbors``, ``covariance``, ``init``, ``tol``, ``soft``), or
+    None if the algorithm is unknown. ``init`` warm-starts K-Means from
+    earlier centroids; ``Z`` is a precomputed linkage for agglomerative;
+    ``progress`` receives DBSCAN's visited count during cluster expansion.
+    """
+    if algorithm == 'kmeans':
+        k = int(params.get('k', 3))
+        return iter_kmeans(points, k, seed, init=init)
+    elif algorithm == 'dbscan':
+        eps = float(params.get('eps', 0.5))
+        min_pts = int(params.get('minPts', 3))
+        return iter_dbscan(points, eps, min_pts, progress=progress)
+    elif algorithm == 'forel':
+        r = float(params.get('radius', 1.0))
+        return iter_forel(points, r, seed)
+    elif algorithm == 'agglomerative':
+        k = int(params.get('k', 2))
+        method = params.get('linkage', 'ward')
+        return iter_agglomerative(points, k, method, Z=Z, precluster=params.get('precluster'))
+    elif algorithm == 'meanshift':
+        bandwidth = params.get('bandwidth', 1.0)
+        bandwidth = estimate_bandwidth(points) if bandwidth == 'auto' else float(bandwidth)
+        return iter_mean_shift(points, bandwidth, precluster=params.get('precluster'))
+    elif algorithm == 'birch':
+        k = params.get('k', 3)
+        return iter_birch(
+            points, float(params.get('threshold', 0.0)), None if k is None else int(k),
+            int(params.get('branching', DEFAULT_BRANCHING)),
+            int(params.get('maxSubclusters', DEFAULT_MAX_SUBCLUSTERS)),
+        )
+    elif algorithm == 'spectral':
+        k = int(params.get('k', 2))
+        return iter_spectral(points, k, int(params.get('neighbors', SPECTRAL_NEIGHBORS)), seed)
+    elif algorithm == 'gmm':
+        k = int(params.get('k', 3))
+        return iter_gmm(
+            points, k, params.get('covariance', 'full'), params.get('init', 'kmeans'),
+            float(params.get('tol', GMM_TOL)), bool(params.get('soft', False)), seed,
+        )
+    return None
+
+
+def iter_kmeans(points, k, seed=None, init=None):
+    """
+    K-Means steps, yielded lazily (see ``run_steps``). ``init`` warm-starts
+    from given centroids (e.g. the previous run's) instead of random points.
+    """
+    X = as_compute(normalize_points(points))
     if len(X) < k:
-        return []
+        return
     
-    # Randomly initialize centroids
-    indices = np.random.choice(len(X), k, replace=False)
-    centroids = X[indices]
+    if init is not None:
+        centroids = np.asarray(init, dtype=X.dtype).reshape(k, X.shape[1])
+    else:
+        # Randomly initialize centroids
+        indices = np.random.default_rng(seed).choice(len(X), k, replace=False)
+        centroids = X[indices]
     
-    history = []
-    max_iters = 100
+    shift = None
     
-    for _ in range(max_iters):
-        # Calculate distances
-        distances = np.linalg.norm(X[:, np.newaxis] - centroids, axis=2)
-        labels = np.argmin(distances, axis=1)
+    for _ in range(KMEANS_MAX_ITERS):
+        # Nearest centroid; inertia comes for free from the assignment distances
+        labels, sq = nearest(X, centroids)
+        inertia = float(sq.sum(dtype=np.float64))
         
-        step_data = {
-            'centroids': [{'x': c[0], 'y': c[1]} for c in centroids],
-            'labels': labels.tolist()
-        }
-        history.append(step_data)
+        # 'shift' / 'tolerance' (largest centroid move so far vs. the
+        # convergence bound) only feed progress estimates
+        yield {'labels': labels, 'centroids': centroids, 'inertia': inertia,
+               'shift': shift, 'tolerance': 1e-5 * float(np.abs(centroids).max())}
         
-        new_centroids = np.array([X[labels == i].mean(axis=0) if np.sum(labels == i) > 0 else centroids[i] for i in range(k)])
+        # Means are accumulated in float64 whatever the compute dtype
+        new_centroids = _cluster_means(X, labels, k, centroids)
         
         if np.allclose(centroids, new_centroids):
             break
             
+        shift = float(np.abs(new_centroids - centroids).max())
         centroids = new_centroids
-        
-    return history
 
-def dbscan_step(points, eps, min_pts):
-    X = normalize_points(points)
+
+def kmeans_step(points, k, seed=None):
+    return run_steps('kmeans', points, iter_kmeans(points, k, seed)).to_list()
+
+def _assign(X, centroids):
+    """Nearest centroid for every point and the squared distance to it."""
+    return nearest(X, centroids)
+
+
+def _cluster_means(X, labels, k, fallback):
+    """Per-cluster means (bincount sums in float64), ``fallback`` rows for empty clusters."""
+    counts = np.bincount(labels, minlength=k)
+    sums = np.stack([np.bincount(labels, weights=X[:, j], minlength=k) for j in range(X.shape[1])], axis=1)
+    means = fallback.copy()
+    nonempty = counts > 0
+    means[nonempty] = sums[nonempty] / counts[nonempty, np.newaxis]
+    return means
+
+
+def kmeans_plus_plus(sample, k, rng):
+    """k-means++ seeding: each next center is drawn with probability ~ D(x)^2."""
+    centers = [sample[rng.integers(len(sample))]]
+    closest = np.sum((sample - centers[0]) ** 2, axis=1)
+    for _ in range(1, k):
+        total = closest.sum()
+        i = rng.choice(len(sample), p=closest / total) if total > 0 else rng.integers(len(sample))
+        centers.append(sample[i])
+        closest = np.minimum(closest, np.sum((sample - sample[i]) ** 2, axis=1))
+    return np.array(centers)
+
+
+def _lloyd(X, centroids, max_iters=100, tol=1e-4):
+    """
+    Plain Lloyd iterations from the given centroids; returns (centroids,
+    labels, inertia). ``tol`` is relative to the data variance, as in
+    scikit-learn.
+    """
+    tol = tol * np.mean(np.var(X, axis=0, dtype=np.float64))
+    centroids = np.asarray(centroids, dtype=X.dtype)
+    for _ in range(max_iters):
+        labels, sq = _assign(X, centroids)
+        new_centroids = _cluster_means(X, labels, len(centroids), centroids)
+        shift = np.sum((new_centroids - centroids) ** 2)
+        centroids = new_centroids
+        if shift <= tol:
+            break
+    labels, sq = _assign(X, centroids)
+    return centroids, labels, float(sq.sum(dtype=np.float64))
+
+
+def _split_largest(X, centroids, labels):
+    """
+    Warm start for k+1 clusters: replace the cluster with the largest SSE by
+    two centroids placed along its principal axis.
+    """
+    k = len(centroids)
+    sq = paired_sq_distances(X, centroids[labels])
+    worst = int(np.argmax(np.bincount(labels, weights=sq, minlength=k)))
+    members = X[labels == worst]
+    if len(members) < 2:
+        far = X[np.argmax(sq)]
+        return np.vstack([centroids, far])
+    eigvals, eigvecs = np.linalg.eigh(np.cov(members, rowvar=False).reshape(X.shape[1], X.shape[1]))
+    # Offset of the two halves' means for a Gaussian cut through the center
+    delta = np.sqrt(2.0 * max(eigvals[-1], 0.0) / np.pi) * eigvecs[:, -1]
+    c = centroids[worst]
+    return np.vstack([np.delete(centroids, worst, axis=0), c - delta, c + delta])
+
+
+def _warm_started_inertias(X, k_max):
+    """Inertia for k = 1..k_max, each k seeded from the (k-1)-solution."""
+    centroids = X.mean(axis=0, keepdims=True, dtype=np.float64)
+    centroids, labels, inertia = _lloyd(X, centroids)
+    inertias = [inertia]
+    for _ in range(2, k_max + 1):
+        centroids, labels, inertia = _lloyd(X, _split_largest(X, centroids, labels))
+        inertias.append(inertia)
+    return np.array(inertias)
+
+
+def _elbow_k(inertias):
+    """Knee of the inertia curve: the k farthest below the first-to-last chord."""
+    if len(inertias) < 3:
+        return len(inertias)
+    ks = np.arange(1, len(inertias) + 1)
+    chord = inertias[0] + (inertias[-1] - inertias[0]) * (ks - 1) / (len(ks) - 1)
+    return int(ks[np.argmax(chord - inertias)])
+
+
+def kmeans_elbow(points, k_max, gap_refs=0, seed=None):
+    """
+    Elbow analysis for K-Means over k = 1..k_max.
+
+    Each k is warm-started by splitting the worst cluster of the previous
+    solution, so the whole range costs little more than a few cold runs.
+    With ``gap_refs`` > 0 the gap statistic is computed against uniform
+    reference datasets drawn in the bounding box; the reference chains run
+    in parallel with the main one.
+    """
+    X = as_compute(normalize_points(points))
+    n = len(X)
+    k_max = max(1, min(int(k_max), n))
+    rng = np.random.default_rng(seed)
+
+    lo, hi = X.min(axis=0), X.max(axis=0)
+    datasets = [X] + [rng.uniform(lo, hi, size=X.shape).astype(X.dtype) for _ in range(gap_refs)]
+    curves = parallel_map(lambda D: _warm_started_inertias(D, k_max), datasets)
+    inertias = curves[0]
+
+    result = {
+        'k': list(range(1, k_max + 1)),
+        'inertia': inertias.tolist(),
+        'elbow_k': _elbow_k(inertias),
+    }
+
+    if gap_refs > 0:
+        tiny = np.finfo(float).tiny
+        log_w = np.log(np.maximum(inertias, tiny))
+        log_ref = np.log(np.maximum(np.array(curves[1:]), tiny))
+        gap = log_ref.mean(axis=0) - log_w
+        sd = log_ref.std(axis=0) * np.sqrt(1.0 + 1.0 / gap_refs)
+        # Smallest k with gap(k) >= gap(k+1) - sd(k+1)
+        ok = np.nonzero(gap[:-1] >= gap[1:] - sd[1:])[0]
+        result.update({
+            'gap': gap.tolist(),
+            'gap_sd': sd.tolist(),
+            'gap_k': int(ok[0] + 1) if len(ok) else k_max,
+        })
+
+    return result
+
+def iter_dbscan(points, eps, min_pts, progress=None):
+    """
+    DBSCAN steps: one per visited point plus one per completed cluster.
+
+    A cluster's expansion runs without yielding, so ``progress(visited)``,
+    if given, is called with the number of points visited so far every
+    ``DBSCAN_PROGRESS_EVERY`` points inside it.
+    """
+    X = as_compute(normalize_points(points))
     n = len(X)
     labels = -1 * np.ones(n, dtype=int)  # -1 = noise
     visited = np.zeros(n, dtype=bool)
+    n_visited = 0
     cluster_id = 0
-    history = []
 
     def get_neighbors(idx):
-        return np.where(np.linalg.norm(X - X[idx], axis=1) <= eps)[0]
+        return within_radius(X, X[idx], eps)
+
+    # Compiled expansion loop when Numba is available (same visiting order)
+    expand = jit.dbscan_expand if jit.enabled() else None
+    threshold = X.dtype.type(radius_threshold(eps, X.dtype))
 
     for i in range(n):
         if visited[i]:
             continue
             
         visited[i] = True
+        n_visited += 1
         neighbors = get_neighbors(i)
         
         # Snapshot for visualization (visiting point i)
-        history.append({
-            'labels': labels.tolist(),
-            'current': int(i),
-            'neighbors': neighbors.tolist()
-        })
+        yield {'labels': labels, 'current': i, 'neighbors': neighbors}
 
         if len(neighbors) < min_pts:
             labels[i] = -1 # Noise
@@ -87,11 +392,25 @@ def dbscan_step(points, eps, min_pts):
             seeds = list(neighbors)
             if i in seeds:
                 seeds.remove(i)
-            
+
+            if expand is not None:
+                # In chunks of DBSCAN_PROGRESS_EVERY visits, reporting between them
+                queue, head, tail = np.array(seeds, dtype=np.int64), 0, len(seeds)
+                while head < tail:
+                    queue, head, tail, visits = expand(X, threshold, min_pts, queue, head, tail, labels, visited,
+                                                       cluster_id, DBSCAN_PROGRESS_EVERY)
+                    n_visited += visits
+                    if progress is not None:
+                        progress(n_visited)
+                seeds = []
+
             while seeds:
                 curr_p = seeds.pop(0)
                 if not visited[curr_p]:
                     visited[curr_p] = True
+                    n_visited += 1
+                    if progress is not None and n_visited % DBSCAN_PROGRESS_EVERY == 0:
+                        progress(n_visited)
                     curr_neighbors = get_neighbors(curr_p)
                     if len(curr_neighbors) >= min_pts:
                         seeds.extend(curr_neighbors)
@@ -102,52 +421,370 @@ def dbscan_step(points, eps, min_pts):
             cluster_id += 1
             
             # Snapshot after forming a cluster
-            history.append({
-                'labels': labels.tolist(),
-                'current': None,
-                'neighbors': []
-            })
+            yield {'labels': labels, 'keyframe': True}
             
     # Final state
-    history.append({
-        'labels': labels.tolist(),
-        'current': None,
-        'neighbors': []
-    })
-    
-    return history
+    yield {'labels': labels}
+
+
+def dbscan_step(points, eps, min_pts):
+    return run_steps('dbscan', points, iter_dbscan(points, eps, min_pts)).to_list()
+
+def _relabel_by_first_index(labels):
+    """Renumber clusters 0..k-1 in order of their lowest point index (noise stays -1)."""
+    mask = labels >= 0
+    if not mask.any():
+        return labels
+    uniq, first = np.unique(labels[mask], return_index=True)
+    order = np.empty(len(uniq), dtype=int)
+    order[np.argsort(first)] = np.arange(len(uniq))
+    out = -1 * np.ones_like(labels)
+    out[mask] = order[np.searchsorted(uniq, labels[mask])]
+    return out
+
+
+def _dbscan_from_graph(n, pairs, pair_dists, core):
+    """
+    DBSCAN labels from a precomputed eps-neighbor edge list.
+
+    Core points are joined through core-core edges; each border point goes to
+    the cluster of its nearest core neighbor. ``pairs`` must be sorted by
+    ``pair_dists``.
+    """
+    labels = -1 * np.ones(n, dtype=int)
+    if not core.any():
+        return labels
+
+    both_core = core[pairs[:, 0]] & core[pairs[:, 1]]
+    core_edges = pairs[both_core]
+    graph = coo_matrix(
+        (np.ones(len(core_edges), dtype=np.int8), (core_edges[:, 0], core_edges[:, 1])),
+        shape=(n, n),
+    )
+    _, components = connected_components(graph, directed=False)
+    labels[core] = components[core]
+
+    # Border points: first (= nearest) core neighbor in the sorted edge list
+    mixed = core[pairs[:, 0]] != core[pairs[:, 1]]
+    mixed_pairs = pairs[mixed]
+    core_side = np.where(core[mixed_pairs[:, 0]], mixed_pairs[:, 0], mixed_pairs[:, 1])
+    border_side = np.where(core[mixed_pairs[:, 0]], mixed_pairs[:, 1], mixed_pairs[:, 0])
+    border, first = np.unique(border_side, return_index=True)
+    labels[border] = labels[core_side[first]]
+
+    return _relabel_by_first_index(labels)
+
+
+def _neighbor_pairs(tree, X, idx, eps):
+    """
+    eps-neighborhoods of the points ``idx`` against ``tree`` as flat
+    (owner, neighbor, distance) arrays.
+    """
+    if len(idx) == 0:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int), np.empty(0)
+    pairs = cKDTree(X[idx]).sparse_distance_matrix(tree, eps, output_type='ndarray')
+    return idx[pairs['i']], pairs['j'].astype(int), pairs['v']
+
+
+def dbscan_update(points, labels, eps, min_pts, counts=None, removed=(), added=()):
+    """
+    Update a DBSCAN result after deleting the points ``removed`` (indices)
+    and appending the points ``added``.
+
+    Only eps-neighborhoods touching an edited point change their size, so
+    only those counts are recomputed. Clusters that contain a touched or
+    removed point (they may merge or split) are relabeled, growing the region
+    until no core point in it reaches a core point outside it; every other
+    cluster keeps its labels. ``counts`` are the neighborhood sizes of the
+    previous points (computed if missing).
+
+    Returns ``(points, labels, counts, n_relabeled)`` for the edited point
+    set. As in ``dbscan_sweep``, relabeled border points go to their nearest
+    core point.
+    """
+    X_old = normalize_points(points)
+    if X_old.ndim != 2:
+        X_old = X_old.reshape(0, 2)
+    labels_old = np.asarray(labels, dtype=int)
+    removed = np.unique(np.asarray(removed, dtype=int))
+    added = np.asarray(added, dtype=float).reshape(-1, X_old.shape[1])
+
+    if counts is None:
+        counts = cKDTree(X_old).query_ball_point(X_old, eps, return_length=True) if len(X_old) else np.empty(0, dtype=int)
+    keep = np.ones(len(X_old), dtype=bool)
+    keep[removed] = False
+
+    X = np.vstack([X_old[keep], added])
+    n = len(X)
+    labels = np.concatenate([labels_old[keep], -np.ones(len(added), dtype=int)])
+    counts = np.concatenate([np.asarray(counts, dtype=int)[keep], np.zeros(len(added), dtype=int)])
+    if n == 0:
+        return X, labels, counts, 0
+
+    # Built per edit and queried only locally: skip the slower balanced build
+    tree = cKDTree(X, balanced_tree=False, compact_nodes=False)
+    # Points whose eps-neighborhood gained or lost a member (new points included)
+    edited = np.vstack([added, X_old[removed]])
+    touched = np.unique(np.concatenate(
+        [np.arange(n - len(added), n)] + list(tree.query_ball_point(edited, eps))
+    ).astype(int))
+    counts[touched] = tree.query_ball_point(X[touched], eps, return_length=True)
+    core = counts >= min_pts
+
+    dirty = np.union1d(labels[touched], labels_old[removed])
+    in_region = np.isin(labels, dirty[dirty >= 0])
+    in_region[touched] = True
+    # Grow the region through core points: a core point reaching outside
+    # pulls in its neighbor, and a core neighbor's whole cluster
+    queried = np.zeros(n, dtype=bool)
+    while True:
+        todo = np.nonzero(in_region & core & ~queried)[0]
+        if not len(todo):
+            break
+        queried[todo] = True
+        _, neighbors, _ = _neighbor_pairs(tree, X, todo, eps)
+        reached = np.unique(neighbors[~in_region[neighbors]])
+        in_region[reached] = True
+        pulled = np.unique(labels[reached[core[reached]]])
+        in_region |= np.isin(labels, pulled[pulled >= 0])
+
+    region = np.nonzero(in_region)[0]
+    region_core = region[core[region]]
+    labels[region] = -1
+
+    # Core points of the region: connected components over core-core pairs
+    if len(region_core):
+        pairs = cKDTree(X[region_core]).query_pairs(eps, output_type='ndarray')
+        graph = coo_matrix(
+            (np.ones(len(pairs), dtype=np.int8), (pairs[:, 0], pairs[:, 1])),
+            shape=(len(region_core), len(region_core)),
+        )
+        _, components = connected_components(graph, directed=False)
+        labels[region_core] = labels.max() + 1 + components
+
+    # Border points of the region: label of the nearest core neighbor
+    owners, neighbors, dists = _neighbor_pairs(tree, X, region[~core[region]], eps)
+    is_core = core[neighbors]
+    owners, neighbors, dists = owners[is_core], neighbors[is_core], dists[is_core]
+    if len(owners):
+        order = np.lexsort((dists, owners))
+        border, first = np.unique(owners[order], return_index=True)
+        labels[border] = labels[neighbors[order][first]]
+
+    return X, _relabel_by_first_index(labels), counts, len(region)
+
+
+class DBSCANGraph:
+    """
+    Neighbor structure that answers DBSCAN for any eps <= ``max_eps`` and
+    minPts <= ``max_min_pts`` without touching the points again:
+    k-nearest-neighbor distances (k = max minPts) and the eps-neighbor edge
+    list for ``max_eps`` sorted by distance, both from one KD-tree (pass
+    ``tree`` to reuse one built over ``X``).
+    """
+
+    def __init__(self, X, max_eps, max_min_pts, tree=None):
+        n = len(X)
+        tree = cKDTree(X) if tree is None else tree
+        self.n = n
+        self.max_k = min(int(max_min_pts), n)
+        # Column j is the distance to the (j+1)-th nearest point, the point itself included
+        self.knn_dists = tree.query(X, k=self.max_k)[0].reshape(n, self.max_k)
+        pairs = tree.query_pairs(float(max_eps), output_type='ndarray')
+        dists = np.sqrt(paired_sq_distances(X[pairs[:, 0]], X[pairs[:, 1]]))
+        order = np.argsort(dists, kind='stable')
+        self.pairs, self.pair_dists = pairs[order], dists[order]
+
+    def labels(self, eps, min_pts):
+        """DBSCAN labels at (eps, min_pts): core threshold plus components of the edge prefix."""
+        m = np.searchsorted(self.pair_dists, eps, side='right')
+        if min_pts <= self.max_k:
+            core = self.knn_dists[:, max(min_pts, 1) - 1] <= eps
+        else:
+            core = np.zeros(self.n, dtype=bool)
+        return _dbscan_from_graph(self.n, self.pairs[:m], self.pair_dists[:m], core)
+
+
+def dbscan_sweep(points, eps_values, min_pts_values, include_labels=True, curve_size=200):
+    """
+    Evaluate DBSCAN for every (eps, minPts) combination from one shared
+    neighbor structure.
+
+    One ``DBSCANGraph`` is built for the largest eps and minPts; every
+    combination is then a core-point threshold plus connected components
+    over a prefix of its distance-sorted edges. Border points go to the
+    nearest core point, so a border point reachable from two clusters may
+    differ from ``dbscan_step``, which gives it to whichever cluster
+    reaches it first.
+    """
+    X = normalize_points(points)
+    n = len(X)
+    eps_values = sorted({float(e) for e in eps_values})
+    min_pts_values = sorted({int(m) for m in min_pts_values})
+    if n == 0 or not eps_values or not min_pts_values:
+        return {'results': [], 'k_distance': []}
+
+    graph = DBSCANGraph(X, max(eps_values), max(min_pts_values))
+    results = []
+    for eps in eps_values:
+        for min_pts in min_pts_values:
+            labels = graph.labels(eps, min_pts)
+            result = {
+                'eps': eps,
+                'minPts': min_pts,
+                'n_clusters': int(labels.max() + 1),
+                'noise_ratio': float(np.mean(labels < 0)),
+            }
+            if include_labels:
+                result['labels'] = labels.tolist()
+            results.append(result)
+
+    # Sorted k-distance curves (descending) for choosing eps, downsampled
+    k_distance = []
+    for min_pts in min_pts_values:
+        if min_pts > graph.max_k:
+            continue
+        curve = np.sort(graph.knn_dists[:, max(min_pts, 1) - 1])[::-1]
+        idx = np.unique(np.linspace(0, n - 1, min(curve_size, n)).astype(int))
+        k_distance.append({
+            'minPts': min_pts,
+            'index': idx.tolist(),
+            'distances': curve[idx].tolist(),
+        })
+
+    return {'results': results, 'k_distance': k_distance}
+
+def optics_reachability(points, min_pts, max_eps=np.inf):
+    """
+    OPTICS ordering and reachability distances.
 
-def forel_step(points, r):
+    Neighborhoods come from a KD-tree limited to ``max_eps``; the seed list
+    is a heap with lazy deletion. The result can be cut at any
+    eps <= max_eps with ``optics_extract_dbscan`` without touching the
+    points again.
+    """
     X = normalize_points(points)
     n = len(X)
+    reachability = np.full(n, np.inf)
+    core_distances = np.full(n, np.inf)
+    ordering = np.empty(n, dtype=int)
+    if n == 0:
+        return {'ordering': ordering, 'reachability': reachability,
+                'core_distances': core_distances, 'max_eps': max_eps, 'points': X}
+
+    tree = cKDTree(X)
+    if min_pts <= n:
+        knn_dists, _ = tree.query(X, k=max(min_pts, 1))
+        core_distances = knn_dists.reshape(n, -1)[:, -1]
+        core_distances[core_distances > max_eps] = np.inf
+
+    processed = np.zeros(n, dtype=bool)
+    pos = 0
+
+    def expand(p):
+        nonlocal pos
+        processed[p] = True
+        ordering[pos] = p
+        pos += 1
+        if not np.isfinite(core_distances[p]):
+            return
+        neighbors = np.asarray(tree.query_ball_point(X[p], max_eps), dtype=int)
+        neighbors = neighbors[~processed[neighbors]]
+        new_reach = np.maximum(core_distances[p], np.sqrt(paired_sq_distances(X[neighbors], X[p])))
+        improved = new_reach < reachability[neighbors]
+        reachability[neighbors[improved]] = new_reach[improved]
+        for q, d in zip(neighbors[improved], new_reach[improved]):
+            heapq.heappush(seeds, (d, q))
+
+    for i in range(n):
+        if processed[i]:
+            continue
+        seeds = []
+        expand(i)
+        while seeds:
+            d, q = heapq.heappop(seeds)
+            # Skip stale heap entries
+            if processed[q] or d > reachability[q]:
+                continue
+            expand(q)
+
+    return {'ordering': ordering, 'reachability': reachability,
+            'core_distances': core_distances, 'max_eps': max_eps, 'points': X}
+
+
+def optics_extract_dbscan(optics, eps):
+    """
+    DBSCAN-equivalent labels at ``eps`` from a cached OPTICS result.
+
+    A point whose reachability exceeds eps starts a new cluster if it is a
+    core point at eps and is noise otherwise; every other point joins the
+    current cluster. A border point ordered before the core points that
+    reach it would stay noise that way, so each non-core noise point then
+    takes the cluster of its nearest core point within eps (one KD-tree
+    query over those points).
+    """
+    if eps > optics['max_eps']:
+        raise ValueError(f"eps must not exceed max_eps={optics['max_eps']}")
+    ordering = optics['ordering']
+    reach = optics['reachability'][ordering]
+    core = optics['core_distances'][ordering] <= eps
+
+    far = reach > eps
+    starts = far & core
+    cluster_ids = np.cumsum(starts) - 1
+    ordered_labels = np.where(far & ~core, -1, cluster_ids)
+
+    labels = np.empty(len(ordering), dtype=int)
+    labels[ordering] = ordered_labels
+
+    is_core = optics['core_distances'] <= eps
+    border = np.flatnonzero((labels == -1) & ~is_core)
+    if len(border) and is_core.any():
+        X = optics['points']
+        core_idx = np.flatnonzero(is_core)
+        dists, nearest_core = cKDTree(X[core_idx]).query(X[border], distance_upper_bound=eps)
+        reached = np.isfinite(dists)
+        labels[border[reached]] = labels[core_idx[nearest_core[reached]]]
+    return labels
+
+def iter_forel(points, r, seed=None):
+    """FOREL steps: one per sphere position."""
+    X = as_compute(normalize_points(points))
+    n = len(X)
     labels = -1 * np.ones(n, dtype=int)
     remaining_indices = np.arange(n)
     cluster_id = 0
-    history = []
+    rng = np.random.default_rng(seed)
+    # Compiled single-pass mask + mean when Numba is available
+    fused = jit.forel_neighbors if jit.enabled() else None
+    threshold = X.dtype.type(radius_threshold(r, X.dtype))
     
     while len(remaining_indices) > 0:
         # Pick random point as start center
-        current_idx = np.random.choice(remaining_indices)
+        current_idx = rng.choice(remaining_indices)
         center = X[current_idx]
+        # The first position of a sphere shows the cluster just removed
+        keyframe = cluster_id > 0
         
         while True:
             # Find neighbors in radius R
-            dists = np.linalg.norm(X[remaining_indices] - center, axis=1)
-            neighbors_mask = dists <= r
+            if fused is not None:
+                neighbors_mask, mean, _ = fused(X, remaining_indices, center, threshold)
+            else:
+                neighbors_mask = np.zeros(len(remaining_indices), dtype=bool)
+                neighbors_mask[within_radius(X[remaining_indices], center, r)] = True
             neighbors_indices = remaining_indices[neighbors_mask]
             
-            step_data = {
-                'labels': labels.tolist(),
-                'center': {'x': center[0], 'y': center[1]},
-                'radius': r,
-                'active_indices': neighbors_indices.tolist()
-            }
-            history.append(step_data)
+            yield {'labels': labels, 'center': center, 'radius': r, 'active_indices': neighbors_indices,
+                   'keyframe': keyframe}
+            keyframe = False
             
             if len(neighbors_indices) == 0:
                 break
-                
-            new_center = np.mean(X[neighbors_indices], axis=0)
+
+            if fused is None:
+                mean = np.mean(X[neighbors_indices], axis=0, dtype=np.float64)
+            new_center = mean.astype(X.dtype)
             
             if np.linalg.norm(new_center - center) < 1e-4:
                 # Stabilized
@@ -164,32 +801,39 @@ def forel_step(points, r):
             center = new_center
             
     # Final state
-    history.append({
-        'labels': labels.tolist(),
-        'center': None,
-        'radius': r,
-        'active_indices': []
-    })
-            
-    return history
+    yield {'labels': labels, 'radius': r}
+
 
-def agglomerative_step(points, n_clusters):
+def forel_step(points, r, seed=None):
+    return run_steps('forel', points, iter_forel(points, r, seed)).to_list()
+
+def iter_agglomerative(points, n_clusters, method='ward', Z=None, precluster=None):
     """
     Optimized Agglomerative Clustering using Scipy Linkage.
+    Large inputs use the memory-bounded engine from hierarchy.py.
+    A linkage matrix ``Z`` computed earlier for the same points is reused.
+    With ``precluster='birch'`` inputs larger than the BIRCH subcluster
+    budget are merged as subclusters, each point following its own.
     """
     X = normalize_points(points)
     n = len(X)
     
     if n < 2:
-        return [{'labels': [0] * n}]
+        yield {'labels': np.zeros(n, dtype=int)}
+        return
 
-    # 1. Compute Linkage Matrix (The Hierarchy) - Fast O(N^2)
-    Z = linkage(X, method='ward')
-    
-    history = []
+    assignment = None
+    if precluster == 'birch' and n > DEFAULT_MAX_SUBCLUSTERS:
+        X, _, assignment = birch_precluster(X)
+        Z = None
+
+    # 1. Compute Linkage Matrix (The Hierarchy)
+    if Z is None:
+        Z = build_linkage(X, method)
+    recorded = False
     
     # 2. Reconstruct steps from start_k down to target_k
-    start_k = min(n, 50) # Start showing animation from 50 clusters to target k
+    start_k = min(len(X), 50) # Start showing animation from 50 clusters to target k
     target_k = max(1, n_clusters)
     
     # We iterate k from start_k down to target_k
@@ -197,87 +841,368 @@ def agglomerative_step(points, n_clusters):
         labels = fcluster(Z, k, criterion='maxclust')
         # fcluster returns 1-based labels, convert to 0-based
         labels = labels - 1
-        history.append({'labels': labels.tolist()})
+        recorded = True
+        yield {'labels': labels if assignment is None else labels[assignment]}
         
-    if not history:
+    if not recorded:
         # If we didn't enter the loop (e.g. n < start_k), add final state
         labels = fcluster(Z, target_k, criterion='maxclust') - 1
-        history.append({'labels': labels.tolist()})
+        yield {'labels': labels if assignment is None else labels[assignment]}
+
 
-    return history
+def agglomerative_step(points, n_clusters, method='ward', precluster=None):
+    return run_steps('agglomerative', points,
+                     iter_agglomerative(points, n_clusters, method, precluster=precluster)).to_list()
 
-def mean_shift_step(points, bandwidth=1.0):
+def iter_mean_shift(points, bandwidth=1.0, precluster=None):
     """
     Optimized MeanShift using Vectorization.
+    With ``precluster='birch'`` the modes are sought from BIRCH subclusters
+    (radius about a quarter bandwidth) weighted by their sizes, and every
+    point follows its subcluster.
     """
-    X = normalize_points(points)
+    X = as_compute(normalize_points(points))
     n_samples = len(X)
     
     if n_samples == 0:
-        return []
+        return
+
+    weights = assignment = None
+    if precluster == 'birch' and n_samples > DEFAULT_MAX_SUBCLUSTERS:
+        centroids, weights, assignment = birch_precluster(X, threshold=bandwidth / 4)
+        X = centroids.astype(X.dtype)
+        # Kernel sums of (weight * position, weight) give the weighted means
+        values = np.column_stack([X * weights[:, np.newaxis], weights])
         
     centroids = np.copy(X)
-    history = []
     
-    max_iters = 100
     stop_thresh = 1e-3 * bandwidth
     
-    for it in range(max_iters):
+    for it in range(MEAN_SHIFT_MAX_ITERS):
         old_centroids = np.copy(centroids)
         
-        # Vectorized distance calculation (N x N)
-        dists = cdist(centroids, centroids)
-        
-        # Weights matrix (N x N)
-        weights = (dists <= bandwidth).astype(float)
-        
-        # Sum of weights for each point (denominator)
-        denoms = weights.sum(axis=1, keepdims=True)
-        
-        # Avoid division by zero
-        denoms[denoms == 0] = 1.0
+        # Flat kernel: sum and count of centroids within the bandwidth,
+        # computed block by block instead of an N x N weight matrix
+        if weights is None:
+            sums, denoms = radius_sums(centroids, centroids, bandwidth)
+        else:
+            sums, _ = radius_sums(centroids, X, bandwidth, values=values)
+            sums, denoms = sums[:, :-1], sums[:, -1]
         
-        # New centroids
-        new_centroids = np.dot(weights, centroids) / denoms
+        # New centroids (every centroid is within the bandwidth of itself)
+        new_centroids = (sums / np.maximum(denoms, 1)[:, np.newaxis]).astype(X.dtype)
         
         # Visualization: Group nearby centroids
         rounded = np.round(new_centroids, decimals=1)
         unique_pos, inverse_indices = np.unique(rounded, axis=0, return_inverse=True)
+        labels = inverse_indices.ravel()
         
-        step_data = {
-            'centroids': [{'x': float(c[0]), 'y': float(c[1])} for c in unique_pos],
-            'labels': inverse_indices.tolist()
-        }
-        history.append(step_data)
+        shift = float(np.sqrt(np.max(paired_sq_distances(new_centroids, old_centroids))))
+        # 'shift' / 'tolerance' only feed progress estimates
+        yield {'labels': labels if assignment is None else labels[assignment], 'centroids': unique_pos,
+               'shift': shift, 'tolerance': stop_thresh}
         
         # Check convergence
-        shift = np.linalg.norm(new_centroids - old_centroids, axis=1)
-        if np.max(shift) < stop_thresh:
+        if shift < stop_thresh:
             break
             
         centroids = new_centroids
 
-    return history
 
-def compute_dendrogram_data(points):
+def mean_shift_step(points, bandwidth=1.0, precluster=None):
+    return run_steps('meanshift', points, iter_mean_shift(points, bandwidth, precluster)).to_list()
+
+def estimate_bandwidth(points, quantile=0.3, n_samples=500, seed=0):
     """
-    Compute dendrogram data and return JSON-serializable structure.
+    Mean Shift bandwidth guess: the mean distance from each sampled point to
+    its ``quantile * n_samples``-th nearest sampled neighbor.
+    """
+    X = normalize_points(points)
+    n = len(X)
+    if n < 2:
+        return 1.0
+    if n > n_samples:
+        X = X[np.random.default_rng(seed).choice(n, n_samples, replace=False)]
+    k = min(len(X), max(2, int(len(X) * quantile)))
+    dists, _ = cKDTree(X).query(X, k=k)
+    bandwidth = float(np.mean(dists[:, -1]))
+    return bandwidth if bandwidth > 0 else 1.0
+
+
+def _mean_shift_modes(X, tree, bandwidth, max_iters=100):
+    """
+    Flat-kernel Mean Shift of binned seeds over the original points, using
+    a prebuilt KD-tree of ``X``. Returns (modes, labels).
+    """
+    # One seed per occupied bandwidth-sized bin
+    seeds = np.unique(np.round(X / bandwidth), axis=0) * bandwidth
+    stop_thresh = 1e-3 * bandwidth
+    support = np.zeros(len(seeds), dtype=int)
+    active = np.ones(len(seeds), dtype=bool)
+
+    for _ in range(max_iters):
+        idx = np.nonzero(active)[0]
+        if len(idx) == 0:
+            break
+        # Seed-to-point pairs within the bandwidth, found in C by the two trees
+        pairs = cKDTree(seeds[idx]).sparse_distance_matrix(tree, bandwidth, output_type='ndarray')
+        rows, cols = pairs['i'], pairs['j']
+        sizes = np.bincount(rows, minlength=len(idx))
+
+        has_support = sizes > 0
+        means = np.stack(
+            [np.bincount(rows, weights=X[cols, j], minlength=len(idx)) for j in range(X.shape[1])],
+            axis=1,
+        )
+        means[has_support] /= sizes[has_support, np.newaxis]
+        means[~has_support] = seeds[idx[~has_support]]
+
+        shift = np.sqrt(paired_sq_distances(means, seeds[idx]))
+        seeds[idx] = means
+        support[idx] = sizes
+        active[idx[(shift < stop_thresh) | ~has_support]] = False
+
+    # Merge modes closer than one bandwidth, keeping the best supported
+    keep = support > 0
+    seeds, support = seeds[keep], support[keep]
+    order = np.argsort(-support, kind='stable')
+    seeds = seeds[order]
+    unique = np.ones(len(seeds), dtype=bool)
+    mode_tree = cKDTree(seeds)
+    for i in range(len(seeds)):
+        if unique[i]:
+            close = mode_tree.query_ball_point(seeds[i], bandwidth)
+            unique[close] = False
+            unique[i] = True
+    modes = seeds[unique]
+
+    _, labels = cKDTree(modes).query(X)
+    return modes, labels
+
+
+def mean_shift_sweep(points, bandwidths, include_labels=True):
+    """
+    Run Mean Shift for several bandwidths in parallel over one shared
+    KD-tree of the points.
+    """
+    X = normalize_points(points)
+    if len(X) == 0:
+        return []
+    tree = cKDTree(X)
+    bandwidths = sorted({float(b) for b in bandwidths if float(b) > 0})
+
+    def run(bandwidth):
+        modes, labels = _mean_shift_modes(X, tree, bandwidth)
+        result = {
+            'bandwidth': bandwidth,
+            'n_modes': int(len(modes)),
+            'modes': [{'x': float(m[0]), 'y': float(m[1])} for m in modes],
+        }
+        if include_labels:
+            result['labels'] = labels.tolist()
+        return result
+
+    return parallel_map(run, bandwidths)
+
+# Subcluster growth frames of a BIRCH run; labelling the points seen so far
+# costs O(seen * subclusters) per frame, so larger inputs only get the result
+BIRCH_GROWTH_FRAMES = 30
+BIRCH_GROWTH_MAX_POINTS = 20_000
+
+
+def iter_birch(points, threshold=0.0, n_clusters=3, branching=DEFAULT_BRANCHING,
+               max_subclusters=DEFAULT_MAX_SUBCLUSTERS):
+    """
+    BIRCH steps: the CF-tree growing over the points in input order (points
+    not inserted yet are -1, the rest take their nearest subcluster), then
+    Ward linkage over the subcluster centroids cut at ``n_clusters``
+    (``None`` keeps the subclusters as clusters).
+    """
+    X = as_compute(normalize_points(points))
+    n = len(X)
+    if n == 0:
+        return
+    labels = -1 * np.ones(n, dtype=int)
+    chunks = min(n, BIRCH_GROWTH_FRAMES) if n <= BIRCH_GROWTH_MAX_POINTS else 1
+
+    for seen, centroids, counts, tree in grow_cf_tree(X, threshold, max_subclusters, branching, chunks):
+        labels[:seen], _ = nearest(X[:seen], centroids.astype(X.dtype))
+        # 'processed' only feeds progress estimates
+        yield {'labels': labels, 'centroids': centroids, 'threshold': tree.threshold,
+               'subclusters': len(centroids), 'processed': seen}
+
+    if n_clusters is None or len(centroids) <= n_clusters:
+        return
+    # Global step: merge the subclusters, then move every point with its own
+    merged = fcluster(build_linkage(centroids, 'ward'), n_clusters, criterion='maxclust') - 1
+    k = int(merged.max()) + 1
+    sizes = np.bincount(merged, weights=counts, minlength=k)
+    means = np.stack([np.bincount(merged, weights=counts * centroids[:, j], minlength=k)
+                      for j in range(centroids.shape[1])], axis=1) / sizes[:, np.newaxis]
+    yield {'labels': merged[labels], 'centroids': means, 'threshold': tree.threshold,
+           'subclusters': len(centroids), 'processed': n}
+
+
+def birch_step(points, threshold=0.0, n_clusters=3, branching=DEFAULT_BRANCHING,
+               max_subclusters=DEFAULT_MAX_SUBCLUSTERS):
+    return run_steps('birch', points,
+                     iter_birch(points, threshold, n_clusters, branching, max_subclusters)).to_list()
+
+
+# Spectral clustering: kNN graph degree, size up to which the Laplacian is
+# solved densely, and the LOBPCG iteration cap
+SPECTRAL_NEIGHBORS = 10
+SPECTRAL_DENSE_MAX_POINTS = 1000
+SPECTRAL_LOBPCG_MAX_ITERS = 200
+
+
+def _knn_affinity(X, n_neighbors):
+    """Symmetric kNN connectivity (1 for mutual neighbors, 0.5 for one-sided) as CSR."""
+    n = len(X)
+    _, idx = cKDTree(X).query(X, k=n_neighbors + 1)
+    rows = np.repeat(np.arange(n), n_neighbors)
+    # Column 0 is the point itself (or a duplicate of it)
+    A = coo_matrix((np.ones(n * n_neighbors), (rows, idx[:, 1:].ravel())), shape=(n, n)).tocsr()
+    return (A + A.T) * 0.5
+
+
+def spectral_embedding(X, n_components, n_neighbors=SPECTRAL_NEIGHBORS, seed=None):
+    """
+    Eigenvectors of the ``n_components`` smallest eigenvalues of the
+    normalized Laplacian I - D^-1/2 W D^-1/2 of the kNN graph, with rows
+    scaled to unit length (Ng, Jordan and Weiss), and the eigenvalues.
+
+    The graph has O(n * n_neighbors) edges, so the sparse solvers never
+    build an n × n matrix: shift-invert Lanczos near 0 in the plane (the
+    sparse LU of a planar kNN graph stays small), LOBPCG otherwise (LU
+    fill-in grows quickly with the dimension; LOBPCG needs only products).
+    """
+    n = len(X)
+    if n == 1:
+        return np.ones((1, 1)), np.zeros(1)
+    rng = np.random.default_rng(seed)
+    W = _knn_affinity(X, max(1, min(int(n_neighbors), n - 1)))
+    d_sqrt = np.sqrt(np.asarray(W.sum(axis=1)).ravel())
+    L = identity(n, format='csr') - diags(1.0 / d_sqrt) @ W @ diags(1.0 / d_sqrt)
+
+    if n <= SPECTRAL_DENSE_MAX_POINTS or n_components >= n - 1:
+        values, vectors = eigh(L.toarray(), subset_by_index=[0, n_components - 1])
+    elif X.shape[1] <= 2:
+        # A fixed start vector keeps runs reproducible
+        values, vectors = eigsh(L.tocsc(), k=n_components, sigma=-1e-5, which='LM',
+                                v0=rng.standard_normal(n))
+    else:
+        start = rng.standard_normal((n, n_components))
+        start[:, 0] = d_sqrt  # the exact null vector D^1/2 1
+        with warnings.catch_warnings():
+            # Short of the tolerance the subspace is still good enough for K-Means
+            warnings.simplefilter('ignore', UserWarning)
+            values, vectors = lobpcg(L, start, largest=False, tol=1e-5, maxiter=SPECTRAL_LOBPCG_MAX_ITERS)
+
+    order = np.argsort(values)
+    vectors = vectors[:, order]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12), values[order]
+
+
+def iter_spectral(points, k, n_neighbors=SPECTRAL_NEIGHBORS, seed=None):
+    """
+    Spectral clustering steps: K-Means (k-means++ seeding) in the spectral
+    embedding, one step per Lloyd iteration. Labels apply to the points
+    and centroids are the means of the points in each cluster; the first
+    step also carries the embedding (its first coordinates, one row per
+    point). 'embedding_inertia' is the K-Means objective in the embedding,
+    so the metrics compute the point-space inertia from the labels.
+    """
+    X = normalize_points(points)
+    if len(X) < k or k < 1:
+        return
+    X = np.asarray(X, dtype=float)
+    rng = np.random.default_rng(seed)
+    U, _ = spectral_embedding(X, k, n_neighbors, rng)
+    embedding = np.zeros_like(X)
+    m = min(k, X.shape[1])
+    embedding[:, :m] = U[:, :m]
+
+    centers = kmeans_plus_plus(U, k, rng)
+    means = np.repeat(X.mean(axis=0, keepdims=True), k, axis=0)
+    shift = None
+    for _ in range(KMEANS_MAX_ITERS):
+        labels, sq = nearest(U, centers)
+        means = _cluster_means(X, labels, k, means)
+        # 'shift' / 'tolerance' only feed progress estimates, as for K-Means
+        yield {'labels': labels, 'centroids': means, 'embedding_inertia': float(sq.sum()),
+               'embedding': embedding, 'shift': shift, 'tolerance': 1e-5}
+        embedding = None
+
+        new_centers = _cluster_means(U, labels, k, centers)
+        if np.allclose(centers, new_centers):
+            break
+        shift = float(np.abs(new_centers - centers).max())
+        centers = new_centers
+
+
+def spectral_step(points, k, n_neighbors=SPECTRAL_NEIGHBORS, seed=None):
+    return run_steps('spectral', points, iter_spectral(points, k, n_neighbors, seed)).to_list()
+
+
+# EM stops once the mean log-likelihood per point improves by less than this
+GMM_TOL = 1e-3
+
+
+def iter_gmm(points, k, covariance_type='full', init='kmeans', tol=GMM_TOL, soft=False, seed=None):
+    """
+    Gaussian mixture (EM) steps, one per iteration (see ``mixture.py``).
+    Labels are the most likely component, centroids the component means
+    and 'axes' the one-sigma semi-axes of their ellipses (two rows per
+    component); with ``soft`` each step also carries every point's largest
+    responsibility as 'confidence'. ``init='kmeans'`` warm-starts from a
+    K-Means solution (k-means++ seeding), 'random' from k random points.
+    """
+    X = normalize_points(points)
+    if len(X) < k or k < 1:
+        return
+    X = np.asarray(X, dtype=float)
+    rng = np.random.default_rng(seed)
+    if init == 'kmeans':
+        _, labels, _ = _lloyd(X, kmeans_plus_plus(X, k, rng))
+    elif init == 'random':
+        labels, _ = nearest(X, X[rng.choice(len(X), k, replace=False)])
+    else:
+        raise ValueError(f'Unknown init: {init}')
+    resp = np.zeros((len(X), k))
+    resp[np.arange(len(X)), labels] = 1.0
+    weights, means, covariances = m_step(X, resp, covariance_type)
+
+    previous = None
+    for _ in range(GMM_MAX_ITERS):
+        resp, log_likelihood = e_step(X, weights, means, covariances, covariance_type)
+        change = None if previous is None else abs(log_likelihood - previous)
+        # 'shift' / 'tolerance' only feed progress estimates
+        yield {'labels': resp.argmax(axis=1), 'centroids': means,
+               'axes': ellipse_axes(full_covariances(covariances, covariance_type, X.shape[1])),
+               'log_likelihood': log_likelihood, 'confidence': resp.max(axis=1) if soft else None,
+               'shift': change, 'tolerance': tol}
+        if change is not None and change < tol:
+            break
+        previous = log_likelihood
+        weights, means, covariances = m_step(X, resp, covariance_type)
+
+
+def gmm_step(points, k, covariance_type='full', init='kmeans', tol=GMM_TOL, soft=False, seed=None):
+    return run_steps('gmm', points, iter_gmm(points, k, covariance_type, init, tol, soft, seed)).to_list()
+
+
+def compute_dendrogram_data(points, method='ward', p=DENDROGRAM_LEAVES, Z=None):
+    """
+    Level-of-detail dendrogram (top ``p`` leaves, see ``dendrogram_lod``)
+    as a JSON-serializable dict. ``Z`` is a precomputed linkage for the
+    same points.
     """
     X = normalize_points(points)
     if len(X) < 2:
         return {'error': "Need at least 2 points"}
-        
-    Z = linkage(X, method='ward')
-    ddata = dendrogram(Z, no_plot=True)
-    
-    # Fix JSON serialization error (numpy float32 is not JSON serializable)
-    def clean_floats(obj):
-        if isinstance(obj, list):
-            return [clean_floats(x) for x in obj]
-        elif isinstance(obj, dict):
-            return {k: clean_floats(v) for k, v in obj.items()}
-        elif hasattr(obj, 'item'): # numpy scalar
-            return obj.item()
-        return obj
-
-    return clean_floats(ddata)
+
+    if Z is None:
+        Z = build_linkage(X, method)
+    return dendrogram_lod(Z, p)
@@ -1,5 +1,19 @@
+import threading
+
 from django.apps import AppConfig
 
 class SimulatorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.simulator'
+
+    def ready(self):
+        from . import jit
+        from .parallel import limit_worker_threads
+
+        # BLAS pools default to every core; keep each worker to its share
+        limit_worker_threads()
+
+        # Load (or compile once) the Numba kernels off the startup path,
+        # so the first request in a fresh worker does not pay for it
+        if jit.enabled():
+            threading.Thread(target=jit.warm_up, name='simulator-jit-warm-up', daemon=True).start()
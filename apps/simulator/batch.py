@@ -0,0 +1,204 @@
+"""
+Offline batch clustering over files (``manage.py cluster_file``).
+
+CSV input is parsed in row chunks into a memory-mapped ``.npy`` once.
+Algorithms listed in STREAMING_ALGORITHMS then run chunk by chunk over the
+memmap and write labels into a memmap too, so they work on datasets larger
+than RAM. Every other registered algorithm loads the points and runs its
+regular engine with ``final_only``.
+"""
+import hashlib
+import itertools
+from pathlib import Path
+
+import numpy as np
+
+from .algorithms import STEP_FIELDS, kmeans_plus_plus, make_steps, run_steps
+from .distances import compute_dtype, nearest
+
+STREAMING_ALGORITHMS = ('kmeans',)
+DEFAULT_CHUNK_ROWS = 100_000
+
+
+def _column_indices(fields, header, columns):
+    """Indices of the requested columns (names need a header row)."""
+    if columns is None:
+        return list(range(len(fields)))
+    indices = []
+    for col in columns:
+        if isinstance(col, int) or str(col).isdigit():
+            indices.append(int(col))
+        elif header is not None and col in header:
+            indices.append(header.index(col))
+        else:
+            raise ValueError(f'Unknown column: {col}')
+    return indices
+
+
+def _is_header(fields, usecols):
+    try:
+        [float(fields[i]) for i in usecols]
+    except (ValueError, IndexError):
+        return True
+    return False
+
+
+def csv_to_npy(src, dst, columns=None, delimiter=',', chunk_rows=DEFAULT_CHUNK_ROWS, progress=None):
+    """
+    Convert a numeric CSV file into a ``.npy`` (dtype from the compute
+    policy, so large files are stored as float32) without loading it:
+    one pass counts the rows, a second parses ``chunk_rows`` lines at a time
+    straight into a memmap. A non-numeric first line is taken as a header.
+    ``columns`` selects columns by index or header name (default: all).
+    ``progress(done, total)`` is called after every chunk. Returns the
+    result opened read-only as a memmap.
+    """
+    with open(src, 'r', newline='') as f:
+        first = f.readline().rstrip('\r\n')
+        fields = [x.strip() for x in first.split(delimiter)]
+        usecols = _column_indices(fields, fields, columns)
+        has_header = _is_header(fields, usecols)
+        n_rows = sum(1 for line in f if line.strip()) + (0 if has_header else 1)
+
+    if n_rows == 0:
+        raise ValueError(f'{src} has no data rows')
+    dtype = compute_dtype(n_rows)
+    out = np.lib.format.open_memmap(dst, mode='w+', dtype=dtype, shape=(n_rows, len(usecols)))
+
+    with open(src, 'r', newline='') as f:
+        if has_header:
+            f.readline()
+        lines = (line for line in f if line.strip())
+        done = 0
+        while done < n_rows:
+            chunk = list(itertools.islice(lines, chunk_rows))
+            if not chunk:
+                break
+            try:
+                block = np.loadtxt(chunk, delimiter=delimiter, usecols=usecols, ndmin=2)
+            except ValueError as e:
+                first_line = done + 1 + int(has_header)
+                raise ValueError(f'{src}, lines {first_line}-{first_line + len(chunk) - 1}: {e}')
+            if not np.isfinite(block).all():
+                raise ValueError(f'{src}: non-finite values after data row {done}')
+            out[done:done + len(block)] = block
+            done += len(block)
+            if progress:
+                progress(done, n_rows)
+
+    out.flush()
+    del out
+    return np.load(dst, mmap_mode='r')
+
+
+def _options_tag(csv_options):
+    """Short hash of the parse options, so each column/delimiter choice gets its own conversion."""
+    options = {'columns': None, 'delimiter': ',', **csv_options}
+    options.pop('chunk_rows', None)
+    options['columns'] = None if options['columns'] is None else [str(c) for c in options['columns']]
+    return hashlib.sha1(repr(sorted(options.items())).encode()).hexdigest()[:10]
+
+
+def open_dataset(path, workdir=None, progress=None, **csv_options):
+    """
+    A dataset file as a read-only (n, d) memmap. CSV files are converted to
+    ``<workdir>/<name>.<options hash>.npy`` first; an existing conversion
+    with the same ``columns`` and ``delimiter`` newer than the CSV is reused.
+    """
+    path = Path(path)
+    if path.suffix.lower() == '.npy':
+        X = np.load(path, mmap_mode='r')
+    elif path.suffix.lower() in ('.csv', '.txt'):
+        dst = Path(workdir or path.parent) / f'{path.stem}.{_options_tag(csv_options)}.npy'
+        if dst.exists() and dst.stat().st_mtime >= path.stat().st_mtime:
+            X = np.load(dst, mmap_mode='r')
+        else:
+            X = csv_to_npy(path, dst, progress=progress, **csv_options)
+    else:
+        raise ValueError(f'Unsupported file type: {path.suffix} (expected .csv or .npy)')
+
+    if X.ndim != 2 or not np.issubdtype(X.dtype, np.number):
+        raise ValueError(f'{path} must hold a numeric 2D array, got {X.dtype} {X.shape}')
+    return X
+
+
+def _chunks(n, chunk_rows):
+    for start in range(0, n, chunk_rows):
+        yield start, min(start + chunk_rows, n)
+
+
+# Rows sampled for k-means++ seeding of the chunked K-Means
+KMEANS_INIT_SAMPLE = 10_000
+
+
+def kmeans_chunked(X, k, labels_out, chunk_rows=DEFAULT_CHUNK_ROWS, max_iters=100, tol=1e-4,
+                   seed=None, progress=None):
+    """
+    Lloyd's K-Means streamed over row chunks of ``X``: each iteration is one
+    pass accumulating per-cluster sums and counts. Centers are seeded with
+    k-means++ on a uniform row sample (one bad random start costs a full
+    pass per iteration here); ``tol`` is relative to the data variance as in
+    the in-memory engine. Labels of the final centroids are written into
+    ``labels_out``. Returns ``(centroids, inertia, n_iter)``.
+    """
+    n, d = X.shape
+    if n < k:
+        raise ValueError(f'k={k} is larger than the number of points ({n})')
+    dtype = compute_dtype(n)
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(n, min(n, KMEANS_INIT_SAMPLE), replace=False))
+    centroids = kmeans_plus_plus(np.asarray(X[rows], dtype=float), k, rng).astype(dtype)
+
+    total, total_sq = np.zeros(d), np.zeros(d)
+    for start, stop in _chunks(n, chunk_rows):
+        Xb = np.asarray(X[start:stop], dtype=float)
+        total += Xb.sum(axis=0)
+        total_sq += np.einsum('ij,ij->j', Xb, Xb)
+    tol = tol * np.mean(total_sq / n - (total / n) ** 2)
+
+    n_iter = 0
+    for n_iter in range(1, max_iters + 1):
+        sums, counts = np.zeros((k, d)), np.zeros(k)
+        for start, stop in _chunks(n, chunk_rows):
+            Xb = np.asarray(X[start:stop], dtype=dtype)
+            labels, _ = nearest(Xb, centroids)
+            counts += np.bincount(labels, minlength=k)
+            for j in range(d):
+                sums[:, j] += np.bincount(labels, weights=Xb[:, j], minlength=k)
+        nonempty = counts > 0
+        new_centroids = centroids.copy()
+        new_centroids[nonempty] = sums[nonempty] / counts[nonempty, np.newaxis]
+        shift = np.sum((new_centroids - centroids) ** 2, dtype=np.float64)
+        centroids = new_centroids
+        if progress:
+            progress(n_iter, max_iters)
+        if shift <= tol:
+            break
+
+    inertia = 0.0
+    for start, stop in _chunks(n, chunk_rows):
+        labels, sq = nearest(np.asarray(X[start:stop], dtype=dtype), centroids)
+        labels_out[start:stop] = labels
+        inertia += sq.sum(dtype=np.float64)
+    return centroids, float(inertia), n_iter
+
+
+def cluster_dataset(X, algorithm, params, labels_out, seed=None, chunk_rows=DEFAULT_CHUNK_ROWS, progress=None):
+    """
+    Run a registered algorithm on ``X`` and write its final labels into
+    ``labels_out``. Returns a dict with algorithm-specific extras
+    (``inertia``, ``n_iter``, ``streamed``).
+    """
+    if algorithm not in STEP_FIELDS:
+        raise ValueError(f"Unknown algorithm: {algorithm}. Allowed: {', '.join(STEP_FIELDS)}")
+
+    if algorithm == 'kmeans':
+        centroids, inertia, n_iter = kmeans_chunked(
+            X, int(params.get('k', 3)), labels_out, chunk_rows=chunk_rows, seed=seed, progress=progress,
+        )
+        return {'streamed': True, 'inertia': inertia, 'n_iter': n_iter, 'centroids': centroids.tolist()}
+
+    points = np.asarray(X, dtype=float)
+    recorder = run_steps(algorithm, points, make_steps(algorithm, points, params, seed), final_only=True)
+    labels_out[:] = recorder.labels(-1) if len(recorder) else -1
+    return {'streamed': False, 'inertia': recorder.scalar('inertia', -1)}
@@ -0,0 +1,197 @@
+"""
+BIRCH clustering feature tree.
+
+Points are summarized in a single pass by clustering features (CF): for a
+subcluster, the point count N, the linear sum LS and the sum of squared
+norms SS. CFs add up, so a subcluster absorbs a point or another CF in
+O(d), and its centroid (LS/N) and radius (sqrt(SS/N - |LS/N|²)) are
+available at any time.
+
+The tree routes every insertion to the closest leaf entry; an entry absorbs
+the new CF if the merged radius stays within ``threshold``, otherwise it
+becomes a new entry, and nodes holding more than ``branching`` entries are
+split. When the number of leaf entries exceeds ``max_subclusters`` the tree
+is rebuilt from its own leaf entries with a larger threshold, so memory
+stays bounded whatever the number of points.
+"""
+import numpy as np
+from scipy.spatial import cKDTree
+
+from .distances import nearest
+
+DEFAULT_BRANCHING = 50
+DEFAULT_MAX_SUBCLUSTERS = 1000
+
+
+class _Node:
+    """Up to ``capacity`` CF entries; inner nodes also keep the child of each entry."""
+
+    def __init__(self, capacity, n_features, leaf):
+        self.leaf = leaf
+        self.m = 0
+        self.n = np.zeros(capacity)
+        self.ls = np.zeros((capacity, n_features))
+        self.ss = np.zeros(capacity)
+        # LS / N, kept up to date for routing
+        self.centroids = np.zeros((capacity, n_features))
+        self.children = [None] * capacity
+
+    def set(self, i, n, ls, ss, child=None):
+        self.n[i], self.ls[i], self.ss[i] = n, ls, ss
+        self.centroids[i] = self.ls[i] / n
+        self.children[i] = child
+
+    def add(self, n, ls, ss, child=None):
+        self.set(self.m, n, ls, ss, child)
+        self.m += 1
+
+    def absorb(self, i, n, ls, ss):
+        self.n[i] += n
+        self.ls[i] += ls
+        self.ss[i] += ss
+        self.centroids[i] = self.ls[i] / self.n[i]
+
+    def summary(self):
+        m = self.m
+        return self.n[:m].sum(), self.ls[:m].sum(axis=0), self.ss[:m].sum()
+
+    def closest(self, point):
+        diff = self.centroids[:self.m] - point
+        return int(np.argmin(np.einsum('ij,ij->i', diff, diff)))
+
+
+class CFTree:
+    """CF-tree over ``n_features``-dimensional points (see the module docstring)."""
+
+    def __init__(self, n_features, threshold, branching=DEFAULT_BRANCHING, max_subclusters=DEFAULT_MAX_SUBCLUSTERS):
+        if branching < 2:
+            raise ValueError('branching must be at least 2')
+        self.n_features = n_features
+        self.threshold = float(threshold)
+        self.branching = int(branching)
+        self.max_subclusters = max(1, int(max_subclusters))
+        self.n_rebuilds = 0
+        self._reset()
+
+    def _reset(self):
+        self.root = _Node(self.branching + 1, self.n_features, leaf=True)
+        self.n_subclusters = 0
+
+    def insert_point(self, x):
+        x = np.asarray(x, dtype=float)
+        self.insert(1.0, x, float(x @ x))
+
+    def insert(self, n, ls, ss):
+        """Insert one CF, rebuilding with a larger threshold if the leaves overflow."""
+        self._insert_root(n, ls, ss)
+        while self.n_subclusters > self.max_subclusters:
+            self._rebuild()
+
+    def _insert_root(self, n, ls, ss):
+        split = self._insert(self.root, n, ls, ss)
+        if split is not None:
+            root = _Node(self.branching + 1, self.n_features, leaf=False)
+            for child in split:
+                root.add(*child.summary(), child=child)
+            self.root = root
+
+    def _fits(self, node, i, n, ls, ss):
+        total = node.n[i] + n
+        centroid = (node.ls[i] + ls) / total
+        radius_sq = (node.ss[i] + ss) / total - centroid @ centroid
+        return radius_sq <= self.threshold ** 2
+
+    def _insert(self, node, n, ls, ss):
+        j = node.closest(ls / n) if node.m else -1
+        if node.leaf:
+            if j >= 0 and self._fits(node, j, n, ls, ss):
+                node.absorb(j, n, ls, ss)
+            else:
+                node.add(n, ls, ss)
+                self.n_subclusters += 1
+        else:
+            split = self._insert(node.children[j], n, ls, ss)
+            if split is None:
+                node.absorb(j, n, ls, ss)
+            else:
+                a, b = split
+                node.set(j, *a.summary(), child=a)
+                node.add(*b.summary(), child=b)
+        return self._split(node) if node.m > self.branching else None
+
+    def _split(self, node):
+        """Split an overfull node around its two most distant entries."""
+        centroids = node.centroids[:node.m]
+        d2 = np.sum((centroids[:, np.newaxis] - centroids[np.newaxis]) ** 2, axis=2)
+        a_seed, b_seed = np.unravel_index(np.argmax(d2), d2.shape)
+        to_a = d2[:, a_seed] <= d2[:, b_seed]
+        to_a[a_seed], to_a[b_seed] = True, False
+        halves = []
+        for side in (to_a, ~to_a):
+            half = _Node(self.branching + 1, self.n_features, node.leaf)
+            for i in np.nonzero(side)[0]:
+                half.add(node.n[i], node.ls[i], node.ss[i], node.children[i])
+            halves.append(half)
+        return halves
+
+    def _rebuild(self):
+        """Reinsert the leaf entries into a fresh tree with a larger threshold."""
+        n, ls, ss = self.subclusters()
+        centroids = ls / n[:, np.newaxis]
+        # Merging typical nearest neighbors needs a radius of about half their distance
+        nn_dist, _ = cKDTree(centroids).query(centroids, k=2)
+        self.threshold = max(2 * self.threshold, float(np.median(nn_dist[:, 1])) / 2, 1e-12)
+        self.n_rebuilds += 1
+        self._reset()
+        for i in range(len(n)):
+            self._insert_root(n[i], ls[i], ss[i])
+
+    def subclusters(self):
+        """Leaf entries as ``(n, ls, ss)`` arrays."""
+        ns, lss, sss = [], [], []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node.leaf:
+                ns.append(node.n[:node.m])
+                lss.append(node.ls[:node.m])
+                sss.append(node.ss[:node.m])
+            else:
+                stack.extend(node.children[:node.m])
+        return np.concatenate(ns), np.concatenate(lss), np.concatenate(sss)
+
+    def centroids(self):
+        n, ls, _ = self.subclusters()
+        return ls / n[:, np.newaxis], n
+
+
+def grow_cf_tree(X, threshold=0.0, max_subclusters=DEFAULT_MAX_SUBCLUSTERS, branching=DEFAULT_BRANCHING,
+                 chunks=1):
+    """
+    Insert the rows of ``X`` in one pass, yielding ``(points inserted,
+    subcluster centroids, subcluster sizes, tree)`` after each of ``chunks``
+    equal chunks. ``threshold=0`` lets the rebuilds find a threshold that
+    fits ``max_subclusters``.
+    """
+    X = np.asarray(X)
+    # Centered sums keep SS/N - |LS/N|² accurate away from the origin
+    origin = X.mean(axis=0, dtype=np.float64)
+    tree = CFTree(X.shape[1], threshold, branching, max_subclusters)
+    bounds = np.linspace(0, len(X), max(1, int(chunks)) + 1).astype(int)
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        for x in X[start:stop] - origin:
+            tree.insert_point(x)
+        centroids, counts = tree.centroids()
+        yield int(stop), centroids + origin, counts, tree
+
+
+def birch_precluster(X, threshold=0.0, max_subclusters=DEFAULT_MAX_SUBCLUSTERS, branching=DEFAULT_BRANCHING):
+    """
+    One-pass BIRCH summary of ``X`` for engines that cannot afford all
+    points: returns subcluster centroids, their sizes and the index of the
+    nearest centroid for every point.
+    """
+    X = np.asarray(X)
+    *_, (_, centroids, counts, _) = grow_cf_tree(X, threshold, max_subclusters, branching)
+    assignment, _ = nearest(X, centroids.astype(X.dtype))
+    return centroids, counts, assignment
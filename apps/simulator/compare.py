@@ -0,0 +1,96 @@
+"""
+Several algorithm configurations on one dataset, side by side.
+
+The points are parsed once and every structure that more than one
+configuration can use is built once before the runs start: a
+``DBSCANGraph`` for the largest DBSCAN eps / minPts and one linkage matrix
+per agglomerative method. The runs then share them read-only and go
+through ``parallel_map``, within the request's thread budget.
+
+Only final labels are needed, so DBSCAN uses the same graph engine as
+``dbscan_sweep``; the other algorithms, Mean Shift included, run the step
+engines of /run/ with ``final_only`` and give the labels /run/ gives.
+"""
+import time
+
+import numpy as np
+
+from .algorithms import DBSCANGraph, make_steps, run_steps
+from .hierarchy import build_linkage
+from .metrics import agreement_matrix, compute_metrics
+from .parallel import parallel_map
+
+
+class _Shared:
+    """Structures built once for all configurations (see the module docstring)."""
+
+    def __init__(self, X, configs):
+        self.X = X
+        self.timings = {}
+        self.dbscan_graph = None
+        dbscan = [config['params'] for config in configs if config['algorithm'] == 'dbscan']
+        if dbscan:
+            self.dbscan_graph = self._timed('dbscan_neighbors', DBSCANGraph, X,
+                                            max(float(p.get('eps', 0.5)) for p in dbscan),
+                                            max(int(p.get('minPts', 3)) for p in dbscan))
+
+        self.linkages = {}
+        for config in configs:
+            params = config['params']
+            if config['algorithm'] == 'agglomerative' and len(X) >= 2 and not params.get('precluster'):
+                method = params.get('linkage', 'ward')
+                if method not in self.linkages:
+                    self.linkages[method] = self._timed(f'linkage:{method}', build_linkage, X, method)
+
+    def _timed(self, name, func, *args):
+        started = time.perf_counter()
+        result = func(*args)
+        self.timings[name] = round(time.perf_counter() - started, 6)
+        return result
+
+
+def _run_one(shared, config):
+    """Final labels of one configuration."""
+    X, algorithm, params = shared.X, config['algorithm'], config['params']
+    if algorithm == 'dbscan':
+        return shared.dbscan_graph.labels(float(params.get('eps', 0.5)), int(params.get('minPts', 3)))
+    Z = shared.linkages.get(params.get('linkage', 'ward')) if algorithm == 'agglomerative' else None
+    history = run_steps(algorithm, X, make_steps(algorithm, X, params, config['seed'], Z=Z), final_only=True)
+    if not len(history):
+        raise ValueError(f'{algorithm} produced no result for these parameters')
+    return history.labels(-1).astype(int)
+
+
+def compare_algorithms(points, configs, include_labels=True, with_silhouette=True):
+    """
+    Run ``configs`` (dicts with 'algorithm', 'params' and 'seed') on the
+    same points. Returns per-configuration labels, run time and quality
+    metrics, the pairwise agreement of their labelings (ARI / NMI) and the
+    time spent on the shared precomputation.
+    """
+    X = np.asarray(points, dtype=float)
+    if X.ndim != 2 or len(X) == 0:
+        raise ValueError('No points')
+    shared = _Shared(X, configs)
+
+    def run(config):
+        started = time.perf_counter()
+        labels = _run_one(shared, config)
+        elapsed = time.perf_counter() - started
+        metrics = compute_metrics(X, labels, with_silhouette=with_silhouette)
+        return labels, round(elapsed, 6), metrics
+
+    outcomes = parallel_map(run, configs)
+
+    results = []
+    for config, (labels, elapsed, metrics) in zip(configs, outcomes):
+        result = {'algorithm': config['algorithm'], 'params': config['params'], 'seed': config['seed'],
+                  'time': elapsed, 'metrics': metrics}
+        if include_labels:
+            result['labels'] = labels.tolist()
+        results.append(result)
+    return {
+        'results': results,
+        'agreement': agreement_matrix([labels for labels, _, _ in outcomes]),
+        'precompute': shared.timings,
+    }
@@ -0,0 +1,7 @@
+"""Access to the ``SIMULATOR_*`` settings, usable without configured Django settings."""
+from django.conf import settings
+
+
+def setting(name, default):
+    """Value of the Django setting ``name``, or ``default`` if unset or settings are not configured."""
+    return getattr(settings, name, default) if settings.configured else default
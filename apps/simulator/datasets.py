@@ -0,0 +1,158 @@
+"""
+Uploaded point sets, addressed by their content.
+
+A client uploads its points once to /dataset/ and then sends the returned
+``dataset_id`` instead of the point list. The id is the SHA-1 of the shape
+and the float64 bytes, so the same points always get the same id, in any
+worker, and it doubles as a stable cache key for results derived from them
+(hashing an array held by the store is a dictionary lookup).
+
+Parsed arrays are kept in a per-process LRU bounded by
+``SIMULATOR_DATASET_MEMORY_MB`` and written once as ``<id>.npy`` (or a
+compressed ``<id>.npz`` for file uploads) to ``SIMULATOR_DATASET_DIR``,
+which all workers share: a dataset evicted from
+memory, or uploaded through another worker, is loaded back from there. The
+least recently used files go once the directory exceeds
+``SIMULATOR_DATASET_DISK_MB``.
+"""
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .conf import setting
+
+DEFAULT_MEMORY_MB = 256
+DEFAULT_DISK_MB = 2048
+
+_ID_PATTERN = re.compile(r'^[0-9a-f]{40}$')
+
+_lock = threading.Lock()
+_arrays = OrderedDict()
+# id() of every array in _arrays -> its dataset id
+_ids = {}
+_nbytes = 0
+
+
+def _directory():
+    path = setting('SIMULATOR_DATASET_DIR', None) or os.path.join(tempfile.gettempdir(), 'simulator-datasets')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _path(dataset_id, extension='.npy'):
+    return os.path.join(_directory(), f'{dataset_id}{extension}')
+
+
+def as_dataset(points):
+    """Points as the canonical read-only float64 (n, d) array the id is computed from."""
+    X = np.array(points, dtype=np.float64, order='C')
+    if X.size == 0:
+        X = X.reshape(0, 2)
+    if X.ndim != 2:
+        raise ValueError('Points must be a list of coordinate pairs')
+    if not np.isfinite(X).all():
+        raise ValueError('Points must be finite numbers')
+    X.flags.writeable = False
+    return X
+
+
+def dataset_id(X):
+    """Content hash of a point array (free for arrays returned by this module)."""
+    with _lock:
+        key = _ids.get(id(X))
+        if key is not None and _arrays.get(key) is X:
+            return key
+    digest = hashlib.sha1(repr(X.shape).encode())
+    digest.update(np.ascontiguousarray(X, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+def _remember(key, X):
+    """
+    Put an array in the in-memory LRU, evicting the least recently used,
+    and return the array held for ``key``.
+    """
+    global _nbytes
+    limit = setting('SIMULATOR_DATASET_MEMORY_MB', DEFAULT_MEMORY_MB) * 1024 * 1024
+    with _lock:
+        if key in _arrays:
+            _arrays.move_to_end(key)
+            return _arrays[key]
+        _arrays[key] = X
+        _ids[id(X)] = key
+        _nbytes += X.nbytes
+        while _nbytes > limit and len(_arrays) > 1:
+            _, evicted = _arrays.popitem(last=False)
+            del _ids[id(evicted)]
+            _nbytes -= evicted.nbytes
+    return X
+
+
+def _prune_disk(directory):
+    limit = setting('SIMULATOR_DATASET_DISK_MB', DEFAULT_DISK_MB) * 1024 * 1024
+    entries = []
+    for entry in os.scandir(directory):
+        if entry.name.endswith(('.npy', '.npz')):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries)[:-1]:
+        if total <= limit:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:  # removed by another worker
+            pass
+        total -= size
+
+
+def save_dataset(points, compressed=False):
+    """
+    Store points (any ``normalize_points`` output) and return
+    ``(dataset_id, array)``; ``compressed`` writes a zlib-compressed .npz.
+    """
+    X = as_dataset(points)
+    key = dataset_id(X)
+    path = _path(key, '.npz' if compressed else '.npy')
+    if not os.path.exists(_path(key)) and not os.path.exists(_path(key, '.npz')):
+        # Write to a private name first so other workers never see half a file
+        fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            if compressed:
+                np.savez_compressed(f, points=X)
+            else:
+                np.save(f, X)
+        os.replace(tmp, path)
+        _prune_disk(os.path.dirname(path))
+    return key, _remember(key, X)
+
+
+def load_dataset(dataset_id):
+    """Array of a stored dataset; raises KeyError if it is unknown or was pruned."""
+    if not isinstance(dataset_id, str) or not _ID_PATTERN.match(dataset_id):
+        raise KeyError(dataset_id)
+    with _lock:
+        X = _arrays.get(dataset_id)
+        if X is not None:
+            _arrays.move_to_end(dataset_id)
+            return X
+    for path in (_path(dataset_id), _path(dataset_id, '.npz')):
+        try:
+            if path.endswith('.npz'):
+                with np.load(path) as archive:
+                    X = archive['points']
+            else:
+                X = np.load(path)
+        except FileNotFoundError:
+            continue
+        os.utime(path)
+        break
+    else:
+        raise KeyError(dataset_id)
+    X.flags.writeable = False
+    return _remember(dataset_id, X)
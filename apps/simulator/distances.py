@@ -0,0 +1,164 @@
+"""
+Shared Euclidean distance kernel and dtype policy for the clustering engines.
+
+Squared distances are computed as ||x||² + ||y||² - 2·xᵀy, so the heavy part
+is one matrix product per block of rows. Blocks are sized so that a block
+of the distance matrix stays within a memory budget (the
+``SIMULATOR_DISTANCE_MEMORY_MB`` setting, 64 MB by default), and the
+reductions the algorithms need - nearest row, radius masks, counts and
+sums - are applied block by block, so an N×M matrix only exists in full
+when ``sq_distances`` is asked for one.
+
+Large inputs are computed in float32 (``SIMULATOR_COMPUTE_DTYPE``: 'auto',
+'float32' or 'float64'; 'auto' switches at ``SIMULATOR_FLOAT32_MIN_N``
+points), which halves memory traffic in the distance loops. Sums that feed
+means are accumulated in float64 or around a centered origin, so only the
+distance comparisons themselves run at the lower precision.
+"""
+import numpy as np
+
+from .conf import setting
+
+DEFAULT_MEMORY_MB = 64
+DEFAULT_COMPUTE_DTYPE = 'auto'
+DEFAULT_FLOAT32_MIN_N = 20_000
+
+
+def memory_budget():
+    """Bytes one distance block may take."""
+    return int(setting('SIMULATOR_DISTANCE_MEMORY_MB', DEFAULT_MEMORY_MB) * 2 ** 20)
+
+
+def compute_dtype(n_points):
+    """Floating point type the engines use for a dataset of ``n_points``."""
+    policy = setting('SIMULATOR_COMPUTE_DTYPE', DEFAULT_COMPUTE_DTYPE)
+    if policy == 'auto':
+        min_n = setting('SIMULATOR_FLOAT32_MIN_N', DEFAULT_FLOAT32_MIN_N)
+        return np.dtype(np.float32) if n_points >= min_n else np.dtype(np.float64)
+    if policy not in ('float32', 'float64'):
+        raise ValueError(f"SIMULATOR_COMPUTE_DTYPE must be 'auto', 'float32' or 'float64', got {policy!r}")
+    return np.dtype(policy)
+
+
+def as_compute(X):
+    """``X`` as an array of the policy dtype (no copy if it already is)."""
+    X = np.asarray(X)
+    return X.astype(compute_dtype(len(X)), copy=False)
+
+
+def row_sq_norms(X):
+    return np.einsum('ij,ij->i', X, X)
+
+
+def block_rows(n_cols, itemsize=8, budget=None):
+    """Rows per block so that a (rows, n_cols) block fits the budget."""
+    budget = memory_budget() if budget is None else budget
+    # The product, the squared norms broadcast and the reduction temporaries
+    return max(1, budget // (3 * max(n_cols, 1) * itemsize))
+
+
+def sq_dist_blocks(X, Y, X_norms=None, Y_norms=None, budget=None):
+    """
+    Yield ``(start, stop, d2)`` with the squared distances from rows
+    ``X[start:stop]`` to all rows of ``Y``. Precomputed squared row norms can
+    be passed in when the same arrays are used repeatedly.
+    """
+    # Integer input (clicked canvas points) is computed in floating point
+    dtype = np.result_type(X, Y, np.float32)
+    X, Y = np.asarray(X, dtype=dtype), np.asarray(Y, dtype=dtype)
+    X_norms = row_sq_norms(X) if X_norms is None else X_norms
+    Y_norms = row_sq_norms(Y) if Y_norms is None else Y_norms
+    step = block_rows(len(Y), np.dtype(dtype).itemsize, budget)
+    for start in range(0, len(X), step):
+        stop = min(start + step, len(X))
+        d2 = X[start:stop] @ Y.T
+        d2 *= -2
+        d2 += X_norms[start:stop, np.newaxis]
+        d2 += Y_norms[np.newaxis]
+        # Rounding can leave tiny negatives for (near-)identical points
+        np.maximum(d2, 0, out=d2)
+        yield start, stop, d2
+
+
+def radius_threshold(r, dtype, *norms):
+    """
+    Threshold for ``d2 <= r²`` tests, widened by the rounding bound of the
+    norm expansion: points exactly at distance r (lattice data such as the
+    grid preset) then count as inside at every precision instead of
+    depending on rounding noise.
+    """
+    scale = sum(float(n.max()) for n in norms if len(n))
+    return r * r + 4 * np.finfo(dtype).eps * (scale + r * r)
+
+
+def sq_distances(X, Y):
+    """Full squared distance matrix; only for inputs known to be small."""
+    out = np.empty((len(X), len(Y)), dtype=np.result_type(X, Y, np.float32))
+    for start, stop, d2 in sq_dist_blocks(X, Y):
+        out[start:stop] = d2
+    return out
+
+
+def paired_sq_distances(A, B):
+    """Squared distance between matching rows of ``A`` and ``B``."""
+    diff = np.asarray(A) - np.asarray(B)
+    return row_sq_norms(np.atleast_2d(diff))
+
+
+def nearest(X, Y, Y_norms=None):
+    """Index of the nearest ``Y`` row for every ``X`` row and the squared distance to it."""
+    labels = np.empty(len(X), dtype=np.intp)
+    best = np.empty(len(X), dtype=np.result_type(X, Y, np.float32))
+    for start, stop, d2 in sq_dist_blocks(X, Y, Y_norms=Y_norms):
+        labels[start:stop] = np.argmin(d2, axis=1)
+        best[start:stop] = d2[np.arange(stop - start), labels[start:stop]]
+    return labels, best
+
+
+def within_radius(X, center, r):
+    """
+    Indices of the ``X`` rows within distance ``r`` of one point. With a
+    single center the norm expansion saves nothing, so differences are used
+    directly (no cancellation at float32).
+    """
+    X = np.asarray(X, dtype=np.result_type(X, np.float32))
+    center = np.asarray(center, dtype=X.dtype)
+    d2 = row_sq_norms(X - center)
+    # Differences round relative to themselves, so the tie margin scales with r² only
+    return np.nonzero(d2 <= radius_threshold(r, X.dtype))[0]
+
+
+def radius_counts(X, Y, r):
+    """Number of ``Y`` rows within ``r`` of every ``X`` row."""
+    dtype = np.result_type(X, Y, np.float32)
+    X, Y = np.asarray(X, dtype=dtype), np.asarray(Y, dtype=dtype)
+    X_norms, Y_norms = row_sq_norms(X), row_sq_norms(Y)
+    threshold = radius_threshold(r, dtype, X_norms, Y_norms)
+    counts = np.empty(len(X), dtype=np.intp)
+    for start, stop, d2 in sq_dist_blocks(X, Y, X_norms, Y_norms):
+        counts[start:stop] = np.count_nonzero(d2 <= threshold, axis=1)
+    return counts
+
+
+def radius_sums(X, Y, r, values=None):
+    """
+    For every ``X`` row, the sum of ``values`` rows (default: ``Y`` itself)
+    over the ``Y`` rows within ``r``, and their count - the flat-kernel
+    update of Mean Shift without the N×M weight matrix.
+    """
+    dtype = np.result_type(X, Y, np.float32)
+    X, Y = np.asarray(X, dtype=dtype), np.asarray(Y, dtype=dtype)
+    values = Y if values is None else np.asarray(values)
+    X_norms, Y_norms = row_sq_norms(X), row_sq_norms(Y)
+    threshold = radius_threshold(r, dtype, X_norms, Y_norms)
+    # Sum offsets from the mean: small magnitudes keep float32 sums accurate
+    origin = values.mean(axis=0, dtype=np.float64)
+    centered = (values - origin).astype(dtype, copy=False)
+    sums = np.empty((len(X), values.shape[1]))
+    counts = np.empty(len(X), dtype=np.intp)
+    for start, stop, d2 in sq_dist_blocks(X, Y, X_norms, Y_norms):
+        mask = d2 <= threshold
+        counts[start:stop] = np.count_nonzero(mask, axis=1)
+        sums[start:stop] = mask.astype(dtype) @ centered
+    sums += counts[:, np.newaxis] * origin
+    return sums, counts
@@ -0,0 +1,297 @@
+"""
+Hierarchical clustering engine for the simulator.
+
+Small datasets go straight to SciPy's ``linkage``, which needs the N²/2
+condensed distance matrix. Large datasets avoid that matrix:
+
+* single linkage - exact Euclidean MST (a subgraph of the Delaunay
+  triangulation in 2D), replayed into merges with union-find;
+* ward - agglomeration constrained to a k-nearest-neighbor graph
+  (scikit-learn), an approximation that needs O(N·k) memory;
+* average / complete - pre-clustering into micro-clusters, exact linkage
+  inside each micro-cluster and between their centroids. Connectivity
+  constraints make these two methods peel off single outliers at the top
+  of the tree, which pre-clustering does not.
+
+Every path returns a standard SciPy linkage matrix, so ``fcluster`` and
+``dendrogram`` work on the result unchanged.
+
+``dendrogram_lod`` lays out only the top merges of a (sub)tree, like
+SciPy's ``truncate_mode='lastp'``, so the dendrogram sent to the browser
+stays small at any N and collapsed nodes can be expanded one at a time.
+"""
+import heapq
+import warnings
+
+import numpy as np
+from scipy.cluster.hierarchy import linkage
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import minimum_spanning_tree
+from scipy.spatial import Delaunay, QhullError, cKDTree
+
+from . import jit
+from .distances import paired_sq_distances
+
+LINKAGE_METHODS = ('ward', 'single', 'average', 'complete')
+
+# Largest N for the exact SciPy path (condensed matrix ~100 MB at float64)
+EXACT_MAX_N = 5000
+# Neighbors per point in the connectivity graph of the approximate Ward path
+KNN_NEIGHBORS = 10
+# Micro-clusters used by the pre-clustered average/complete path
+PRECLUSTER_SIZE = 2000
+# Visible leaves (expanded merges + 1) of a level-of-detail dendrogram
+DENDROGRAM_LEAVES = 30
+
+
+def _union_find_linkage(n, edges, weights):
+    """
+    Replay edges in order of weight into a linkage matrix (Kruskal).
+    ``edges`` must connect all n points.
+    """
+    order = np.argsort(weights, kind='stable')
+    if jit.enabled():
+        Z, row = jit.union_find_replay(
+            n, edges[order, 0].astype(np.int64), edges[order, 1].astype(np.int64),
+            np.asarray(weights, dtype=np.float64)[order],
+        )
+        if row != n - 1:
+            raise ValueError('Edge graph is not connected')
+        return Z
+
+    parent = np.arange(2 * n - 1)
+    size = np.ones(2 * n - 1, dtype=int)
+    Z = np.empty((n - 1, 4))
+
+    def find(x):
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    row = 0
+    for e in order:
+        a, b = find(edges[e, 0]), find(edges[e, 1])
+        if a == b:
+            continue
+        node = n + row
+        parent[a] = parent[b] = node
+        size[node] = size[a] + size[b]
+        Z[row] = (min(a, b), max(a, b), weights[e], size[node])
+        row += 1
+        if row == n - 1:
+            break
+
+    if row != n - 1:
+        raise ValueError('Edge graph is not connected')
+    return Z
+
+
+def _delaunay_mst_linkage(X):
+    """
+    Exact single linkage for 2D points from the Euclidean MST, which is
+    contained in the Delaunay triangulation. Duplicate points are merged
+    at distance 0 first, since Qhull drops them.
+    """
+    n = len(X)
+    unique, first, inverse = np.unique(X, axis=0, return_index=True, return_inverse=True)
+    inverse = inverse.ravel()
+
+    simplices = Delaunay(unique).simplices
+    tri_edges = np.vstack([simplices[:, [0, 1]], simplices[:, [1, 2]], simplices[:, [0, 2]]])
+    tri_edges = np.unique(np.sort(tri_edges, axis=1), axis=0)
+    lengths = np.sqrt(paired_sq_distances(unique[tri_edges[:, 0]], unique[tri_edges[:, 1]]))
+    m = len(unique)
+    graph = coo_matrix((lengths, (tri_edges[:, 0], tri_edges[:, 1])), shape=(m, m))
+    mst = minimum_spanning_tree(graph).tocoo()
+
+    # MST edges between representatives, plus zero-length edges for duplicates
+    dup = np.nonzero(first[inverse] != np.arange(n))[0]
+    edges = np.vstack([
+        np.column_stack([first[mst.row], first[mst.col]]),
+        np.column_stack([dup, first[inverse[dup]]]),
+    ])
+    weights = np.concatenate([mst.data, np.zeros(len(dup))])
+    return _union_find_linkage(n, edges, weights)
+
+
+def _knn_constrained_linkage(X, method, n_neighbors=KNN_NEIGHBORS):
+    """
+    Agglomeration restricted to merges along a kNN graph (scikit-learn
+    reconnects disconnected components itself), converted to SciPy format.
+    """
+    from sklearn.cluster import AgglomerativeClustering
+    from sklearn.neighbors import kneighbors_graph
+
+    n = len(X)
+    connectivity = kneighbors_graph(X, min(n_neighbors, n - 1), include_self=False)
+    model = AgglomerativeClustering(
+        n_clusters=1, linkage=method, connectivity=connectivity,
+        compute_full_tree=True, compute_distances=True,
+    )
+    with warnings.catch_warnings():
+        # The reconnection of a disconnected kNN graph is expected here
+        warnings.filterwarnings('ignore', message='the number of connected components', category=UserWarning)
+        model.fit(X)
+
+    children = model.children_
+    counts = np.ones(2 * n - 1)
+    for i, (a, b) in enumerate(children):
+        counts[n + i] = counts[a] + counts[b]
+    return np.column_stack([children, model.distances_, counts[n:]]).astype(float)
+
+
+def _make_monotonic(Z, n):
+    """Raise merge heights so no parent sits below its children."""
+    heights = np.zeros(2 * n - 1)
+    for i in range(len(Z)):
+        a, b = int(Z[i, 0]), int(Z[i, 1])
+        Z[i, 2] = max(Z[i, 2], heights[a], heights[b])
+        heights[n + i] = Z[i, 2]
+    return Z
+
+
+def _micro_clusters(X, n_micro, n_iters=3, seed=0):
+    """
+    Cheap K-Means for pre-clustering: random points as initial centers, a
+    few Lloyd rounds with KD-tree assignment. Returns one id per point.
+    """
+    rng = np.random.default_rng(seed)
+    centers = X[rng.choice(len(X), n_micro, replace=False)]
+    for _ in range(n_iters):
+        _, assignment = cKDTree(centers).query(X)
+        counts = np.bincount(assignment, minlength=n_micro)
+        sums = np.stack([np.bincount(assignment, weights=X[:, j], minlength=n_micro) for j in range(X.shape[1])], axis=1)
+        nonempty = counts > 0
+        centers[nonempty] = sums[nonempty] / counts[nonempty, np.newaxis]
+    _, assignment = cKDTree(centers).query(X)
+    return assignment
+
+
+def _precluster_linkage(X, method, n_micro=PRECLUSTER_SIZE, seed=0):
+    """
+    Approximate linkage: split the points into micro-clusters with K-Means,
+    build an exact linkage inside every micro-cluster, then link the
+    micro-cluster centroids and stitch the trees into one N-leaf matrix.
+    """
+    n = len(X)
+    assignment = _micro_clusters(X, min(n_micro, n), seed=seed)
+    micro_ids = np.unique(assignment)
+    order = np.argsort(assignment, kind='stable')
+    bounds = np.searchsorted(assignment[order], micro_ids)
+    members = np.split(order, bounds[1:])
+
+    rows = []
+    roots = np.empty(len(members), dtype=int)
+    next_id = n
+    for j, idx in enumerate(members):
+        if len(idx) == 1:
+            roots[j] = idx[0]
+            continue
+        local = linkage(X[idx], method=method)
+        # Local ids -> global ids: leaves to point indices, nodes to new rows
+        mapping = np.concatenate([idx, np.arange(next_id, next_id + len(idx) - 1)])
+        local[:, :2] = mapping[local[:, :2].astype(int)]
+        rows.append(local)
+        next_id += len(idx) - 1
+        roots[j] = next_id - 1
+
+    centroids = np.array([X[idx].mean(axis=0) for idx in members])
+    top = linkage(centroids, method=method)
+    mapping = np.concatenate([roots, np.arange(next_id, next_id + len(members) - 1)])
+    top[:, :2] = mapping[top[:, :2].astype(int)]
+    rows.append(top)
+
+    Z = np.vstack(rows)
+    # Recompute cluster sizes for the top-level rows (they count micro-clusters)
+    sizes = np.ones(2 * n - 1)
+    for i in range(len(Z)):
+        sizes[n + i] = sizes[int(Z[i, 0])] + sizes[int(Z[i, 1])]
+    Z[:, 3] = sizes[n:]
+    return _make_monotonic(Z, n)
+
+
+def build_linkage(points, method='ward', exact_max_n=EXACT_MAX_N):
+    """
+    Linkage matrix for ``points`` with the given method, choosing a
+    memory-bounded strategy when N exceeds ``exact_max_n``.
+    """
+    if method not in LINKAGE_METHODS:
+        raise ValueError(f"Unknown linkage method: {method}. Allowed: {', '.join(LINKAGE_METHODS)}")
+    X = np.asarray(points, dtype=float)
+    n = len(X)
+
+    if n <= exact_max_n:
+        return linkage(X, method=method)
+
+    if method == 'single' and X.shape[1] == 2:
+        try:
+            return _delaunay_mst_linkage(X)
+        except (QhullError, ValueError):
+            # Degenerate input (e.g. all points collinear): use the kNN graph
+            pass
+
+    if method in ('average', 'complete'):
+        return _precluster_linkage(X, method)
+    return _knn_constrained_linkage(X, method)
+
+
+def _compact_float(x):
+    # Six significant digits are plenty for plotting and keep payloads short
+    return float(f'{x:.6g}')
+
+
+def dendrogram_lod(Z, p=DENDROGRAM_LEAVES, node=None):
+    """
+    Layout of the subtree under ``node`` (default: the root) cut to at most
+    ``p`` leaves by expanding its highest merges first. Leaves that are
+    not single points are collapsed clusters and can be passed back as
+    ``node``. Coordinates follow SciPy's ``dendrogram`` (leaf i at x =
+    10·i + 5, collapsed leaves at height 0) and are packed flat: link j is
+    ``icoord[4j:4j+4]`` / ``dcoord[4j:4j+4]``.
+    """
+    Z = np.asarray(Z)
+    n = len(Z) + 1
+    root = 2 * n - 2 if node is None else int(node)
+    if not 0 <= root <= 2 * n - 2:
+        raise ValueError(f'Node {root} is not in the tree (0..{2 * n - 2})')
+
+    def height(v):
+        return float(Z[v - n, 2]) if v >= n else 0.0
+
+    def size(v):
+        return int(Z[v - n, 3]) if v >= n else 1
+
+    expanded = set()
+    heap = [(-height(root), -root)] if root >= n else []
+    while heap and len(expanded) + 1 < max(1, p):
+        _, v = heapq.heappop(heap)
+        v = -v
+        expanded.add(v)
+        for child in (int(c) for c in Z[v - n, :2]):
+            if child >= n:
+                heapq.heappush(heap, (-height(child), -child))
+
+    out = {'node': root, 'size': size(root), 'icoord': [], 'dcoord': [], 'link_nodes': [],
+           'leaf_nodes': [], 'leaf_sizes': [], 'leaf_heights': []}
+
+    def place(v):
+        """Lay out ``v``'s visible subtree; returns its (x, height)."""
+        if v not in expanded:
+            x = 10 * len(out['leaf_nodes']) + 5
+            out['leaf_nodes'].append(v)
+            out['leaf_sizes'].append(size(v))
+            out['leaf_heights'].append(_compact_float(height(v)))
+            return x, 0.0
+        a, b = (int(c) for c in Z[v - n, :2])
+        (xa, ha), (xb, hb) = place(a), place(b)
+        h = _compact_float(height(v))
+        out['icoord'] += [xa, xa, xb, xb]
+        out['dcoord'] += [ha, h, h, hb]
+        out['link_nodes'].append(v)
+        return (xa + xb) / 2, h
+
+    place(root)
+    return out
@@ -0,0 +1,225 @@
+"""
+Array-backed step history for the clustering algorithms.
+
+Algorithms used to append a dict of fresh Python lists per step. The
+recorder instead copies every step into preallocated NumPy buffers that
+grow geometrically, and builds the JSON wire format once, at the end.
+"""
+import numpy as np
+
+
+def _label_dtype(n_points):
+    # Labels range from -1 (noise) to at most n_points - 1
+    return np.int16 if n_points < np.iinfo(np.int16).max else np.int32
+
+
+class HistoryRecorder:
+    """
+    Step buffers for one algorithm run.
+
+    Every step has a label vector. Optional per-step fields are declared up
+    front:
+
+    * ``centroids=True`` - a variable-size set of centroids per step;
+    * ``scalars`` - ``{name: int | float}``, e.g. ``inertia`` or ``current``;
+      a missing value is stored as NaN and emitted as ``None``;
+    * ``points`` - names of single optional points (FOREL's ``center``);
+    * ``index_lists`` - names of variable-length index lists (DBSCAN's
+      ``neighbors``), stored ragged as one flat buffer plus offsets;
+    * ``point_lists`` - names of variable-length point lists, stored the
+      same way (spectral clustering's ``embedding``, sent on one step only);
+    * ``value_lists`` - names of variable-length float lists (the GMM's
+      per-point ``confidence``).
+
+    ``to_list()`` produces exactly the dicts the algorithms used to build.
+    """
+
+    def __init__(self, n_points, n_features=2, centroids=False, scalars=None,
+                 points=(), index_lists=(), point_lists=(), value_lists=(), capacity=16):
+        self.n_points = n_points
+        self.n_features = n_features
+        self.n_steps = 0
+        self._capacity = max(1, capacity)
+        self._field_order = []
+
+        self._labels = np.empty((self._capacity, n_points), dtype=_label_dtype(n_points))
+
+        self._has_centroids = centroids
+        if centroids:
+            self._field_order.append('centroids')
+            self._centroids = np.empty((self._capacity, 1, n_features))
+            self._n_centroids = np.zeros(self._capacity, dtype=np.int32)
+
+        self._scalar_types = dict(scalars or {})
+        self._scalars = {name: np.empty(self._capacity) for name in self._scalar_types}
+
+        self._points = {name: np.empty((self._capacity, n_features)) for name in points}
+
+        # Ragged lists of both kinds share the offset bookkeeping
+        self._index_data = {name: np.empty(max(n_points, 1), dtype=np.int32) for name in index_lists}
+        self._index_data.update({name: np.empty((max(n_points, 1), n_features)) for name in point_lists})
+        self._index_data.update({name: np.empty(max(n_points, 1)) for name in value_lists})
+        self._index_offsets = {name: np.zeros(self._capacity + 1, dtype=np.int64) for name in self._index_data}
+
+        self._field_order += ['labels', *self._scalar_types, *self._points, *self._index_data]
+
+    def __len__(self):
+        return self.n_steps
+
+    @property
+    def nbytes(self):
+        """Bytes held by all buffers (allocated capacity, not just used steps)."""
+        arrays = [self._labels, *self._scalars.values(), *self._points.values(),
+                  *self._index_data.values(), *self._index_offsets.values()]
+        if self._has_centroids:
+            arrays += [self._centroids, self._n_centroids]
+        return int(sum(a.nbytes for a in arrays))
+
+    def _grow(self):
+        new_capacity = max(1, self._capacity * 2)
+
+        def grown(a):
+            out = np.empty((new_capacity,) + a.shape[1:], dtype=a.dtype)
+            out[:self._capacity] = a
+            return out
+
+        self._labels = grown(self._labels)
+        if self._has_centroids:
+            self._centroids = grown(self._centroids)
+            self._n_centroids = grown(self._n_centroids)
+        self._scalars = {k: grown(v) for k, v in self._scalars.items()}
+        self._points = {k: grown(v) for k, v in self._points.items()}
+        for name, offsets in self._index_offsets.items():
+            out = np.zeros(new_capacity + 1, dtype=offsets.dtype)
+            out[:self._capacity + 1] = offsets
+            self._index_offsets[name] = out
+        self._capacity = new_capacity
+
+    def compact(self):
+        """Shrink every buffer to the recorded steps (e.g. before caching)."""
+        n = self.n_steps
+        self._labels = self._labels[:n].copy()
+        if self._has_centroids:
+            k = int(self._n_centroids[:n].max()) if n else 0
+            self._centroids = self._centroids[:n, :max(k, 1)].copy()
+            self._n_centroids = self._n_centroids[:n].copy()
+        self._scalars = {k: v[:n].copy() for k, v in self._scalars.items()}
+        self._points = {k: v[:n].copy() for k, v in self._points.items()}
+        for name, offsets in self._index_offsets.items():
+            self._index_offsets[name] = offsets[:n + 1].copy()
+            self._index_data[name] = self._index_data[name][:offsets[n]].copy()
+        self._capacity = n
+
+    def select(self, steps):
+        """Keep only ``steps`` (increasing indices), e.g. to thin a long run in place."""
+        steps = np.asarray(steps, dtype=np.intp)
+        m = len(steps)
+        self._labels[:m] = self._labels[steps]
+        if self._has_centroids:
+            self._centroids[:m] = self._centroids[steps]
+            self._n_centroids[:m] = self._n_centroids[steps]
+        for buffer in (*self._scalars.values(), *self._points.values()):
+            buffer[:m] = buffer[steps]
+        for name, offsets in self._index_offsets.items():
+            starts, ends = offsets[steps], offsets[steps + 1]
+            data = self._index_data[name]
+            kept = np.concatenate([data[a:b] for a, b in zip(starts, ends)]) if m else data[:0]
+            data[:len(kept)] = kept
+            offsets[1:m + 1] = np.cumsum(ends - starts)
+        self.n_steps = m
+
+    def record(self, labels, centroids=None, **fields):
+        """Copy one step into the buffers. Arrays may be reused by the caller afterwards."""
+        if self.n_steps == self._capacity:
+            self._grow()
+        i = self.n_steps
+        self._labels[i] = labels
+
+        if self._has_centroids:
+            k = 0 if centroids is None else len(centroids)
+            if k > self._centroids.shape[1]:
+                wider = np.empty((self._capacity, max(k, 2 * self._centroids.shape[1]), self.n_features))
+                wider[:, :self._centroids.shape[1]] = self._centroids
+                self._centroids = wider
+            if k:
+                self._centroids[i, :k] = centroids
+            self._n_centroids[i] = k
+
+        for name in self._scalars:
+            value = fields.get(name)
+            self._scalars[name][i] = np.nan if value is None else value
+
+        for name in self._points:
+            value = fields.get(name)
+            self._points[name][i] = np.nan if value is None else value
+
+        for name, offsets in self._index_offsets.items():
+            values = fields.get(name)
+            values = self._index_data[name][:0] if values is None else values
+            start = offsets[i]
+            end = start + len(values)
+            data = self._index_data[name]
+            if end > len(data):
+                bigger = np.empty((max(end, 2 * len(data)),) + data.shape[1:], dtype=data.dtype)
+                bigger[:start] = data[:start]
+                self._index_data[name] = data = bigger
+            data[start:end] = values
+            offsets[i + 1] = end
+
+        self.n_steps += 1
+
+    def labels(self, i=-1):
+        """Label vector of step ``i`` as a NumPy view."""
+        return self._labels[:self.n_steps][i]
+
+    def centroids(self, i=-1):
+        """Centroids of step ``i`` as a (k, n_features) array, or None if not recorded."""
+        if not self._has_centroids:
+            return None
+        k = self._n_centroids[:self.n_steps][i]
+        return self._centroids[:self.n_steps][i][:k]
+
+    def scalar(self, name, i=-1):
+        """Scalar field of step ``i``; None if missing or not recorded by this algorithm."""
+        if name not in self._scalars:
+            return None
+        value = self._scalars[name][:self.n_steps][i]
+        return None if np.isnan(value) else self._scalar_types[name](value)
+
+    def to_list(self, start=0, stop=None):
+        """Wire format (list of step dicts) for steps ``start:stop``."""
+        start, stop, _ = slice(start, stop).indices(self.n_steps)
+        if start >= stop:
+            return []
+
+        columns = {'labels': self._labels[start:stop].tolist()}
+
+        if self._has_centroids:
+            counts = self._n_centroids[start:stop]
+            coords = self._centroids[start:stop].tolist()
+            columns['centroids'] = [
+                [{'x': c[0], 'y': c[1]} for c in step[:k]]
+                for step, k in zip(coords, counts.tolist())
+            ]
+
+        for name, cast in self._scalar_types.items():
+            values = self._scalars[name][start:stop]
+            columns[name] = [None if np.isnan(v) else cast(v) for v in values]
+
+        for name, buffer in self._points.items():
+            values = buffer[start:stop]
+            missing = np.isnan(values[:, 0]).tolist()
+            columns[name] = [
+                None if m else {'x': p[0], 'y': p[1]}
+                for p, m in zip(values.tolist(), missing)
+            ]
+
+        for name, offsets in self._index_offsets.items():
+            data = self._index_data[name][offsets[start]:offsets[stop]].tolist()
+            bounds = (offsets[start:stop + 1] - offsets[start]).tolist()
+            columns[name] = [data[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+
+        return [
+            {name: columns[name][j] for name in self._field_order}
+            for j in range(stop - start)
+        ]
@@ -0,0 +1,174 @@
+"""
+Optional Numba backend for the loop-shaped kernels.
+
+DBSCAN cluster expansion, the FOREL neighbor/mean pass and the union-find
+replay of single linkage are sequential loops that NumPy cannot vectorize
+well. When Numba is installed (and ``SIMULATOR_JIT`` is not False) the
+algorithms call the compiled versions below; otherwise they keep their
+pure NumPy/Python paths, which produce the same labels.
+
+Kernels are compiled with ``cache=True``, so the machine code is written
+next to this module once and loaded from disk by every later process;
+``warm_up()`` (run from the app config at startup) makes sure that happens
+before the first request rather than during it.
+"""
+import contextlib
+import threading
+
+import numpy as np
+
+from .conf import setting
+
+try:
+    import numba
+except ImportError:  # optional dependency
+    numba = None
+
+_override = threading.local()
+
+
+def _dbscan_expand(X, threshold, min_pts, queue, head, tail, labels, visited, cluster_id, max_visits):
+    """
+    Grow cluster ``cluster_id`` from ``queue[head:tail]`` exactly like the
+    Python loop in ``iter_dbscan``: FIFO queue, neighbors found by a linear
+    scan. Stops after ``max_visits`` newly visited points so the caller can
+    report progress; returns (queue, head, tail, visits) to resume from.
+    """
+    n, d = X.shape
+    neighbors = np.empty(n, dtype=np.int64)
+    visits = 0
+
+    while head < tail and visits < max_visits:
+        p = queue[head]
+        head += 1
+        if not visited[p]:
+            visited[p] = True
+            visits += 1
+            count = 0
+            for j in range(n):
+                # Started from the first term so the sum keeps X's dtype
+                diff = X[j, 0] - X[p, 0]
+                s = diff * diff
+                for k in range(1, d):
+                    diff = X[j, k] - X[p, k]
+                    s += diff * diff
+                if s <= threshold:
+                    neighbors[count] = j
+                    count += 1
+            if count >= min_pts:
+                if tail + count > len(queue):
+                    grown = np.empty(max(16, 2 * len(queue), tail + count), dtype=np.int64)
+                    grown[:tail] = queue[:tail]
+                    queue = grown
+                queue[tail:tail + count] = neighbors[:count]
+                tail += count
+        if labels[p] == -1:
+            labels[p] = cluster_id
+    return queue, head, tail, visits
+
+
+def _forel_neighbors(X, remaining, center, threshold):
+    """
+    One FOREL pass over the remaining points: mask of those within the
+    sphere (squared distances in X's dtype, like the NumPy path), their
+    mean (accumulated in float64) and their count.
+    """
+    d = X.shape[1]
+    mask = np.zeros(len(remaining), dtype=np.bool_)
+    total = np.zeros(d)
+    count = 0
+    for t in range(len(remaining)):
+        j = remaining[t]
+        diff = X[j, 0] - center[0]
+        s = diff * diff
+        for k in range(1, d):
+            diff = X[j, k] - center[k]
+            s += diff * diff
+        if s <= threshold:
+            mask[t] = True
+            count += 1
+            for k in range(d):
+                total[k] += X[j, k]
+    return mask, total / max(count, 1), count
+
+
+def _union_find_replay(n, a, b, weights):
+    """
+    Kruskal replay of weight-sorted edges (a[e], b[e]) into a linkage
+    matrix; returns (Z, merges done).
+    """
+    parent = np.arange(2 * n - 1)
+    size = np.ones(2 * n - 1, dtype=np.int64)
+    Z = np.empty((n - 1, 4))
+    row = 0
+    for e in range(len(a)):
+        # Find both roots, compressing the paths on the way
+        ra = a[e]
+        while parent[ra] != ra:
+            ra = parent[ra]
+        x = a[e]
+        while parent[x] != ra:
+            parent[x], x = ra, parent[x]
+        rb = b[e]
+        while parent[rb] != rb:
+            rb = parent[rb]
+        x = b[e]
+        while parent[x] != rb:
+            parent[x], x = rb, parent[x]
+        if ra == rb:
+            continue
+        node = n + row
+        parent[ra] = node
+        parent[rb] = node
+        size[node] = size[ra] + size[rb]
+        Z[row, 0] = min(ra, rb)
+        Z[row, 1] = max(ra, rb)
+        Z[row, 2] = weights[e]
+        Z[row, 3] = size[node]
+        row += 1
+        if row == n - 1:
+            break
+    return Z, row
+
+
+def _compile(func):
+    return numba.njit(cache=True, nogil=True)(func) if numba is not None else None
+
+
+dbscan_expand = _compile(_dbscan_expand)
+forel_neighbors = _compile(_forel_neighbors)
+union_find_replay = _compile(_union_find_replay)
+
+
+def enabled():
+    """Whether the compiled kernels are used in this thread."""
+    if numba is None:
+        return False
+    override = getattr(_override, 'value', None)
+    if override is not None:
+        return override
+    return setting('SIMULATOR_JIT', True)
+
+
+@contextlib.contextmanager
+def use_jit(flag):
+    """Force the compiled (True) or pure (False) kernels inside the block."""
+    previous = getattr(_override, 'value', None)
+    _override.value = flag
+    try:
+        yield
+    finally:
+        _override.value = previous
+
+
+def warm_up():
+    """Compile (or load from the disk cache) every kernel for float32 and float64."""
+    if numba is None:
+        return False
+    for dtype in (np.float64, np.float32):
+        X = np.zeros((4, 2), dtype=dtype)
+        threshold = dtype(1.0)
+        dbscan_expand(X, threshold, 2, np.arange(2), 0, 2, -np.ones(4, dtype=np.int64), np.zeros(4, dtype=np.bool_), 0, 4)
+        forel_neighbors(X, np.arange(4), X[0], threshold)
+    union_find_replay(3, np.array([0, 1]), np.array([1, 2]), np.array([1.0, 2.0]))
+    return True
@@ -0,0 +1,60 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from apps.simulator import jit
+from apps.simulator.algorithms import make_steps, run_steps
+from apps.simulator.hierarchy import build_linkage
+
+# Algorithms with a compiled kernel and the parameters they are timed with
+CASES = {
+    'dbscan': lambda X: run_steps('dbscan', X, make_steps('dbscan', X, {'eps': 0.3, 'minPts': 5}), final_only=True),
+    'forel': lambda X: run_steps('forel', X, make_steps('forel', X, {'radius': 0.5}, seed=0), final_only=True),
+    'single linkage': lambda X: build_linkage(X, 'single'),
+}
+
+
+def _blobs(n, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform(-5, 5, size=(5, 2))
+    return centers[rng.integers(len(centers), size=n)] + rng.normal(scale=0.4, size=(n, 2))
+
+
+class Command(BaseCommand):
+    help = 'Times the loop-heavy algorithms with the NumPy path and with the Numba kernels.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,5000,20000', help='Comma-separated point counts')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per case; the best time is reported')
+
+    def _best_time(self, func, X, repeat):
+        best = np.inf
+        for _ in range(max(1, repeat)):
+            started = time.perf_counter()
+            func(X)
+            best = min(best, time.perf_counter() - started)
+        return best
+
+    def handle(self, *args, **options):
+        sizes = [int(s) for s in options['sizes'].split(',')]
+        compiled = jit.numba is not None
+        if compiled:
+            started = time.perf_counter()
+            jit.warm_up()
+            self.stdout.write(f'Numba {jit.numba.__version__}: kernels ready in {time.perf_counter() - started:.2f}s')
+        else:
+            self.stdout.write(self.style.WARNING('Numba is not installed: only the NumPy path is timed'))
+
+        self.stdout.write(f"{'algorithm':<16}{'N':>8}{'numpy, s':>12}{'numba, s':>12}{'speedup':>10}")
+        for name, func in CASES.items():
+            for n in sizes:
+                X = _blobs(n)
+                with jit.use_jit(False):
+                    numpy_time = self._best_time(func, X, options['repeat'])
+                row = f'{name:<16}{n:>8}{numpy_time:>12.3f}'
+                if compiled:
+                    with jit.use_jit(True):
+                        jit_time = self._best_time(func, X, options['repeat'])
+                    row += f'{jit_time:>12.3f}{numpy_time / jit_time:>9.1f}x'
+                self.stdout.write(row)
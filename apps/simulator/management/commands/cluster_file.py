@@ -0,0 +1,144 @@
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.simulator.algorithms import STEP_FIELDS
+from apps.simulator.batch import DEFAULT_CHUNK_ROWS, STREAMING_ALGORITHMS, cluster_dataset, open_dataset
+from apps.simulator.metrics import chunked_metrics
+
+
+def _peak_memory_mb():
+    """Peak resident set size of this process, or None where unavailable."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _parse_param(value):
+    if '=' not in value:
+        raise CommandError(f'Parameter must look like name=value, got: {value}')
+    name, raw = value.split('=', 1)
+    try:
+        return name, json.loads(raw)
+    except json.JSONDecodeError:
+        return name, raw
+
+
+class Command(BaseCommand):
+    help = (
+        'Clusters a CSV/NPY file with the simulator engines and writes labels plus summary metrics. '
+        f"Streaming (larger-than-RAM) algorithms: {', '.join(STREAMING_ALGORITHMS)}"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='Input .csv or .npy file (rows are points)')
+        parser.add_argument('--algorithm', required=True, choices=sorted(STEP_FIELDS))
+        parser.add_argument('--param', action='append', default=[], metavar='NAME=VALUE',
+                            help='Algorithm parameter as in the web API, e.g. k=5, eps=0.3, minPts=4')
+        parser.add_argument('--output', required=True, help='Labels file (.npy or .csv)')
+        parser.add_argument('--metrics-output', help='Summary JSON (default: <output>.metrics.json)')
+        parser.add_argument('--columns', help='Comma-separated CSV columns (indices or header names)')
+        parser.add_argument('--delimiter', default=',')
+        parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS)
+        parser.add_argument('--workdir', help='Where converted .npy files go (default: next to the CSV)')
+        parser.add_argument('--seed', type=int)
+        parser.add_argument('--no-silhouette', action='store_true', help='Skip the sampled silhouette')
+
+    def _progress(self, stage, step_pct=10):
+        last = {'pct': -step_pct}
+
+        def report(done, total):
+            pct = int(100 * done / total) if total else 100
+            if pct >= last['pct'] + step_pct or done == total:
+                last['pct'] = pct
+                self.stdout.write(f'  {stage}: {done}/{total} ({pct}%)')
+        return report
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        params = dict(_parse_param(p) for p in options['param'])
+        output = Path(options['output'])
+        if output.suffix.lower() not in ('.npy', '.csv'):
+            raise CommandError('--output must end with .npy or .csv')
+        columns = options['columns'].split(',') if options['columns'] else None
+        chunk_rows = max(1, options['chunk_rows'])
+
+        self.stdout.write(f"Opening {options['input']}...")
+        try:
+            X = open_dataset(
+                options['input'], workdir=options['workdir'], progress=self._progress('parse CSV'),
+                columns=columns, delimiter=options['delimiter'], chunk_rows=chunk_rows,
+            )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(f'Dataset: {X.shape[0]} points x {X.shape[1]} features')
+
+        algorithm = options['algorithm']
+        if algorithm not in STREAMING_ALGORITHMS:
+            self.stdout.write(self.style.WARNING(
+                f'{algorithm} is not streaming: the points are loaded into memory '
+                f'(~{X.shape[0] * X.shape[1] * 8 / 2 ** 20:.0f} MB)'
+            ))
+
+        # .npy labels are written in place; CSV labels go through a temporary memmap
+        temporary = output.suffix.lower() == '.csv'
+        labels_path = output.with_suffix('.labels.tmp.npy') if temporary else output
+        labels = np.lib.format.open_memmap(labels_path, mode='w+', dtype=np.int32, shape=(X.shape[0],))
+        try:
+            self.stdout.write(f'Running {algorithm} with {params}...')
+            try:
+                extras = cluster_dataset(
+                    X, algorithm, params, labels, seed=options['seed'], chunk_rows=chunk_rows,
+                    progress=self._progress('iteration (of max)', step_pct=0),
+                )
+            except ValueError as e:
+                raise CommandError(str(e))
+            labels.flush()
+
+            self.stdout.write('Computing metrics...')
+            metrics = chunked_metrics(X, labels, chunk_rows=chunk_rows, with_silhouette=not options['no_silhouette'])
+            if extras.get('inertia') is not None:
+                metrics['inertia'] = extras['inertia']
+
+            if temporary:
+                with open(output, 'w') as f:
+                    f.write('label\n')
+                    for start in range(0, len(labels), chunk_rows):
+                        np.savetxt(f, labels[start:start + chunk_rows], fmt='%d')
+        finally:
+            # The temporary memmap goes whether clustering succeeded or not
+            if temporary:
+                del labels
+                labels_path.unlink(missing_ok=True)
+
+        summary = {
+            'input': str(options['input']),
+            'algorithm': algorithm,
+            'params': params,
+            'n_points': int(X.shape[0]),
+            'n_features': int(X.shape[1]),
+            'streamed': extras['streamed'],
+            'n_iter': extras.get('n_iter'),
+            'metrics': metrics,
+            'elapsed_seconds': round(time.perf_counter() - started, 3),
+            'peak_memory_mb': _peak_memory_mb(),
+        }
+        if 'centroids' in extras:
+            summary['centroids'] = extras['centroids']
+        metrics_path = Path(options['metrics_output'] or output.with_suffix('.metrics.json'))
+        with open(metrics_path, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+        peak = summary['peak_memory_mb']
+        self.stdout.write(f"Clusters: {metrics['n_clusters']}, noise: {metrics['noise_ratio']:.1%}")
+        self.stdout.write(f"Elapsed: {summary['elapsed_seconds']}s, peak memory: "
+                          + (f'{peak:.0f} MB' if peak is not None else 'n/a'))
+        self.stdout.write(self.style.SUCCESS(f'Labels written to {output}, summary to {metrics_path}'))
@@ -0,0 +1,315 @@
+"""
+Clustering quality metrics for simulator runs.
+
+All metrics ignore noise points (label -1), the same way DBSCAN results are
+usually evaluated. Silhouette is computed exactly for small datasets and
+estimated from a stratified sample for large ones.
+"""
+import numpy as np
+from scipy import sparse
+
+from .distances import paired_sq_distances, row_sq_norms, sq_dist_blocks
+
+# Above this many (non-noise) points silhouette switches to sampling
+SILHOUETTE_EXACT_MAX_N = 2000
+SILHOUETTE_SAMPLE_SIZE = 1000
+
+
+def _to_float(value):
+    """JSON-safe float: NaN/inf become None."""
+    if value is None:
+        return None
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+
+def _cluster_summary(X, labels):
+    """
+    Drop noise and compute per-cluster counts, centroids and squared
+    distances of each point to its own cluster centroid.
+    """
+    mask = labels >= 0
+    Xc = X[mask]
+    clusters, inv = np.unique(labels[mask], return_inverse=True)
+    k = len(clusters)
+    counts = np.bincount(inv, minlength=k)
+    sums = np.stack(
+        [np.bincount(inv, weights=Xc[:, j], minlength=k) for j in range(X.shape[1])],
+        axis=1,
+    )
+    centroids = sums / counts[:, np.newaxis]
+    sq_dists = paired_sq_distances(Xc, centroids[inv])
+    return Xc, inv, counts, centroids, sq_dists
+
+
+def davies_bouldin(centroids, inv, sq_dists):
+    k = len(centroids)
+    if k < 2:
+        return None
+    scatter = np.bincount(inv, weights=np.sqrt(sq_dists), minlength=k) / np.bincount(inv, minlength=k)
+    return _davies_bouldin_from_scatter(centroids, scatter)
+
+
+def _davies_bouldin_from_scatter(centroids, scatter):
+    """Davies-Bouldin from centroids and mean distances of members to them."""
+    sep = np.sqrt(np.sum((centroids[:, np.newaxis] - centroids[np.newaxis]) ** 2, axis=2))
+    np.fill_diagonal(sep, np.inf)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratios = (scatter[:, np.newaxis] + scatter[np.newaxis]) / sep
+    ratios[~np.isfinite(ratios)] = 0.0
+    return float(np.mean(ratios.max(axis=1)))
+
+
+def calinski_harabasz(counts, centroids, sq_dists):
+    return _calinski_harabasz_from_sums(counts, centroids, sq_dists.sum())
+
+
+def _calinski_harabasz_from_sums(counts, centroids, within):
+    """Calinski-Harabasz from cluster sizes, centroids and the within-cluster SS."""
+    n, k = int(counts.sum()), len(centroids)
+    if k < 2 or n <= k:
+        return None
+    overall = counts @ centroids / n
+    between = np.sum(counts * np.sum((centroids - overall) ** 2, axis=1))
+    if within == 0:
+        return None
+    return float(between * (n - k) / (within * (k - 1)))
+
+
+def _silhouette_values(Xc, inv, counts, rows):
+    """
+    Exact silhouette coefficients for the points ``rows`` against all points.
+
+    Distances are evaluated in row blocks and immediately reduced to
+    per-cluster sums with a sparse one-hot matmul, so the full distance
+    matrix never exists.
+    """
+    n, k = len(Xc), len(counts)
+    onehot = sparse.csr_matrix((np.ones(n), (np.arange(n), inv)), shape=(n, k))
+    sq_norms = row_sq_norms(Xc)
+    values = np.empty(len(rows))
+
+    for start, stop, d2 in sq_dist_blocks(Xc[rows], Xc, X_norms=sq_norms[rows], Y_norms=sq_norms):
+        idx = rows[start:stop]
+        sums = np.asarray((onehot.T @ np.sqrt(d2).T).T)
+
+        own = inv[idx]
+        own_sizes = counts[own]
+        a = sums[np.arange(len(idx)), own] / np.maximum(own_sizes - 1, 1)
+        means = sums / counts[np.newaxis]
+        means[np.arange(len(idx)), own] = np.inf
+        b = means.min(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            s = (b - a) / np.maximum(a, b)
+        s[(own_sizes == 1) | ~np.isfinite(s)] = 0.0
+        values[start:start + len(idx)] = s
+
+    return values
+
+
+def silhouette(Xc, inv, counts, sample_size=SILHOUETTE_SAMPLE_SIZE,
+               exact_max_n=SILHOUETTE_EXACT_MAX_N, seed=0):
+    """
+    Mean silhouette coefficient.
+
+    Returns a dict ``{'value', 'exact', 'sample_size', 'ci95'}``. For large N
+    the points are sampled per cluster (proportional allocation) and the
+    stratified mean is reported with a 95% confidence half-width.
+    """
+    n, k = len(Xc), len(counts)
+    if k < 2 or n <= k:
+        return None
+
+    if n <= exact_max_n:
+        values = _silhouette_values(Xc, inv, counts, np.arange(n))
+        return {'value': float(values.mean()), 'exact': True, 'sample_size': n, 'ci95': 0.0}
+
+    rng = np.random.default_rng(seed)
+    # Proportional allocation, at least 2 points per cluster where possible
+    alloc = np.minimum(counts, np.maximum(2, np.round(sample_size * counts / n).astype(int)))
+    order = np.argsort(inv, kind='stable')
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    rows = np.concatenate([
+        rng.choice(order[s:s + c], size=m, replace=False)
+        for s, c, m in zip(starts, counts, alloc)
+    ])
+    values = _silhouette_values(Xc, inv, counts, rows)
+
+    strata = inv[rows]
+    weights = counts / n
+    means = np.bincount(strata, weights=values, minlength=k) / alloc
+    sq_dev = np.bincount(strata, weights=(values - means[strata]) ** 2, minlength=k)
+    variances = sq_dev / np.maximum(alloc - 1, 1)
+    fpc = 1.0 - alloc / counts
+    std_err = np.sqrt(np.sum(weights ** 2 * variances / alloc * fpc))
+
+    return {
+        'value': float(np.sum(weights * means)),
+        'exact': False,
+        'sample_size': int(len(rows)),
+        'ci95': float(1.96 * std_err),
+    }
+
+
+def compute_metrics(X, labels, inertia=None, with_silhouette=True):
+    """
+    Quality metrics for one labelling of ``X``.
+
+    ``inertia`` can be passed in when the algorithm already knows it (K-Means
+    computes it from the distances it uses for assignment); otherwise it is
+    the within-cluster sum of squares around the cluster means.
+    """
+    labels = np.asarray(labels)
+    Xc, inv, counts, centroids, sq_dists = _cluster_summary(X, labels)
+    metrics = {
+        'n_clusters': int(len(counts)),
+        'noise_ratio': float(np.mean(labels < 0)) if len(labels) else 0.0,
+        'inertia': _to_float(inertia if inertia is not None else sq_dists.sum()),
+        'davies_bouldin': _to_float(davies_bouldin(centroids, inv, sq_dists)),
+        'calinski_harabasz': _to_float(calinski_harabasz(counts, centroids, sq_dists)),
+    }
+    if with_silhouette:
+        metrics['silhouette'] = silhouette(Xc, inv, counts)
+    return metrics
+
+
+def chunked_metrics(X, labels, chunk_rows=100_000, with_silhouette=True, seed=0):
+    """
+    ``compute_metrics`` for arrays that need not fit in memory (e.g. memmaps):
+    two passes over row chunks accumulate per-cluster sums, then the
+    within-cluster distances. Silhouette is estimated from a uniform random
+    sample of the non-noise points.
+    """
+    n, d = X.shape
+    labels = np.asarray(labels)
+    n_noise = int(np.count_nonzero(labels < 0))
+    k = int(labels.max()) + 1 if n > n_noise else 0
+    counts = np.bincount(labels[labels >= 0], minlength=k)
+    sums = np.zeros((k, d))
+    for start in range(0, n, chunk_rows):
+        Xb, lb = np.asarray(X[start:start + chunk_rows], dtype=float), labels[start:start + chunk_rows]
+        mask = lb >= 0
+        for j in range(d):
+            sums[:, j] += np.bincount(lb[mask], weights=Xb[mask, j], minlength=k)
+
+    # Empty label ids (possible after relabeling) would break the ratios
+    present = counts > 0
+    centroids = sums[present] / counts[present, np.newaxis]
+    remap = np.cumsum(present) - 1
+    counts = counts[present]
+
+    within, dist_sums = 0.0, np.zeros(len(counts))
+    for start in range(0, n, chunk_rows):
+        Xb, lb = np.asarray(X[start:start + chunk_rows], dtype=float), labels[start:start + chunk_rows]
+        mask = lb >= 0
+        inv = remap[lb[mask]]
+        sq = paired_sq_distances(Xb[mask], centroids[inv])
+        within += sq.sum()
+        dist_sums += np.bincount(inv, weights=np.sqrt(sq), minlength=len(counts))
+
+    metrics = {
+        'n_clusters': int(len(counts)),
+        'noise_ratio': n_noise / n if n else 0.0,
+        'inertia': _to_float(within),
+        'davies_bouldin': _to_float(
+            _davies_bouldin_from_scatter(centroids, dist_sums / counts) if len(counts) >= 2 else None
+        ),
+        'calinski_harabasz': _to_float(_calinski_harabasz_from_sums(counts, centroids, within)),
+    }
+    if with_silhouette:
+        clustered = np.flatnonzero(labels >= 0)
+        rng = np.random.default_rng(seed)
+        rows = np.sort(rng.choice(clustered, min(len(clustered), SILHOUETTE_EXACT_MAX_N), replace=False))
+        _, inv = np.unique(labels[rows], return_inverse=True)
+        inv = inv.ravel()
+        sample_counts = np.bincount(inv)
+        if len(sample_counts) < 2 or len(rows) <= len(sample_counts):
+            metrics['silhouette'] = None
+        else:
+            # Silhouette within the sample; CI from the spread of per-point values
+            values = _silhouette_values(np.asarray(X[rows], dtype=float), inv, sample_counts, np.arange(len(rows)))
+            exact = len(rows) == len(clustered)
+            metrics['silhouette'] = {
+                'value': float(values.mean()),
+                'exact': exact,
+                'sample_size': int(len(rows)),
+                'ci95': 0.0 if exact else float(1.96 * values.std(ddof=1) / np.sqrt(len(values))),
+            }
+    return metrics
+
+
+def final_metrics(X, history):
+    """Full metrics (with silhouette) for the last step of a ``HistoryRecorder``."""
+    if not len(history) or len(X) == 0:
+        return None
+    return compute_metrics(X, history.labels(-1), inertia=history.scalar('inertia', -1))
+
+
+def step_metrics(X, history, start=0, stop=None):
+    """
+    Per-step metrics for steps ``start:stop``, without silhouette to keep the
+    cost linear in N.
+    """
+    if len(X) == 0:
+        return []
+    start, stop, _ = slice(start, stop).indices(len(history))
+    return [
+        compute_metrics(X, history.labels(i), inertia=history.scalar('inertia', i), with_silhouette=False)
+        for i in range(start, stop)
+    ]
+
+
+def _pairs(counts):
+    """Number of unordered pairs within groups of the given sizes."""
+    counts = np.asarray(counts, dtype=np.float64)
+    return float(np.sum(counts * (counts - 1)) / 2)
+
+
+def _entropy(counts, n):
+    p = counts[counts > 0] / n
+    return float(-np.sum(p * np.log(p)))
+
+
+def contingency(a, b):
+    """
+    Nonzero cells of the contingency table of two labelings as (row, column,
+    count) arrays plus the row and column sums; noise (-1) is one more
+    label. Built from one ``np.unique`` over combined codes, so the dense
+    k_a × k_b table never exists.
+    """
+    _, ia = np.unique(a, return_inverse=True)
+    _, ib = np.unique(b, return_inverse=True)
+    ia, ib = ia.ravel().astype(np.int64), ib.ravel().astype(np.int64)
+    kb = int(ib.max()) + 1 if len(ib) else 1
+    codes, cells = np.unique(ia * kb + ib, return_counts=True)
+    return codes // kb, codes % kb, cells, np.bincount(ia), np.bincount(ib)
+
+
+def agreement(a, b):
+    """Adjusted Rand index and normalized mutual information (arithmetic mean) of two labelings."""
+    n = len(a)
+    if n < 2:
+        return {'ari': 1.0, 'nmi': 1.0}
+    rows, cols, cells, row_sums, col_sums = contingency(a, b)
+
+    index, expected_a, expected_b = _pairs(cells), _pairs(row_sums), _pairs(col_sums)
+    expected = expected_a * expected_b / (n * (n - 1) / 2)
+    maximum = (expected_a + expected_b) / 2
+    ari = 1.0 if maximum == expected else (index - expected) / (maximum - expected)
+
+    h_a, h_b = _entropy(row_sums, n), _entropy(col_sums, n)
+    mi = float(np.sum(cells / n * np.log(cells * n / (row_sums[rows] * col_sums[cols].astype(np.float64)))))
+    nmi = 1.0 if h_a == h_b == 0 else max(0.0, mi) / ((h_a + h_b) / 2)
+    return {'ari': float(ari), 'nmi': float(min(nmi, 1.0))}
+
+
+def agreement_matrix(labelings):
+    """Pairwise ``agreement`` of several labelings as symmetric 'ari' and 'nmi' matrices."""
+    m = len(labelings)
+    ari, nmi = np.eye(m), np.eye(m)
+    for i in range(m):
+        for j in range(i + 1, m):
+            scores = agreement(labelings[i], labelings[j])
+            ari[i, j] = ari[j, i] = scores['ari']
+            nmi[i, j] = nmi[j, i] = scores['nmi']
+    return {'ari': ari.tolist(), 'nmi': nmi.tolist()}
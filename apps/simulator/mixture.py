@@ -0,0 +1,98 @@
+"""
+Gaussian mixture model fitted by expectation-maximization.
+
+Both steps work on whole (n × k) arrays, so an iteration costs O(n k d²)
+for full covariances and O(n k d) for diagonal and spherical ones, linear
+in the number of points:
+
+* E-step: per-component log densities from a Cholesky factor (full) or
+  the expanded squared distances (diag, spherical), then responsibilities
+  normalized in log space with log-sum-exp, so far-away points never
+  underflow to 0 / 0;
+* M-step: weights, means and covariances as responsibility-weighted
+  sums, with ``reg`` added to the variances to keep them positive
+  definite when a component shrinks onto a few points.
+"""
+import numpy as np
+from scipy.linalg import cholesky, solve_triangular
+from scipy.special import logsumexp
+
+COVARIANCE_TYPES = ('full', 'diag', 'spherical')
+DEFAULT_REG = 1e-6
+
+
+def _check_covariance_type(covariance_type):
+    if covariance_type not in COVARIANCE_TYPES:
+        raise ValueError(f"Unknown covariance type: {covariance_type}. Allowed: {', '.join(COVARIANCE_TYPES)}")
+
+
+def m_step(X, resp, covariance_type='full', reg=DEFAULT_REG):
+    """
+    Weights (k,), means (k, d) and covariances from responsibilities
+    ``resp`` (n, k): (k, d, d) for 'full', (k, d) variances for 'diag',
+    (k,) variances for 'spherical'.
+    """
+    _check_covariance_type(covariance_type)
+    nk = resp.sum(axis=0) + 10 * np.finfo(float).eps
+    means = resp.T @ X / nk[:, np.newaxis]
+    if covariance_type == 'full':
+        d = X.shape[1]
+        covariances = np.empty((len(nk), d, d))
+        for j in range(len(nk)):
+            diff = X - means[j]
+            covariances[j] = (resp[:, j, np.newaxis] * diff).T @ diff / nk[j]
+            covariances[j].flat[::d + 1] += reg
+    else:
+        # E[x²] - mean², clipped where rounding makes it slightly negative
+        variances = np.maximum(resp.T @ (X * X) / nk[:, np.newaxis] - means ** 2, 0) + reg
+        covariances = variances if covariance_type == 'diag' else variances.mean(axis=1)
+    return nk / nk.sum(), means, covariances
+
+
+def _log_densities(X, means, covariances, covariance_type):
+    """(n, k) log N(x | mean_j, cov_j)."""
+    n, d = X.shape
+    if covariance_type == 'full':
+        log_prob = np.empty((n, len(means)))
+        for j, cov in enumerate(covariances):
+            factor = cholesky(cov, lower=True)
+            y = solve_triangular(factor, (X - means[j]).T, lower=True)
+            log_det = 2 * np.log(np.diag(factor)).sum()
+            log_prob[:, j] = -0.5 * (np.einsum('ij,ij->j', y, y) + log_det)
+    else:
+        variances = covariances if covariance_type == 'diag' else np.repeat(covariances[:, np.newaxis], d, axis=1)
+        precisions = 1.0 / variances
+        # |x - m|² / v expanded into three matrix products
+        mahalanobis = ((X * X) @ precisions.T - 2 * X @ (means * precisions).T
+                       + np.sum(means * means * precisions, axis=1))
+        log_prob = -0.5 * (np.maximum(mahalanobis, 0) + np.log(variances).sum(axis=1))
+    return log_prob - 0.5 * d * np.log(2 * np.pi)
+
+
+def e_step(X, weights, means, covariances, covariance_type='full'):
+    """Responsibilities (n, k) and the mean per-point log-likelihood."""
+    weighted = _log_densities(X, means, covariances, covariance_type) + np.log(weights)
+    log_norm = logsumexp(weighted, axis=1)
+    return np.exp(weighted - log_norm[:, np.newaxis]), float(log_norm.mean())
+
+
+def full_covariances(covariances, covariance_type, d):
+    """Covariances of any type as (k, d, d) matrices."""
+    if covariance_type == 'full':
+        return covariances
+    variances = covariances if covariance_type == 'diag' else np.repeat(covariances[:, np.newaxis], d, axis=1)
+    return variances[:, :, np.newaxis] * np.eye(d)
+
+
+def ellipse_axes(covariances):
+    """
+    One-sigma semi-axes of each component's ellipse: rows 2j and 2j + 1 are
+    the two principal directions of component j scaled by their standard
+    deviations (the two largest ones in more than two dimensions).
+    """
+    values, vectors = np.linalg.eigh(covariances)
+    top = min(2, covariances.shape[1])
+    values, vectors = values[:, ::-1][:, :top], vectors[:, :, ::-1][:, :, :top]
+    axes = vectors * np.sqrt(np.maximum(values, 0))[:, np.newaxis, :]
+    # (k, d, axis) -> one row per axis
+    return axes.transpose(0, 2, 1).reshape(-1, covariances.shape[1])
@@ -0,0 +1,136 @@
+"""
+Running independent engine jobs side by side, within a CPU thread budget.
+
+NumPy and SciPy release the GIL inside their heavy loops, so a thread pool
+gives real parallelism for the vectorized algorithms without copying the
+dataset into worker processes.
+
+BLAS/OpenMP pools (matrix products, ``linkage``) default to one thread per
+core in every process, so N gunicorn workers oversubscribe the CPU N
+times. ``thread_budget()`` caps them through threadpoolctl: each worker
+gets ``cores // SIMULATOR_WORKERS`` threads, split between the requests it
+serves at once. A request with at least ``SIMULATOR_BORROW_MIN_N`` points
+may borrow the cores the load average shows idle. The limits are
+process-wide, so with threaded workers the split is approximate: they are
+set from the active budgets (under a lock) whenever one starts or ends,
+and go back to the worker share when the last one ends. Scoped
+``threadpool_limits`` contexts would restore whatever was set on entry
+and leak one request's limit into the requests that outlive it.
+"""
+import contextlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from threadpoolctl import threadpool_limits
+
+from .conf import setting
+
+DEFAULT_BORROW_MIN_N = 20_000
+
+_lock = threading.Lock()
+_active_requests = 0
+# Threads borrowed by a request running alone
+_borrowed = 0
+_local = threading.local()
+
+
+def cpu_count():
+    """Cores this process may run on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not on Linux
+        return os.cpu_count() or 1
+
+
+def worker_share():
+    """BLAS threads of one server worker process."""
+    return max(1, cpu_count() // max(1, int(setting('SIMULATOR_WORKERS', 1))))
+
+
+def _idle_cores():
+    try:
+        load = os.getloadavg()[0]
+    except (AttributeError, OSError):
+        return 0
+    return max(0, int(cpu_count() - load))
+
+
+def limit_worker_threads():
+    """Apply the worker share as the baseline limit (at startup)."""
+    threadpool_limits(limits=worker_share())
+
+
+def current_threads():
+    """Threads available to the calling request (the worker share outside a budget)."""
+    allocation = getattr(_local, 'allocation', None)
+    return allocation['threads'] if allocation else worker_share()
+
+
+def _apply_limits():
+    """Set the process-wide limit from the active budgets (caller holds ``_lock``)."""
+    if _active_requests == 0:
+        threadpool_limits(limits=worker_share())
+    else:
+        threadpool_limits(limits=max(1, worker_share() // _active_requests) + _borrowed)
+
+
+@contextlib.contextmanager
+def thread_budget(n_points=0):
+    """
+    Limit BLAS/OpenMP threads for one request and yield the allocation
+    (a dict for the response: threads, share, borrowed, active_requests,
+    workers, cpus).
+    """
+    global _active_requests, _borrowed
+    share = worker_share()
+    with _lock:
+        _active_requests += 1
+        active = _active_requests
+        threads = max(1, share // active)
+        borrowed = 0
+        if active == 1 and n_points >= setting('SIMULATOR_BORROW_MIN_N', DEFAULT_BORROW_MIN_N):
+            borrowed = max(0, min(cpu_count() - threads, _idle_cores()))
+        # A second request ends the borrowing
+        _borrowed = borrowed
+        _apply_limits()
+    allocation = {
+        'threads': threads + borrowed,
+        'share': share,
+        'borrowed': borrowed,
+        'active_requests': active,
+        'workers': max(1, int(setting('SIMULATOR_WORKERS', 1))),
+        'cpus': cpu_count(),
+    }
+    _local.allocation = allocation
+    try:
+        yield allocation
+    finally:
+        _local.allocation = None
+        with _lock:
+            _active_requests -= 1
+            _borrowed = 0
+            _apply_limits()
+
+
+def parallel_map(func, items, max_workers=None):
+    """
+    Like ``map(func, items)`` but spread over a thread pool; keeps order.
+    The caller's thread budget is divided between the pool threads and the
+    BLAS calls they make.
+    """
+    items = list(items)
+    budget = current_threads()
+    if max_workers is None:
+        max_workers = budget
+    workers = min(max_workers, len(items))
+    if workers <= 1:
+        return [func(item) for item in items]
+    with _lock:
+        threadpool_limits(limits=max(1, budget // workers))
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(func, items))
+    finally:
+        with _lock:
+            _apply_limits()
@@ -0,0 +1,143 @@
+"""
+Progress of simulator runs computed in the background.
+
+``run_steps`` hands every step to a ``ProgressReporter``, which publishes a
+snapshot (iteration, points processed, inertia, shift, ETA) to the run's
+progress entry at most every ``SIMULATOR_PROGRESS_INTERVAL_MS``
+milliseconds, so the per-step cost is a clock read. A heartbeat thread
+republishes the state every ``HEARTBEAT_INTERVAL`` seconds between steps,
+so 'elapsed' keeps moving during a long step and a run whose worker went
+away is recognized by its stale 'heartbeat' (see ``runs.load_progress``).
+Clients poll /run/<run_id>/progress/ until the status is 'done' or 'error'.
+
+The ETA extrapolates the fraction of work done: points visited for DBSCAN
+(also reported from inside a cluster expansion via ``visited``) and
+FOREL, points inserted into the CF-tree for BIRCH, and for the iterative
+engines (``ITERATION_CAPS``) the iterations left until the shift decays
+geometrically to its tolerance, capped by the iteration limit.
+"""
+import math
+import threading
+import time
+
+import numpy as np
+
+from .algorithms import GMM_MAX_ITERS, KMEANS_MAX_ITERS, MEAN_SHIFT_MAX_ITERS
+from .conf import setting
+from .runs import save_progress
+
+DEFAULT_INTERVAL_MS = 250
+HEARTBEAT_INTERVAL = 2.0
+
+ITERATION_CAPS = {'kmeans': KMEANS_MAX_ITERS, 'meanshift': MEAN_SHIFT_MAX_ITERS, 'spectral': KMEANS_MAX_ITERS,
+                  'gmm': GMM_MAX_ITERS}
+
+
+def _iterative_fraction(iteration, shifts, tolerance, max_iters):
+    """Share of the run done, assuming the shift keeps shrinking at its latest rate."""
+    if len(shifts) == 2 and 0 < shifts[1] < shifts[0] and tolerance:
+        rate = shifts[1] / shifts[0]
+        remaining = max(0.0, math.log(tolerance / shifts[1]) / math.log(rate))
+        return iteration / min(max_iters, iteration + remaining)
+    return iteration / max_iters
+
+
+class ProgressReporter:
+    """Step callback for ``run_steps`` that publishes throttled progress of one run."""
+
+    def __init__(self, run_id, algorithm, n_points, interval=None):
+        self.run_id = run_id
+        self.algorithm = algorithm
+        self.n_points = n_points
+        if interval is None:
+            interval = setting('SIMULATOR_PROGRESS_INTERVAL_MS', DEFAULT_INTERVAL_MS) / 1000
+        self.interval = interval
+        self.started = time.monotonic()
+        self._next = self.started + interval
+        self._shifts = []
+        self._produced = 0
+        self._visited = None
+        self._fields = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._publish('running', 0)
+        threading.Thread(target=self._beat, daemon=True).start()
+
+    def _state(self, status, step, **fields):
+        return {
+            'status': status,
+            'algorithm': self.algorithm,
+            'total_points': self.n_points,
+            'step': step,
+            'elapsed': round(time.monotonic() - self.started, 3),
+            # Wall clock, comparable across worker processes
+            'heartbeat': time.time(),
+            **fields,
+        }
+
+    def _publish(self, status, step, **fields):
+        with self._lock:
+            # A late heartbeat must not overwrite the final state
+            if status == 'running' and self._stopped.is_set():
+                return
+            save_progress(self.run_id, self._state(status, step, **fields))
+
+    def _beat(self):
+        while not self._stopped.wait(HEARTBEAT_INTERVAL):
+            self._publish('running', self._produced, **self._fields)
+
+    def __call__(self, i, step):
+        self._produced = i + 1
+        # DBSCAN visit steps carry the loop position; cluster completions do not
+        if step.get('current') is not None:
+            self._visited = max(self._visited or 0, int(step['current']) + 1)
+        shift = step.get('shift')
+        if shift is not None:
+            self._shifts = [*self._shifts[-1:], shift]
+        now = time.monotonic()
+        if now < self._next:
+            return
+        self._next = now + self.interval
+        self._fields = self.snapshot(i, step, now - self.started)
+        self._publish('running', i + 1, **self._fields)
+
+    def visited(self, count):
+        """
+        DBSCAN's visited count reported from inside a cluster expansion,
+        which yields no steps until the whole cluster is done.
+        """
+        self._visited = count
+        now = time.monotonic()
+        if now < self._next:
+            return
+        self._next = now + self.interval
+        self._fields = self.snapshot(max(self._produced - 1, 0), {}, now - self.started)
+        self._publish('running', self._produced, **self._fields)
+
+    def snapshot(self, i, step, elapsed):
+        """Algorithm-specific progress fields of step ``i``."""
+        fields = {'iteration': None, 'points_processed': None, 'inertia': step.get('inertia'),
+                  'shift': step.get('shift'), 'fraction': None, 'eta': None}
+        if self.algorithm == 'dbscan':
+            fields['points_processed'] = self._visited
+        elif self.algorithm == 'forel':
+            fields['points_processed'] = int(np.count_nonzero(step['labels'] >= 0))
+        elif step.get('processed') is not None:
+            fields['points_processed'] = int(step['processed'])
+        if self.algorithm in ITERATION_CAPS:
+            fields['iteration'] = i + 1
+            fields['fraction'] = _iterative_fraction(
+                i + 1, self._shifts, step.get('tolerance'), ITERATION_CAPS[self.algorithm])
+        elif fields['points_processed'] is not None and self.n_points:
+            fields['fraction'] = fields['points_processed'] / self.n_points
+        if fields['fraction']:
+            fields['eta'] = round(elapsed * (1 - fields['fraction']) / fields['fraction'], 3)
+        return fields
+
+    def finish(self, result):
+        self._stopped.set()
+        self._publish('done', self._produced, fraction=1.0, eta=0.0, result=result)
+
+    def fail(self, error):
+        self._stopped.set()
+        self._publish('error', self._produced, error=error)
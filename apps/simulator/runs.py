@@ -0,0 +1,104 @@
+"""
+Server-side storage of simulator runs.
+
+A run is saved under a random handle as two cache entries: the spec
+(algorithm, params, seed and the 'dataset_id' of its points) and the
+compact recorded history. The points themselves go to the content-addressed
+dataset store (``datasets.save_dataset``) rather than into the cache, so a
+run of an uploaded dataset costs no copy of it and ``load_spec`` attaches
+them again. The history is the large one and expires first; when a page is
+requested after that, the run is recomputed from the spec, which is
+deterministic because the seed is stored with it.
+
+Runs started in the background also get a progress entry, written by the
+worker thread while it runs and holding the /run/ response once done.
+
+Entries go to the 'simulator' cache (see ``CACHES`` in the settings), which
+all server workers share: the progress, steps and update requests of a run
+may reach any worker, not just the one that computed it.
+"""
+import time
+import uuid
+
+import numpy as np
+from django.core.cache import caches
+from django.utils.connection import ConnectionProxy
+
+from .datasets import load_dataset, save_dataset
+
+# Per-thread connection to the shared 'simulator' cache
+cache = ConnectionProxy(caches, 'simulator')
+
+# Seconds to keep a run's recorded history and its (smaller) recipe
+RUN_HISTORY_TIMEOUT = 600
+RUN_SPEC_TIMEOUT = 3600
+RUN_PROGRESS_TIMEOUT = 3600
+# A running entry whose heartbeat is older than this (seconds) belongs to a
+# worker that went away (restarted or recycled) before finishing the run
+RUN_STALE_AFTER = 30
+
+
+def _key(run_id, part):
+    return f'simulator:run:{run_id}:{part}'
+
+
+def new_seed():
+    """Seed stored with a run so randomized algorithms can be replayed."""
+    return int(np.random.SeedSequence().entropy % (2 ** 32))
+
+
+def new_run_id():
+    return uuid.uuid4().hex
+
+
+def save_run(spec, history, run_id=None):
+    """Store a run and return its handle (a new one unless ``run_id`` is given)."""
+    run_id = run_id or new_run_id()
+    history.compact()
+    stored = {key: value for key, value in spec.items() if key != 'points'}
+    stored['dataset_id'], _ = save_dataset(spec['points'])
+    cache.set(_key(run_id, 'spec'), stored, RUN_SPEC_TIMEOUT)
+    cache.set(_key(run_id, 'history'), history, RUN_HISTORY_TIMEOUT)
+    return run_id
+
+
+def load_spec(run_id):
+    """Spec of a run with its 'points'; None if the run or its dataset expired."""
+    spec = cache.get(_key(run_id, 'spec'))
+    if spec is None:
+        return None
+    try:
+        return {**spec, 'points': load_dataset(spec['dataset_id'])}
+    except KeyError:
+        return None
+
+
+def load_history(run_id, rebuild):
+    """
+    Recorded history of a run. If it was evicted, ``rebuild(spec)`` replays
+    the run and the result is cached again. Raises KeyError for unknown or
+    fully expired runs.
+    """
+    history = cache.get(_key(run_id, 'history'))
+    if history is not None:
+        return history
+
+    spec = load_spec(run_id)
+    if spec is None:
+        raise KeyError(run_id)
+    history = rebuild(spec)
+    history.compact()
+    cache.set(_key(run_id, 'history'), history, RUN_HISTORY_TIMEOUT)
+    return history
+
+
+def save_progress(run_id, state):
+    cache.set(_key(run_id, 'progress'), state, RUN_PROGRESS_TIMEOUT)
+
+
+def load_progress(run_id):
+    """Progress entry of a run; a run whose worker stopped is reported as failed."""
+    state = cache.get(_key(run_id, 'progress'))
+    if state is not None and state['status'] == 'running' and time.time() - state['heartbeat'] > RUN_STALE_AFTER:
+        return {**state, 'status': 'error', 'error': 'The server worker computing this run stopped, start it again'}
+    return state
@@ -0,0 +1,82 @@
+import json
+from unittest import skipIf
+
+from django.test import SimpleTestCase, override_settings
+
+from . import jit
+from .algorithms import make_steps, run_steps
+from .presets import generate_preset
+
+PRESETS = ('moons', 'circles', 'blobs', 'grid', 'hierarchy', 'dense_sparse')
+# A 10×10 lattice (100 points) splits into k=3 with points exactly halfway
+# between two centroids, where either label is right; these sizes avoid it
+SIZES = (200, 500)
+PARAMS = {
+    'kmeans': {'k': 3},
+    'dbscan': {'eps': 0.5, 'minPts': 4},
+    'forel': {'radius': 1.0},
+    'meanshift': {'bandwidth': 1.0},
+}
+
+
+def final_labels(algorithm, points, dtype):
+    with override_settings(SIMULATOR_COMPUTE_DTYPE=dtype):
+        steps = make_steps(algorithm, points, PARAMS[algorithm], seed=0)
+        return run_steps(algorithm, points, steps, final_only=True).to_list()[-1]['labels']
+
+
+class Float32ParityTests(SimpleTestCase):
+    """The float32 compute mode gives the float64 labels on every preset."""
+
+    def test_labels_match_float64(self):
+        for preset in PRESETS:
+            for n in SIZES:
+                points = generate_preset(preset, n)
+                for algorithm in PARAMS:
+                    with self.subTest(preset=preset, n=n, algorithm=algorithm):
+                        self.assertEqual(
+                            list(final_labels(algorithm, points, 'float32')),
+                            list(final_labels(algorithm, points, 'float64')),
+                        )
+
+
+@skipIf(jit.numba is None, 'numba is not installed')
+class JitParityTests(SimpleTestCase):
+    """The compiled DBSCAN and FOREL kernels give the NumPy labels in both dtypes."""
+
+    def test_labels_match_numpy(self):
+        for preset in PRESETS:
+            for n in SIZES:
+                points = generate_preset(preset, n)
+                for algorithm in ('dbscan', 'forel'):
+                    for dtype in ('float32', 'float64'):
+                        with self.subTest(preset=preset, n=n, algorithm=algorithm, dtype=dtype):
+                            with jit.use_jit(True):
+                                compiled = final_labels(algorithm, points, dtype)
+                            with jit.use_jit(False):
+                                expected = final_labels(algorithm, points, dtype)
+                            self.assertEqual(list(compiled), list(expected))
+
+
+class UpdateRunTests(SimpleTestCase):
+    """Editing a run cut short by max_steps reruns it instead of extending its partial result."""
+
+    def post(self, url, body):
+        response = self.client.post(url, json.dumps(body), content_type='application/json').json()
+        self.assertTrue(response['success'], response.get('error'))
+        return response
+
+    def final(self, response):
+        return (response['final_step'] or response['history'][-1])['labels']
+
+    def test_truncated_run_is_rerun(self):
+        points = generate_preset('blobs', 200)
+        added = [[5.0, 5.0]]
+        for algorithm, params in (('dbscan', PARAMS['dbscan']), ('kmeans', PARAMS['kmeans'])):
+            with self.subTest(algorithm=algorithm):
+                body = {'algorithm': algorithm, 'params': params, 'seed': 0, 'max_steps': 3}
+                run = self.post('/simulator/run/', {**body, 'points': points})
+                updated = self.post(f"/simulator/run/{run['run_id']}/update/", {'add': added})
+                fresh = self.post('/simulator/run/', {**body, 'points': points + added})
+                self.assertFalse(updated['incremental'])
+                self.assertEqual(self.final(updated), self.final(fresh))
@@ -0,0 +1,108 @@
+"""
+Density tiles: a dataset and its labels aggregated into a grid pyramid.
+
+Browsers cannot draw millions of scatter markers, but they can draw a
+heatmap. Zoom level z splits an extent (by default the points' bounding
+box, see ``data_extent``) into 2^z × 2^z cells; every level reports, for
+each non-empty cell, the number of points, the dominant label and its
+share.
+
+Points are binned once at the finest level with vectorized index math,
+and (cell, label) pairs are counted with ``np.unique`` over combined
+codes, so the work is proportional to the points plus the non-empty
+pairs and no dense cells × labels table is built. Each coarser level
+merges four child cells by halving the cell coordinates.
+"""
+import numpy as np
+
+CANVAS_EXTENT = (0.0, 10.0, 0.0, 10.0)
+DEFAULT_MAX_ZOOM = 7
+MAX_ZOOM = 10
+
+
+def data_extent(X):
+    """Bounding box (x_min, x_max, y_min, y_max) of ``X``, widened where it is flat."""
+    if len(X) == 0:
+        return CANVAS_EXTENT
+    lo, hi = X[:, :2].min(axis=0), X[:, :2].max(axis=0)
+    pad = np.where(hi > lo, 0.0, 0.5)
+    return (float(lo[0] - pad[0]), float(hi[0] + pad[0]), float(lo[1] - pad[1]), float(hi[1] + pad[1]))
+
+
+def _level(zoom, cells, label_codes, pair_counts, labels):
+    """Wire format of one level from its (cell, label) pair counts."""
+    # Per cell: total, then the pair with the largest count (lowest label on ties)
+    cell_ids, first = np.unique(cells, return_index=True)
+    totals = np.add.reduceat(pair_counts, first) if len(first) else pair_counts[:0]
+    order = np.lexsort((label_codes, -pair_counts, cells))
+    _, top = np.unique(cells[order], return_index=True)
+    dominant = order[top]
+    size = 2 ** zoom
+    return {
+        'zoom': zoom,
+        'size': size,
+        'i': (cell_ids % size).tolist(),
+        'j': (cell_ids // size).tolist(),
+        'count': totals.tolist(),
+        'label': labels[label_codes[dominant]].tolist(),
+        'share': np.round(pair_counts[dominant] / totals, 4).tolist(),
+    }
+
+
+def density_pyramid(X, labels=None, extent=None, min_zoom=0, max_zoom=DEFAULT_MAX_ZOOM):
+    """
+    Levels ``min_zoom..max_zoom`` of the density pyramid of ``X`` (n × 2)
+    over ``extent`` = (x_min, x_max, y_min, y_max), the bounding box of
+    ``X`` if not given. Cell (i, j) of a level
+    is column i from the left, row j from the bottom. ``labels`` defaults
+    to all zeros; noise (-1) counts as a label. Points outside the extent
+    are left out and counted in 'outside'.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    if X.ndim != 2 or X.shape[1] < 2:
+        raise ValueError('Density tiles need two-dimensional points')
+    labels = np.zeros(len(X), dtype=np.int64) if labels is None else np.asarray(labels, dtype=np.int64)
+    if len(labels) != len(X):
+        raise ValueError('Labels and points differ in length')
+    max_zoom = max(0, min(int(max_zoom), MAX_ZOOM))
+    min_zoom = max(0, min(int(min_zoom), max_zoom))
+    if extent is None:
+        extent = data_extent(X)
+    x_min, x_max, y_min, y_max = (float(v) for v in extent)
+    if not (x_max > x_min and y_max > y_min):
+        raise ValueError('Empty extent')
+
+    size = 2 ** max_zoom
+    # Cell coordinates at the finest level; the upper edge belongs to the last cell
+    fx = (X[:, 0] - x_min) / (x_max - x_min) * size
+    fy = (X[:, 1] - y_min) / (y_max - y_min) * size
+    inside = (fx >= 0) & (fx <= size) & (fy >= 0) & (fy <= size)
+    ix = np.minimum(fx[inside].astype(np.int64), size - 1)
+    iy = np.minimum(fy[inside].astype(np.int64), size - 1)
+
+    unique_labels, label_codes = np.unique(labels[inside], return_inverse=True)
+    n_labels = max(len(unique_labels), 1)
+    codes, pair_counts = np.unique((iy * size + ix) * n_labels + label_codes.ravel(), return_counts=True)
+    cells, label_codes = codes // n_labels, codes % n_labels
+    cx, cy = cells % size, cells // size
+
+    levels = []
+    for zoom in range(max_zoom, min_zoom - 1, -1):
+        level_size = 2 ** zoom
+        levels.append(_level(zoom, cy * level_size + cx, label_codes, pair_counts, unique_labels))
+        if zoom > min_zoom:
+            # Merge 2×2 children: halve the coordinates and sum equal (cell, label) pairs
+            cx, cy = cx // 2, cy // 2
+            half = level_size // 2
+            codes, inverse = np.unique((cy * half + cx) * n_labels + label_codes, return_inverse=True)
+            pair_counts = np.bincount(inverse.ravel(), weights=pair_counts).astype(np.int64)
+            cells, label_codes = codes // n_labels, codes % n_labels
+            cx, cy = cells % half, cells // half
+
+    return {
+        'extent': [x_min, x_max, y_min, y_max],
+        'n_points': int(len(X)),
+        'outside': int(len(X) - np.count_nonzero(inside)),
+        'labels': unique_labels.tolist(),
+        'levels': levels[::-1],
+    }
@@ -0,0 +1,321 @@
+"""
+Streaming parser for uploaded point files: CSV, .npy and .npz.
+
+The upload is read in ``CHUNK_SIZE`` pieces and parsed as it arrives, so a
+multi-megabyte file never sits in memory as text or raw bytes: CSV lines
+are parsed by NumPy's C reader batch by batch and only the selected
+columns are kept, as float64; .npy data is read a block of rows at a time
+once its header has been checked. An .npz archive needs random access, so
+it is spooled to a temporary file (on disk past a few chunks) first.
+
+Types, finiteness and the column selection are validated per batch, and
+the byte and point limits (``SIMULATOR_UPLOAD_MAX_MB``,
+``SIMULATOR_UPLOAD_MAX_POINTS``) are enforced while reading: an oversized
+upload fails at the first chunk over the limit.
+"""
+import codecs
+import tempfile
+import zipfile
+
+import numpy as np
+
+from .conf import setting
+
+CHUNK_SIZE = 1 << 20
+
+DEFAULT_MAX_MB = 50
+DEFAULT_MAX_POINTS = 1_000_000
+
+# .npz uploads larger than this are spooled to disk rather than memory
+SPOOL_MEMORY = 8 * CHUNK_SIZE
+
+_NPY_MAGIC = b'\x93NUMPY'
+_ZIP_MAGIC = b'PK\x03\x04'
+
+
+def max_bytes():
+    return setting('SIMULATOR_UPLOAD_MAX_MB', DEFAULT_MAX_MB) * 1024 * 1024
+
+
+def max_points():
+    return setting('SIMULATOR_UPLOAD_MAX_POINTS', DEFAULT_MAX_POINTS)
+
+
+class _Reader:
+    """File-like view of a stream that counts bytes and can peek at its start."""
+
+    def __init__(self, stream, limit):
+        self.stream = stream
+        self.limit = limit
+        self.consumed = 0
+        self._pending = b''
+
+    def peek(self, size):
+        while len(self._pending) < size:
+            data = self._read(size - len(self._pending))
+            if not data:
+                break
+            self._pending += data
+        return self._pending[:size]
+
+    def _read(self, size):
+        data = self.stream.read(size)
+        self.consumed += len(data)
+        if self.consumed > self.limit:
+            raise ValueError(f'File is larger than {self.limit // (1024 * 1024)} MB')
+        return data
+
+    def read(self, size=CHUNK_SIZE):
+        if self._pending:
+            data, self._pending = self._pending[:size], self._pending[size:]
+            return data
+        return self._read(size)
+
+    def read_exactly(self, size):
+        parts, missing = [], size
+        while missing:
+            data = self.read(min(missing, CHUNK_SIZE))
+            if not data:
+                raise ValueError('File ends before the array data does')
+            parts.append(data)
+            missing -= len(data)
+        return b''.join(parts)
+
+
+class _Points:
+    """Growing float64 buffer of accepted rows, checked against the point limit."""
+
+    def __init__(self, n_features, limit):
+        self.limit = limit
+        self.n = 0
+        self._data = np.empty((1024, n_features))
+
+    def extend(self, rows):
+        if self.n + len(rows) > self.limit:
+            raise ValueError(f'Too many points (max {self.limit})')
+        if self.n + len(rows) > len(self._data):
+            grown = np.empty((max(2 * len(self._data), self.n + len(rows)), self._data.shape[1]))
+            grown[:self.n] = self._data[:self.n]
+            self._data = grown
+        self._data[self.n:self.n + len(rows)] = rows
+        self.n += len(rows)
+
+    def array(self):
+        return self._data[:self.n]
+
+
+def _check_finite(rows, first_row):
+    bad = ~np.isfinite(rows).all(axis=1)
+    if bad.any():
+        raise ValueError(f'Row {first_row + int(np.argmax(bad))}: values must be finite numbers')
+
+
+def _select_columns(columns, names, width):
+    """Indices of the two requested columns (names or indices); the first two by default."""
+    if not columns:
+        if width < 2:
+            raise ValueError('At least two columns are needed')
+        return [0, 1]
+    if len(columns) != 2:
+        raise ValueError(f'Exactly two columns are needed, got {len(columns)}')
+    selected = []
+    for column in columns:
+        if isinstance(column, str) and not column.lstrip('-').isdigit():
+            if names is None or column not in names:
+                raise ValueError(f'Unknown column: {column}')
+            selected.append(names.index(column))
+        else:
+            index = int(column)
+            if not -width <= index < width:
+                raise ValueError(f'Column index out of range: {index}')
+            selected.append(index % width)
+    return selected
+
+
+def _guess_delimiter(line):
+    counts = {d: line.count(d) for d in (',', ';', '\t')}
+    delimiter = max(counts, key=counts.get)
+    return delimiter if counts[delimiter] else None  # None: any whitespace
+
+
+def _is_number(field):
+    try:
+        float(field)
+    except ValueError:
+        return False
+    return True
+
+
+def _is_data(line):
+    stripped = line.strip()
+    return bool(stripped) and not stripped.startswith('#')
+
+
+def _bad_line(lines, first_line, delimiter, selected):
+    """Error message naming the first line of a failed batch that does not parse."""
+    for number, line in enumerate(lines, first_line):
+        if not _is_data(line):
+            continue
+        try:
+            row = np.loadtxt([line], delimiter=delimiter, usecols=selected, quotechar='"', ndmin=2)
+        except ValueError as e:
+            # Drop loadtxt's own position, which counts within the batch
+            return f"Line {number}: {str(e).split(' at row')[0]}"
+        if not np.isfinite(row).all():
+            return f'Line {number}: values must be finite numbers'
+    return 'Invalid CSV data'
+
+
+def _parse_csv(reader, columns, delimiter, limit):
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    tail, line_no = '', 0
+    names = selected = points = None
+
+    while True:
+        chunk = reader.read(CHUNK_SIZE)
+        try:
+            text = tail + decoder.decode(chunk, final=not chunk)
+        except UnicodeDecodeError:
+            raise ValueError('CSV files must be UTF-8 text') from None
+        lines = text.split('\n')
+        # The last piece may be a line cut by the chunk boundary
+        tail = lines.pop() if chunk else ''
+        first_line = line_no + 1
+        line_no += len(lines)
+
+        if selected is None:
+            # The first data-looking line is either a header or the first row
+            for i, line in enumerate(lines):
+                if _is_data(line):
+                    if delimiter is None:
+                        delimiter = _guess_delimiter(line)
+                    fields = [f.strip().strip('"') for f in line.rstrip('\r').split(delimiter)]
+                    if not all(_is_number(f) for f in fields):
+                        names = fields
+                        lines[i] = ''
+                    selected = _select_columns(columns, names, len(fields))
+                    points = _Points(len(selected), limit)
+                    break
+
+        if selected is not None and any(map(_is_data, lines)):
+            # loadtxt skips blank lines and '#' comments itself
+            try:
+                rows = np.loadtxt(lines, delimiter=delimiter, usecols=selected, quotechar='"',
+                                  ndmin=2, dtype=np.float64)
+            except ValueError:
+                raise ValueError(_bad_line(lines, first_line, delimiter, selected)) from None
+            bad = ~np.isfinite(rows).all(axis=1)
+            if bad.any():
+                raise ValueError(_bad_line(lines, first_line, delimiter, selected))
+            points.extend(rows)
+
+        if not chunk:
+            break
+
+    if points is None or not points.n:
+        raise ValueError('The file has no data rows')
+    column_names = [names[j] for j in selected] if names else [str(j) for j in selected]
+    return points.array(), column_names
+
+
+def _read_npy(reader, columns, limit):
+    version = np.lib.format.read_magic(reader)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(reader)
+    elif version == (2, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(reader)
+    else:
+        raise ValueError(f'Unsupported .npy version {version}')
+    if dtype.hasobject or dtype.fields is not None or dtype.kind not in 'biuf':
+        raise ValueError(f'Unsupported array type: {dtype}')
+    if len(shape) != 2:
+        raise ValueError('The array must be two-dimensional (points × coordinates)')
+    n, width = shape
+    if n > limit:
+        raise ValueError(f'Too many points (max {limit})')
+    if n * width * dtype.itemsize > reader.limit:
+        raise ValueError(f'Array is larger than {reader.limit // (1024 * 1024)} MB')
+    selected = _select_columns(columns, None, width)
+    points = _Points(len(selected), limit)
+
+    if fortran_order:
+        # Column-major data: read one column at a time, keeping the selected ones
+        X = np.empty((n, len(selected)))
+        for j in range(width):
+            column = np.empty(n, dtype=dtype)
+            step = max(1, CHUNK_SIZE // dtype.itemsize)
+            for start in range(0, n, step):
+                stop = min(n, start + step)
+                column[start:stop] = np.frombuffer(reader.read_exactly((stop - start) * dtype.itemsize), dtype)
+            for position, index in enumerate(selected):
+                if index == j:
+                    X[:, position] = column
+        _check_finite(X, 1)
+        points.extend(X)
+    else:
+        step = max(1, CHUNK_SIZE // max(1, width * dtype.itemsize))
+        for start in range(0, n, step):
+            stop = min(n, start + step)
+            block = np.frombuffer(reader.read_exactly((stop - start) * width * dtype.itemsize), dtype)
+            rows = block.reshape(stop - start, width)[:, selected].astype(np.float64)
+            _check_finite(rows, start + 1)
+            points.extend(rows)
+    return points.array(), [str(j) for j in selected]
+
+
+def _read_npz(reader, columns, key, limit):
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY) as spool:
+        while True:
+            chunk = reader.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            spool.write(chunk)
+        spool.seek(0)
+        try:
+            archive = zipfile.ZipFile(spool)
+        except zipfile.BadZipFile:
+            raise ValueError('Not a valid .npz archive') from None
+        with archive:
+            members = [name for name in archive.namelist() if name.endswith('.npy')]
+            if not members:
+                raise ValueError('The archive holds no arrays')
+            if key is not None:
+                if f'{key}.npy' not in members:
+                    raise ValueError(f'Unknown array: {key}')
+                member = f'{key}.npy'
+            else:
+                member = members[0]
+            with archive.open(member) as stream:
+                # Decompressed data counts against the same byte limit
+                return _read_npy(_Reader(stream, reader.limit), columns, limit)
+
+
+def parse_upload(stream, columns=None, delimiter=None, key=None):
+    """
+    Parse an uploaded point file from a binary stream (the request or an
+    uploaded file). The format is recognized by its first bytes: .npy,
+    .npz (zip) or else CSV. ``columns`` picks coordinates by header name or
+    index (the first two by default); ``key`` names the .npz array (the
+    first by default). Returns ``(points, format, column names)``.
+    """
+    reader = _Reader(stream, max_bytes())
+    start = reader.peek(len(_NPY_MAGIC))
+    if start.startswith(_NPY_MAGIC):
+        fmt, (X, names) = 'npy', _read_npy(reader, columns, max_points())
+    elif start.startswith(_ZIP_MAGIC):
+        fmt, (X, names) = 'npz', _read_npz(reader, columns, key, max_points())
+    else:
+        fmt, (X, names) = 'csv', _parse_csv(reader, columns, delimiter, max_points())
+    return X, fmt, names
+
+
+def summarize(X, names):
+    """Per-column summary statistics of parsed points, for the upload response."""
+    empty = [None] * X.shape[1]
+    return {
+        'columns': names,
+        'min': X.min(axis=0).tolist() if len(X) else empty,
+        'max': X.max(axis=0).tolist() if len(X) else empty,
+        'mean': X.mean(axis=0).tolist() if len(X) else empty,
+        'std': X.std(axis=0).tolist() if len(X) else empty,
+    }
@@ -8,6 +8,19 @@ urlpatterns = [
     # Песочница: одна страница + API для запуска алгоритмов
     path('', views.index, name='index'),
     path('run/', views.run_algorithm, name='run_algorithm'),
+    path('run/<str:run_id>/steps/', views.get_run_steps, name='run_steps'),
+    path('run/<str:run_id>/update/', views.update_run, name='update_run'),
+    path('run/<str:run_id>/progress/', views.get_run_progress, name='run_progress'),
+    path('kmeans/elbow/', views.run_kmeans_elbow, name='kmeans_elbow'),
+    path('dbscan/sweep/', views.run_dbscan_sweep, name='dbscan_sweep'),
+    path('meanshift/sweep/', views.run_mean_shift_sweep, name='meanshift_sweep'),
+    path('compare/', views.run_comparison, name='compare'),
+    path('tiles/', views.get_density_tiles, name='density_tiles'),
+    path('optics/', views.run_optics, name='optics'),
+    path('optics/extract/', views.extract_optics, name='optics_extract'),
+    path('dataset/', views.upload_dataset, name='upload_dataset'),
+    path('dataset/upload/', views.upload_dataset_file, name='upload_dataset_file'),
+    path('dataset/<str:dataset_id>/', views.get_dataset, name='get_dataset'),
 
     # Редиректы со старых URL заданий на /tasks/
     path('tasks/', RedirectView.as_view(url='/tasks/', permanent=False)),
@@ -21,6 +34,7 @@ urlpatterns = [
     
     # Utilities
     path('dendrogram/', views.get_dendrogram, name='get_dendrogram'),
+    path('dendrogram/expand/', views.expand_dendrogram, name='expand_dendrogram'),
     path('preset/', views.get_preset, name='get_preset'),
     
     # Old long paths just in case
@@ -1,18 +1,34 @@
+import hashlib
 import json
+import threading
 import numpy as np
 from django.http import JsonResponse
 from django.shortcuts import render, redirect
 from django.urls import reverse
 from django.views.decorators.csrf import ensure_csrf_cookie, csrf_exempt
 from .algorithms import (
-    kmeans_step,
-    dbscan_step,
-    forel_step,
-    agglomerative_step,
-    mean_shift_step,
+    make_steps,
+    run_steps,
+    dbscan_update,
     compute_dendrogram_data,
+    dbscan_sweep,
+    kmeans_elbow,
+    estimate_bandwidth,
+    mean_shift_sweep,
+    normalize_points,
+    optics_reachability,
+    optics_extract_dbscan,
 )
+from .compare import compare_algorithms
+from .datasets import dataset_id, load_dataset, save_dataset
+from .tiles import DEFAULT_MAX_ZOOM, density_pyramid
+from .uploads import max_bytes, parse_upload, summarize
+from .hierarchy import DENDROGRAM_LEAVES, build_linkage, dendrogram_lod
+from .metrics import final_metrics, step_metrics
+from .parallel import thread_budget
+from .progress import ProgressReporter
 from .presets import generate_preset
+from .runs import cache, load_history, load_progress, load_spec, new_run_id, new_seed, save_run
 
 
 @ensure_csrf_cookie
@@ -47,64 +63,728 @@ def get_preset(request):
             
     return JsonResponse({'success': False, 'error': 'Method not allowed'})
 
+def _request_points(data):
+    """Points of a request: the stored dataset 'dataset_id' if given, else the 'points' list."""
+    if data.get('dataset_id'):
+        try:
+            return load_dataset(data['dataset_id'])
+        except KeyError:
+            raise ValueError('Unknown dataset, upload the points again') from None
+    return normalize_points(data.get('points', []))
+
+
+@csrf_exempt
+def upload_dataset(request):
+    """
+    Stores 'points' once and returns their 'dataset_id', which the
+    algorithm, dendrogram, sweep and OPTICS endpoints accept instead of
+    'points'. The id is a content hash: the same points give the same id.
+    """
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            key, X = save_dataset(normalize_points(data.get('points', [])))
+            return JsonResponse({
+                'success': True, 'dataset_id': key, 'n_points': len(X), 'n_features': X.shape[1],
+            })
+        except Exception as e:
+            return JsonResponse({'success': False, 'error': str(e)})
+
+    return JsonResponse({'success': False, 'error': 'Method not allowed'})
+
+
+@csrf_exempt
+def upload_dataset_file(request):
+    """
+    Stores a CSV, .npy or .npz file sent as the raw request body (options
+    in the query string) or as the multipart field 'file'. Options:
+    'columns' (comma-separated header names or indices, the first two by
+    default), 'delimiter' (guessed from the first line by default) and
+    'key' (the .npz array). The file is parsed while it streams in; the
+    response has the 'dataset_id' and per-column summary statistics.
+    """
+    if request.method == 'POST':
+        try:
+            # Refuse announced oversized bodies before reading anything
+            if int(request.META.get('CONTENT_LENGTH') or 0) > max_bytes():
+                return JsonResponse({
+                    'success': False, 'error': f'File is larger than {max_bytes() // (1024 * 1024)} MB'
+                })
+            if request.content_type == 'multipart/form-data':
+                options, stream = request.POST, request.FILES.get('file')
+                if stream is None:
+                    return JsonResponse({'success': False, 'error': "No 'file' field"})
+            else:
+                options, stream = request.GET, request
+            columns = [c.strip() for c in options.get('columns', '').split(',') if c.strip()]
+            X, fmt, names = parse_upload(stream, columns or None, options.get('delimiter') or None, options.get('key'))
+            key, X = save_dataset(X, compressed=True)
+            return JsonResponse({
+                'success': True, 'dataset_id': key, 'format': fmt,
+                'n_points': len(X), 'n_features': X.shape[1], 'stats': summarize(X, names),
+            })
+        except Exception as e:
+            return JsonResponse({'success': False, 'error': str(e)})
+
+    return JsonResponse({'success': False, 'error': 'Method not allowed'})
+
+
+def get_dataset(request, dataset_id):
+    """Size of a stored dataset, with its points if 'points=1' is passed."""
+    if request.method == 'GET':
+        try:
+            X = load_dataset(dataset_id)
+            response = {'success': True, 'dataset_id': dataset_id, 'n_points': len(X), 'n_features': X.shape[1]}
+            if request.GET.get('points') == '1':
+                response['points'] = X.tolist()
+            return JsonResponse(response)
+        except KeyError:
+            return JsonResponse({'success': False, 'error': 'Unknown dataset'})
+        except Exception as e:
+            return JsonResponse({'success': False, 'error': str(e)})
+
+    return JsonResponse({'success': False, 'error': 'Method not allowed'})
+
+
+# Seconds to keep a linkage matrix for re-cutting the same points
+LINKAGE_CACHE_TIMEOUT = 600
+
+
+def _linkage_id(points, method):
+    return hashlib.sha1(f'{dataset_id(points)}:{method}'.encode()).hexdigest()
+
+
+def _cached_linkage(points, method):
+    """Linkage for these exact points, reused while only the cut (k) changes."""
+    key = f'simulator:linkage:{_linkage_id(points, method)}'
+    Z = cache.get(key)
+    if Z is None:
+        Z = build_linkage(points, method)
+        cache.set(key, Z, LINKAGE_CACHE_TIMEOUT)
+    return Z
+
+
+def _make_steps(algo, points, params, seed=None, init=None, progress=None):
+    """``make_steps`` with the agglomerative linkage taken from the cache."""
+    Z = None
+    # A BIRCH-preclustered run links subclusters, not these points
+    if algo == 'agglomerative' and len(points) >= 2 and not params.get('precluster'):
+        Z = _cached_linkage(points, params.get('linkage', 'ward'))
+    return make_steps(algo, points, params, seed, init=init, Z=Z, progress=progress)
+
+
+# Steps returned with a run and per /run/<id>/steps/ request
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 1000
+
+
+def _record_run(spec, progress=None):
+    """Replay a stored run spec into a HistoryRecorder."""
+    if spec.get('labels') is not None:
+        # Incrementally updated result: the final labelling is the only step
+        steps = (step for step in [{'labels': spec['labels']}])
+    else:
+        steps = _make_steps(spec['algorithm'], spec['points'], spec['params'], spec['seed'], spec.get('init'),
+                            progress=progress.visited if progress is not None else None)
+    return run_steps(
+        spec['algorithm'], spec['points'], steps,
+        max_steps=spec['max_steps'], every=spec['every'], final_only=spec['final_only'],
+        max_frames=spec.get('max_frames'), progress=progress,
+    )
+
+
+def _page(points, history, start, stop, with_metrics):
+    steps = history.to_list(start, stop)
+    if with_metrics:
+        for step, step_metric in zip(steps, step_metrics(points, history, start, stop)):
+            step['metrics'] = step_metric
+    return steps
+
+
+def _run_response(spec, history, metrics_mode, page_size, run_id=None):
+    """Store a finished run and build the /run/ response body."""
+    points = spec['points']
+    run_id = save_run(spec, history, run_id)
+    total = len(history)
+    with_step_metrics = metrics_mode == 'steps'
+    return {
+        'success': True,
+        'run_id': run_id,
+        'total_steps': total,
+        'history': _page(points, history, 0, page_size, with_step_metrics),
+        # Already in the first page when the run is short
+        'final_step': _page(points, history, total - 1, total, with_step_metrics)[0] if total > page_size else None,
+        'metrics': final_metrics(points, history) if metrics_mode != 'none' else None,
+        'history_bytes': history.nbytes,
+    }
+
+
+# Background runs a worker process computes at once
+MAX_BACKGROUND_RUNS = 2
+_background_slots = threading.BoundedSemaphore(MAX_BACKGROUND_RUNS)
+# Identical resubmissions of a background run get the running handle back
+ACTIVE_RUN_TIMEOUT = 3600
+
+
+def _run_in_background(run_id, spec, metrics_mode, page_size, active_key):
+    reporter = ProgressReporter(run_id, spec['algorithm'], len(spec['points']))
+    try:
+        with thread_budget(len(spec['points'])) as threads:
+            history = _record_run(spec, progress=reporter)
+            response = _run_response(spec, history, metrics_mode, page_size, run_id)
+        response['threads'] = threads
+        reporter.finish(response)
+    except Exception as e:
+        reporter.fail(str(e))
+    finally:
+        cache.delete(active_key)
+        _background_slots.release()
+
+
+def _start_background_run(request_body, spec, metrics_mode, page_size):
+    """Start (or join an identical running) background run; returns the response body."""
+    active_key = f'simulator:run:active:{hashlib.sha1(request_body).hexdigest()}'
+    run_id = cache.get(active_key)
+    if run_id is not None and (load_progress(run_id) or {}).get('status') == 'running':
+        return {'success': True, 'run_id': run_id, 'status': 'running', 'joined': True}
+    if not _background_slots.acquire(blocking=False):
+        return {'success': False, 'error': 'Too many background runs, try again later'}
+
+    run_id = new_run_id()
+    cache.set(active_key, run_id, ACTIVE_RUN_TIMEOUT)
+    try:
+        threading.Thread(
+            target=_run_in_background, args=(run_id, spec, metrics_mode, page_size, active_key), daemon=True,
+        ).start()
+    except Exception:
+        cache.delete(active_key)
+        _background_slots.release()
+        raise
+    return {'success': True, 'run_id': run_id, 'status': 'running', 'joined': False}
+
+
 @csrf_exempt
 def run_algorithm(request):
-    """Unified endpoint for running all clustering algorithms"""
+    """
+    Unified endpoint for running all clustering algorithms.
+
+    Returns a run handle, the first page of steps and the final step (if
+    not on that page); the remaining steps are fetched from
+    /run/<run_id>/steps/. Optional
+    controls: 'max_steps' stops the algorithm early, 'every' keeps every
+    n-th step, 'final_only' returns just the final state, 'max_frames' caps
+    the number of steps kept (cluster completions first, evenly thinned
+    otherwise), 'seed' makes randomized algorithms reproducible,
+    'page_size' sizes the first page.
+
+    With 'background': true the run is computed in a worker thread and
+    only its handle is returned; /run/<run_id>/progress/ reports progress
+    and, once done, the response described above. Resubmitting the same
+    request while it runs returns the same handle.
+    """
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
             algo = data.get('algorithm')
-            points = data.get('points', [])
-            params = data.get('params', {})
-            
-            history = []
+            points = _request_points(data)
+            metrics_mode = data.get('metrics', 'final')
+            max_steps = data.get('max_steps')
+            max_frames = data.get('max_frames')
+            page_size = min(int(data.get('page_size', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+
+            spec = {
+                'algorithm': algo,
+                'points': np.asarray(points, dtype=float),
+                'params': data.get('params', {}),
+                'seed': data.get('seed') if data.get('seed') is not None else new_seed(),
+                'max_steps': int(max_steps) if max_steps is not None else None,
+                'every': int(data.get('every', 1)),
+                'final_only': bool(data.get('final_only', False)),
+                'max_frames': int(max_frames) if max_frames is not None else None,
+            }
+            if _make_steps(algo, [], {}) is None:
+                return JsonResponse({'success': False, 'error': f'Unknown algorithm: {algo}'})
+
+            if data.get('background'):
+                return JsonResponse(_start_background_run(request.body, spec, metrics_mode, page_size))
+
+            with thread_budget(len(points)) as threads:
+                history = _record_run(spec)
+                response = _run_response(spec, history, metrics_mode, page_size)
+            response['threads'] = threads
+            return JsonResponse(response)
+        except Exception as e:
+            return JsonResponse({'success': False, 'error': str(e)})
             
-            if algo == 'kmeans':
-                k = int(params.get('k', 3))
-                history = kmeans_step(points, k)
-            elif algo == 'dbscan':
-                eps = float(params.get('eps', 0.5))
-                min_pts = int(params.get('minPts', 3))
-                history = dbscan_step(points, eps, min_pts)
-            elif algo == 'forel':
-                r = float(params.get('radius', 1.0))
-                history = forel_step(points, r)
+    return JsonResponse({'success': False, 'error': 'Method not allowed'})
+
+
+@csrf_exempt
+def update_run(request, run_id):
+    """
+    Re-cluster a stored run after editing its points: 'add' is a list of new
+    points, 'remove' a list of indices into the run's points; 'params' may
+    override the run's params. Returns a new run (same format as /run/).
+
+    With unchanged params and a run that was not cut short by 'max_steps',
+    K-Means warm-starts from the previous centroids and DBSCAN relabels
+    only the clusters around the edited points.
+    Agglomerative reuses a cached linkage while only k changes; other
+    algorithms rerun from scratch.
+    """
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            spec = load_spec(run_id)
+            if spec is None:
+                return JsonResponse({'success': False, 'error': 'Run expired, start it again'})
+
+            metrics_mode = data.get('metrics', 'final')
+            page_size = min(int(data.get('page_size', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+            old_points = spec['points']
+            removed = np.unique(np.asarray(data.get('remove', []), dtype=int))
+            if len(removed) and (removed[0] < 0 or removed[-1] >= len(old_points)):
+                return JsonResponse({'success': False, 'error': 'Point index out of range'})
+            added = np.asarray(normalize_points(data.get('add', [])), dtype=float)
+            added = added.reshape(-1, old_points.shape[1] if old_points.ndim == 2 else 2)
+
+            algo = spec['algorithm']
+            params = {**spec['params'], **data.get('params', {})}
+            # A run stopped by max_steps has no finished clustering to start from
+            incremental = params == spec['params'] and len(old_points) > 0 and spec['max_steps'] is None
+            new_spec = {
+                **spec,
+                'points': np.vstack([np.delete(old_points, removed, axis=0).reshape(-1, added.shape[1]), added]),
+                'params': params,
+                'init': None,
+                'labels': None,
+                'counts': None,
+            }
+
+            if incremental and algo == 'kmeans':
+                previous = load_history(run_id, _record_run).centroids(-1)
+                if previous is not None and len(previous) == int(params.get('k', 3)):
+                    new_spec['init'] = previous
+                else:
+                    incremental = False
+            elif incremental and algo == 'dbscan':
+                labels = load_history(run_id, _record_run).labels(-1)
+                points, labels, counts, _ = dbscan_update(
+                    old_points, labels, float(params.get('eps', 0.5)), int(params.get('minPts', 3)),
+                    counts=spec.get('counts'), removed=removed, added=added,
+                )
+                new_spec.update(points=points, labels=labels, counts=counts)
             elif algo == 'agglomerative':
-                k = int(params.get('k', 2))
-                history = agglomerative_step(points, k)
-            elif algo == 'meanshift':
-                bandwidth = float(params.get('bandwidth', 1.0))
-                history = mean_shift_step(points, bandwidth)
+                # The cached linkage is only valid for the same points and method
+                incremental = (not len(removed) and not len(added)
+                               and params.get('linkage', 'ward') == spec['params'].get('linkage', 'ward')
+                               and params.get('precluster') == spec['params'].get('precluster'))
             else:
-                return JsonResponse({'success': False, 'error': f'Unknown algorithm: {algo}'})
-                
-            return JsonResponse({'success': True, 'history': history})
+                incremental = False
+
+            with thread_budget(len(new_spec['points'])) as threads:
+                history = _record_run(new_spec)
+                response = _run_response(new_spec, history, metrics_mode, page_size)
+            response['incremental'] = incremental
+            response['threads'] = threads
+            return JsonResponse(response)
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)})
-            
+
     return JsonResponse({'success': False, 'error': 'Method not allowed'})
 
+
+def get_run_steps(request, run_id):
+    """
+    Steps [from, to) of a stored run. Evicted histories are recomputed
+    from the run's stored seed.
+    """
+    if request.method == 'GET':
+        try:
+            start = max(int(request.GET.get('from', 0)), 0)
+            stop = int(request.GET.get('to', start + DEFAULT_PAGE_SIZE))
+            stop = min(stop, start + MAX_PAGE_SIZE)
+            with_metrics = request.GET.get('metrics') == 'steps'
+
+            try:
+                history = load_history(run_id, _record_run)
+            except KeyError:
+                return JsonResponse({'success': False, 'error': 'Run expired, start it again'})
+
+            points = load_spec(run_id)['points'] if with_metrics else None
+            stop = min(stop, len(history))
+            return JsonResponse({
+                'success': True,
+                'run_id': run_id,
+                'from': start,
+                'to': max(stop, start),
+                'total_steps': len(history),
+                'history': _page(points, history, start, stop, with_metrics),
+            })
+        except Exception as e:
+            return JsonResponse({'success': False, 'error': str(e)})
+
+    return JsonResponse({'success': False, 'error': 'Method not allowed'})
+
+def get_run_progress(request, run_id):
+    """
+    Progress of a background run: 'status' is 'running', 'done' (with the
+    /run/ response in 'result') or 'error'; while running it carries the
+    step, iteration, points processed, inertia, shift, fraction done and
+    'eta' in seconds (None where the algorithm gives no estimate).
+    """
+    if request.method == 'GET':
+        try:
+            state = load_progress(run_id)
+            if state is None:
+                return JsonResponse({'success': False, 'error': 'Unknown or expired run'})
+            return JsonResponse({'success': True, 'run_id': run_id, **state})
+        except Exception as e:
+            return JsonResponse({'success': False, 'error': str(e)})
+
+    return JsonResponse({'success': False, 'error': 'Method not allowed'})
+
+# Leaves per dendrogram response (top merges; the rest is expanded on demand)
+MAX_DENDROGRAM_LEAVES = 300
+
+
+def _dendrogram_leaves(data):
+    return max(1, min(int(data.get('p', DENDROGRAM_LEAVES)), MAX_DENDROGRAM_LEAVES))
+
+
 @csrf_exempt
 def get_dendrogram(request):
     """
-    Returns dendrogram data for plotting.
+    Returns the top 'p' merges of the dendrogram (collapsed clusters as
+    leaves with their sizes) and a 'dendrogram_id' for
+    /dendrogram/expand/. The linkage matrix stays in the cache.
     """
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
-            points = data.get('points', [])
+            points = _request_points(data)
+            method = data.get('linkage', 'ward')
             
-            ddata = compute_dendrogram_data(points)
+            with thread_budget(len(points)) as threads:
+                Z = _cached_linkage(points, method) if len(points) >= 2 else None
+                ddata = compute_dendrogram_data(points, method, _dendrogram_leaves(data), Z=Z)
             
             if 'error' in ddata:
                 return JsonResponse({'success': False, 'error': ddata['error']})
             
-            return JsonResponse({'success': True, 'dendrogram': ddata})
+            return JsonResponse({
+                'success': True, 'dendrogram': ddata, 'dendrogram_id': _linkage_id(points, method),
+                'threads': threads,
+            })
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)})
             
     return JsonResponse({'success': False, 'error': 'Method not allowed'})
 
+
+@csrf_exempt
+def expand_dendrogram(request):
+    """
+    Top 'p' merges under a collapsed 'node' of a dendrogram returned by
+    /dendrogram/. If the linkage expired and 'points' (with 'linkage') are
+    sent, it is rebuilt.
+    """
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            Z = cache.get(f"simulator:linkage:{data.get('dendrogram_id', '')}")
+            if Z is None:
+                if not data.get('points') and not data.get('dataset_id'):
+                    return JsonResponse({'success': False, 'error': 'Dendrogram expired, build it again'})
+                points = _request_points(data)
+                Z = _cached_linkage(points, data.get('linkage', 'ward'))
+
+            ddata = dendrogram_lod(Z, _dendrogram_leaves(data), node=int(data['node']))
+            return JsonResponse({'success': True, 'dendrogram': ddata})
+        except Exception as e:
+            return JsonResponse({'success': False, 'error': str(e)})
+
+    return JsonResponse({'success': False, 'error': 'Method not allowed'})
+
+# Upper bound on (eps, minPts) combinations evaluated in one sweep request
+MAX_SWEEP_COMBINATIONS = 400
+
+
+@csrf_exempt
+def run_dbscan_sweep(request):
+    """
+    Evaluates DBSCAN over a grid of eps/minPts values in one request and
+    returns the k-distance curve used to pick eps.
+    """
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            points = _request_points(data)
+            eps_values = [float(e) for e in data.get('eps', [])]
+            min_pts_values = [int(m) for m in data.get('minPts', [])]
+            include_labels = bool(data.get('labels', True))
+
+            if len(eps_values) * len(min_pts_values) > MAX_SWEEP_COMBINATIONS:
+                return JsonResponse({
+                    'success': False,
+                    'error': f'Too many combinations (max {MAX_SWEEP_COMBINATIONS})'
+                })
+
+            with thread_budget(len(points)) as threads:
+                sweep = dbscan_sweep(points, eps_values, min_pts_values, include_labels=include_labels)
+            return JsonResponse({'success': True, **sweep, 'threads': threads})
+        except Exception as e:
+            return JsonResponse({'success': False, 'error': str(e)})
+
+    return JsonResponse({'success': False, 'error': 'Method not allowed'})
+
+# Largest k and number of gap-statistic reference datasets per elbow request
+MAX_ELBOW_K = 30
+MAX_GAP_REFS = 20
+
+
+@csrf_exempt
+def run_kmeans_elbow(request):
+    """
+    Inertia for k = 1..kMax with an elbow estimate and, optionally,
+    the gap statistic.
+    """
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            points = _request_points(data)
+            k_max = min(int(data.get('kMax', 10)), MAX_ELBOW_K)
+            gap_refs = min(int(data.get('gapRefs', 0)), MAX_GAP_REFS)
+            seed = data.get('seed')
+
+            if len(points) == 0:
+                return JsonResponse({'success': False, 'error': 'No points'})
+
+            with thread_budget(len(points)) as threads:
+                result = kmeans_elbow(points, k_max, gap_refs=gap_refs, seed=seed)
+            return JsonResponse({'success': True, **result, 'threads': threads})
+        except Exception as e:
+            return JsonResponse({'success': False, 'error': str(e)})
+
+    return JsonResponse({'success': False, 'error': 'Method not allowed'})
+
+# Bandwidths evaluated per Mean Shift sweep request
+MAX_SWEEP_BANDWIDTHS = 12
+
+
+@csrf_exempt
+def run_mean_shift_sweep(request):
+    """
+    Estimates a Mean Shift bandwidth and runs several bandwidths at once.
+    Without explicit 'bandwidths' a grid around the estimate is used.
+    """
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            points = _request_points(data)
+            quantile = float(data.get('quantile', 0.3))
+            include_labels = bool(data.get('labels', True))
+
+            bandwidths = data.get('bandwidths')
+            if bandwidths and len(bandwidths) > MAX_SWEEP_BANDWIDTHS:
+                return JsonResponse({
+                    'success': False,
+                    'error': f'Too many bandwidths (max {MAX_SWEEP_BANDWIDTHS})'
+                })
+
+            with thread_budget(len(points)) as threads:
+                estimated = estimate_bandwidth(points, quantile=quantile)
+                bandwidths = bandwidths or [estimated * f for f in (0.5, 0.75, 1.0, 1.5, 2.0)]
+                results = mean_shift_sweep(points, bandwidths, include_labels=include_labels)
+            return JsonResponse({
+                'success': True, 'estimated_bandwidth': estimated, 'results': results, 'threads': threads,
+            })
+        except Exception as e:
+            return JsonResponse({'success': False, 'error': str(e)})
+
+    return JsonResponse({'success': False, 'error': 'Method not allowed'})
+
+# Algorithm configurations per comparison request
+MAX_COMPARE_RUNS = 8
+
+
+@csrf_exempt
+def run_comparison(request):
+    """
+    Runs several algorithm configurations ('runs': [{'algorithm', 'params',
+    'seed'}]) on the same 'points' or 'dataset_id', side by side on shared
+    precomputed structures. Returns final labels (unless 'labels' is
+    false), run times and metrics per configuration, plus pairwise ARI/NMI.
+    """
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            points = _request_points(data)
+            runs = data.get('runs', [])
+            if not runs:
+                return JsonResponse({'success': False, 'error': 'No runs'})
+            if len(runs) > MAX_COMPARE_RUNS:
+                return JsonResponse({'success': False, 'error': f'Too many runs (max {MAX_COMPARE_RUNS})'})
+
+            seed = data.get('seed') if data.get('seed') is not None else new_seed()
+            configs = []
+            for run in runs:
+                algo = run.get('algorithm')
+                if _make_steps(algo, [], {}) is None:
+                    return JsonResponse({'success': False, 'error': f'Unknown algorithm: {algo}'})
+                configs.append({
+                    'algorithm': algo,
+                    'params': run.get('params', {}),
+                    'seed': run.get('seed') if run.get('seed') is not None else seed,
+                })
+
+            with thread_budget(len(points)) as threads:
+                result = compare_algorithms(
+                    points, configs, include_labels=bool(data.get('labels', True)),
+                    with_silhouette=bool(data.get('silhouette', True)),
+                )
+            return JsonResponse({'success': True, **result, 'threads': threads})
+        except Exception as e:
+            return JsonResponse({'success': False, 'error': str(e)})
+
+    return JsonResponse({'success': False, 'error': 'Method not allowed'})
+
+# Density pyramids live this long (seconds)
+TILES_CACHE_TIMEOUT = 600
+
+
+@csrf_exempt
+def get_density_tiles(request):
+    """
+    Density pyramid (per-cell counts and dominant labels at zoom levels
+    'minZoom'..'maxZoom', see tiles.py) for heatmap rendering. The points
+    and labels come from a stored run ('run_id', final step unless 'step'
+    is given) or from 'dataset_id' / 'points' with optional 'labels'.
+    'extent' = [x_min, x_max, y_min, y_max] defaults to the points'
+    bounding box and is returned with the levels. Results are cached per dataset + labels (or run + step).
+    """
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            # Without an 'extent' the pyramid covers the points' bounding box
+            extent = data.get('extent')
+            if extent is not None:
+                extent = [float(v) for v in extent]
+            zooms = (int(data.get('minZoom', 0)), int(data.get('maxZoom', DEFAULT_MAX_ZOOM)))
+
+            run_id = data.get('run_id')
+            if run_id:
+                step = int(data.get('step', -1))
+                source = f'run:{run_id}:{step}'
+            else:
+                points = _request_points(data)
+                labels = data.get('labels')
+                if labels is not None:
+                    labels = np.asarray(labels, dtype=np.int64)
+                labels_key = '' if labels is None else hashlib.sha1(labels.tobytes()).hexdigest()
+                source = f'dataset:{dataset_id(points)}:{labels_key}'
+            key = 'simulator:tiles:' + hashlib.sha1(f'{source}:{extent}:{zooms}'.encode()).hexdigest()
+
+            tiles = cache.get(key)
+            if tiles is None:
+                if run_id:
+                    spec = load_spec(run_id)
+                    if spec is None:
+                        return JsonResponse({'success': False, 'error': 'Run expired, start it again'})
+                    points, labels = spec['points'], load_history(run_id, _record_run).labels(step)
+                tiles = density_pyramid(points, labels, extent, *zooms)
+                cache.set(key, tiles, TILES_CACHE_TIMEOUT)
+            return JsonResponse({'success': True, **tiles})
+        except Exception as e:
+            return JsonResponse({'success': False, 'error': str(e)})
+
+    return JsonResponse({'success': False, 'error': 'Method not allowed'})
+
+# Cached OPTICS results live this long (seconds) for eps re-extraction
+OPTICS_CACHE_TIMEOUT = 600
+
+
+def _optics_key(points, min_pts, max_eps):
+    digest = hashlib.sha1(f'{dataset_id(points)}:{min_pts}:{max_eps}'.encode())
+    return f'simulator:optics:{digest.hexdigest()}'
+
+
+def _optics_params(data):
+    return int(data.get('minPts', 5)), float(data.get('maxEps', 5.0))
+
+
+def _cluster_response(labels):
+    return {
+        'labels': labels.tolist(),
+        'n_clusters': int(labels.max() + 1) if len(labels) else 0,
+        'noise_ratio': float(np.mean(labels < 0)) if len(labels) else 0.0,
+    }
+
+
+@csrf_exempt
+def run_optics(request):
+    """
+    Computes the OPTICS reachability plot once and caches it, so that
+    /optics/extract/ can relabel for any eps <= maxEps instantly.
+    """
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            points = _request_points(data)
+            min_pts, max_eps = _optics_params(data)
+
+            key = _optics_key(points, min_pts, max_eps)
+            optics = cache.get(key)
+            threads = None
+            if optics is None:
+                with thread_budget(len(points)) as threads:
+                    optics = optics_reachability(points, min_pts, max_eps)
+                cache.set(key, optics, OPTICS_CACHE_TIMEOUT)
+
+            reach = optics['reachability'][optics['ordering']]
+            response = {
+                'success': True,
+                'optics_id': key.rsplit(':', 1)[-1],
+                'ordering': optics['ordering'].tolist(),
+                # Infinite reachability (cluster starts) is sent as null
+                'reachability': [float(r) if np.isfinite(r) else None for r in reach],
+                'threads': threads,
+            }
+            if data.get('eps') is not None:
+                response.update(_cluster_response(optics_extract_dbscan(optics, float(data['eps']))))
+            return JsonResponse(response)
+        except Exception as e:
+            return JsonResponse({'success': False, 'error': str(e)})
+
+    return JsonResponse({'success': False, 'error': 'Method not allowed'})
+
+
+@csrf_exempt
+def extract_optics(request):
+    """
+    DBSCAN-equivalent labels at a given eps from a cached OPTICS run.
+    If the cache entry expired and points are sent, OPTICS is recomputed.
+    """
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            eps = float(data.get('eps', 0.5))
+            optics = cache.get(f"simulator:optics:{data.get('optics_id', '')}")
+
+            if optics is None:
+                if not data.get('points') and not data.get('dataset_id'):
+                    return JsonResponse({'success': False, 'error': 'OPTICS result expired, run it again'})
+                points = _request_points(data)
+                min_pts, max_eps = _optics_params(data)
+                optics = optics_reachability(points, min_pts, max_eps)
+                cache.set(_optics_key(points, min_pts, max_eps), optics, OPTICS_CACHE_TIMEOUT)
+
+            return JsonResponse({'success': True, **_cluster_response(optics_extract_dbscan(optics, eps))})
+        except Exception as e:
+            return JsonResponse({'success': False, 'error': str(e)})
+
+    return JsonResponse({'success': False, 'error': 'Method not allowed'})
+
 # Legacy stubs
 @csrf_exempt
 def run_kmeans(request): return run_algorithm(request)
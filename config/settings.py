@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -140,3 +141,41 @@ LOGOUT_REDIRECT_URL = 'home'
 # Email Configuration (Development)
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 DEFAULT_FROM_EMAIL = 'Clustering Trainer <noreply@clustering-trainer.local>'
+
+# Clustering simulator engine
+# Memory one block of a distance matrix may take (apps/simulator/distances.py)
+SIMULATOR_DISTANCE_MEMORY_MB = int(os.getenv('SIMULATOR_DISTANCE_MEMORY_MB', '64'))
+# 'auto' computes in float32 from SIMULATOR_FLOAT32_MIN_N points on, else float64
+SIMULATOR_COMPUTE_DTYPE = os.getenv('SIMULATOR_COMPUTE_DTYPE', 'auto')
+SIMULATOR_FLOAT32_MIN_N = int(os.getenv('SIMULATOR_FLOAT32_MIN_N', '20000'))
+# Use the Numba-compiled kernels when numba is installed (optional dependency)
+SIMULATOR_JIT = os.getenv('SIMULATOR_JIT', 'True') == 'True'
+# Server worker processes sharing the cores (gunicorn reads WEB_CONCURRENCY too)
+SIMULATOR_WORKERS = int(os.getenv('SIMULATOR_WORKERS', os.getenv('WEB_CONCURRENCY', '1')))
+# Requests with at least this many points may borrow idle cores
+SIMULATOR_BORROW_MIN_N = int(os.getenv('SIMULATOR_BORROW_MIN_N', '20000'))
+# Background runs publish progress at most this often
+SIMULATOR_PROGRESS_INTERVAL_MS = int(os.getenv('SIMULATOR_PROGRESS_INTERVAL_MS', '250'))
+# Uploaded datasets: in-memory LRU per worker, .npy files shared by all workers
+SIMULATOR_DATASET_DIR = os.getenv('SIMULATOR_DATASET_DIR', '')
+SIMULATOR_DATASET_MEMORY_MB = int(os.getenv('SIMULATOR_DATASET_MEMORY_MB', '256'))
+SIMULATOR_DATASET_DISK_MB = int(os.getenv('SIMULATOR_DATASET_DISK_MB', '2048'))
+# Streaming dataset uploads (CSV / .npy / .npz)
+SIMULATOR_UPLOAD_MAX_MB = int(os.getenv('SIMULATOR_UPLOAD_MAX_MB', '50'))
+SIMULATOR_UPLOAD_MAX_POINTS = int(os.getenv('SIMULATOR_UPLOAD_MAX_POINTS', '1000000'))
+# Runs, their progress and derived results (linkages, OPTICS orderings) must be
+# visible to every server worker: Redis when SIMULATOR_REDIS_URL is set, else
+# files in SIMULATOR_CACHE_DIR (shared by the workers of one machine)
+SIMULATOR_REDIS_URL = os.getenv('SIMULATOR_REDIS_URL', '')
+SIMULATOR_CACHE_DIR = os.getenv('SIMULATOR_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'simulator-cache'))
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'simulator': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': SIMULATOR_REDIS_URL,
+    } if SIMULATOR_REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': SIMULATOR_CACHE_DIR,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
@@ -5,6 +5,11 @@
 
 const BASE_URL = '/simulator';
 
+// Animation frames kept per run; long runs are thinned on the server
+const MAX_FRAMES = 400;
+// Larger runs are computed in the background and polled for progress
+const BACKGROUND_MIN_POINTS = 2000;
+
 // Helper to get CSRF token from cookies
 function getCookie(name) {
     let cookieValue = null;
@@ -37,6 +42,35 @@ async function postData(endpoint, data) {
     return await response.json();
 }
 
+// Point sets are uploaded once (/dataset/) and then referenced by their id,
+// so repeated runs on the same points do not resend them
+let uploadedKey = null;
+let uploadedId = null;
+
+async function datasetIdFor(points, refresh = false) {
+    const key = JSON.stringify(points);
+    if (refresh || key !== uploadedKey) {
+        const result = await postData('/dataset/', { points: points });
+        if (!result.success) return result;
+        uploadedKey = key;
+        uploadedId = result.dataset_id;
+    }
+    return { success: true, dataset_id: uploadedId };
+}
+
+// POST with 'dataset_id' in place of 'points'; uploads again if the server pruned the dataset
+async function postWithDataset(endpoint, points, data) {
+    let dataset = await datasetIdFor(points);
+    if (!dataset.success) return dataset;
+    let result = await postData(endpoint, { ...data, dataset_id: dataset.dataset_id });
+    if (!result.success && /Unknown dataset/.test(result.error || '')) {
+        dataset = await datasetIdFor(points, true);
+        if (!dataset.success) return dataset;
+        result = await postData(endpoint, { ...data, dataset_id: dataset.dataset_id });
+    }
+    return result;
+}
+
 // Generic helper for GET requests
 async function getData(endpoint, params = {}) {
     const query = new URLSearchParams(params).toString();
@@ -50,13 +84,27 @@ async function getData(endpoint, params = {}) {
  * @param {Number} k - Number of clusters
  */
 export const runKMeans = async (points, k) => {
-    return await postData('/run/', {
+    return await postWithDataset('/run/', points, {
         algorithm: 'kmeans',
-        points: points,
+        max_frames: MAX_FRAMES,
+        background: points.length >= BACKGROUND_MIN_POINTS,
         params: { k: k }
     });
 };
 
+/**
+ * Elbow analysis for K-Means over k = 1..kMax
+ * @param {Array} points - List of {x, y} objects
+ * @param {Number} kMax - Largest k to try
+ * @param {Number} gapRefs - Reference datasets for the gap statistic (0 = off)
+ */
+export const runKMeansElbow = async (points, kMax, gapRefs = 0) => {
+    return await postWithDataset('/kmeans/elbow/', points, {
+        kMax: kMax,
+        gapRefs: gapRefs
+    });
+};
+
 /**
  * Run DBSCAN Algorithm
  * @param {Array} points - List of {x, y} objects
@@ -64,22 +112,62 @@ export const runKMeans = async (points, k) => {
  * @param {Number} minPts - Minimum points
  */
 export const runDBSCAN = async (points, eps, minPts) => {
-    return await postData('/run/', {
+    return await postWithDataset('/run/', points, {
         algorithm: 'dbscan',
-        points: points,
+        max_frames: MAX_FRAMES,
+        background: points.length >= BACKGROUND_MIN_POINTS,
         params: { eps: eps, minPts: minPts }
     });
 };
 
+/**
+ * Sweep DBSCAN over a grid of parameters
+ * @param {Array} points - List of {x, y} objects
+ * @param {Array} epsValues - Epsilon values to try
+ * @param {Array} minPtsValues - MinPts values to try
+ */
+export const sweepDBSCAN = async (points, epsValues, minPtsValues) => {
+    return await postWithDataset('/dbscan/sweep/', points, {
+        eps: epsValues,
+        minPts: minPtsValues
+    });
+};
+
+/**
+ * Compute OPTICS reachability plot (cached on the server)
+ * @param {Array} points - List of {x, y} objects
+ * @param {Number} minPts - Minimum points
+ * @param {Number} maxEps - Largest eps that can be extracted later
+ */
+export const runOptics = async (points, minPts, maxEps) => {
+    return await postWithDataset('/optics/', points, {
+        minPts: minPts,
+        maxEps: maxEps
+    });
+};
+
+/**
+ * Extract DBSCAN labels at eps from a cached OPTICS run
+ * @param {String} opticsId - Handle returned by runOptics
+ * @param {Number} eps - Epsilon radius (<= maxEps)
+ */
+export const extractOptics = async (opticsId, eps) => {
+    return await postData('/optics/extract/', {
+        optics_id: opticsId,
+        eps: eps
+    });
+};
+
 /**
  * Run FOREL Algorithm
  * @param {Array} points - List of {x, y} objects
  * @param {Number} radius - Sphere radius (R)
  */
 export const runForel = async (points, radius) => {
-    return await postData('/run/', {
+    return await postWithDataset('/run/', points, {
         algorithm: 'forel',
-        points: points,
+        max_frames: MAX_FRAMES,
+        background: points.length >= BACKGROUND_MIN_POINTS,
         params: { radius: radius }
     });
 };
@@ -88,12 +176,14 @@ export const runForel = async (points, radius) => {
  * Run Agglomerative (Hierarchical) Algorithm
  * @param {Array} points - List of {x, y} objects
  * @param {Number} k - Number of clusters
+ * @param {String} linkage - ward | single | average | complete
  */
-export const runAgglomerative = async (points, k) => {
-    return await postData('/run/', {
+export const runAgglomerative = async (points, k, linkage = 'ward') => {
+    return await postWithDataset('/run/', points, {
         algorithm: 'agglomerative',
-        points: points,
-        params: { k: k }
+        max_frames: MAX_FRAMES,
+        background: points.length >= BACKGROUND_MIN_POINTS,
+        params: { k: k, linkage: linkage }
     });
 };
 
@@ -103,13 +193,113 @@ export const runAgglomerative = async (points, k) => {
  * @param {Number} bandwidth - Bandwidth (radius)
  */
 export const runMeanShift = async (points, bandwidth) => {
-    return await postData('/run/', {
+    return await postWithDataset('/run/', points, {
         algorithm: 'meanshift',
-        points: points,
+        max_frames: MAX_FRAMES,
+        background: points.length >= BACKGROUND_MIN_POINTS,
         params: { bandwidth: bandwidth }
     });
 };
 
+/**
+ * Run BIRCH Algorithm
+ * @param {Array} points - List of {x, y} objects
+ * @param {Number} k - Number of clusters of the global step
+ * @param {Number} threshold - Subcluster radius (0 = chosen automatically)
+ */
+export const runBirch = async (points, k, threshold = 0) => {
+    return await postWithDataset('/run/', points, {
+        algorithm: 'birch',
+        max_frames: MAX_FRAMES,
+        background: points.length >= BACKGROUND_MIN_POINTS,
+        params: { k: k, threshold: threshold }
+    });
+};
+
+/**
+ * Run Spectral Clustering
+ * @param {Array} points - List of {x, y} objects
+ * @param {Number} k - Number of clusters
+ * @param {Number} neighbors - Neighbors per point in the affinity graph
+ */
+export const runSpectral = async (points, k, neighbors = 10) => {
+    return await postWithDataset('/run/', points, {
+        algorithm: 'spectral',
+        max_frames: MAX_FRAMES,
+        background: points.length >= BACKGROUND_MIN_POINTS,
+        params: { k: k, neighbors: neighbors }
+    });
+};
+
+/**
+ * Run Gaussian Mixture (EM) Algorithm
+ * @param {Array} points - List of {x, y} objects
+ * @param {Number} k - Number of components
+ * @param {String} covariance - full | diag | spherical
+ * @param {Boolean} soft - Also return each point's largest responsibility
+ */
+export const runGMM = async (points, k, covariance = 'full', soft = false) => {
+    return await postWithDataset('/run/', points, {
+        algorithm: 'gmm',
+        max_frames: MAX_FRAMES,
+        background: points.length >= BACKGROUND_MIN_POINTS,
+        params: { k: k, covariance: covariance, soft: soft }
+    });
+};
+
+/**
+ * Estimate MeanShift bandwidth and run several bandwidths at once
+ * @param {Array} points - List of {x, y} objects
+ * @param {Array} bandwidths - Bandwidths to try (empty = grid around the estimate)
+ */
+export const sweepMeanShift = async (points, bandwidths = []) => {
+    return await postWithDataset('/meanshift/sweep/', points, {
+        bandwidths: bandwidths
+    });
+};
+
+/**
+ * Run several algorithm configurations on the same points
+ * @param {Array} points - List of {x, y} objects
+ * @param {Array} runs - [{algorithm, params}], e.g. {algorithm: 'dbscan', params: {eps: 0.5, minPts: 4}}
+ */
+export const compareAlgorithms = async (points, runs) => {
+    return await postWithDataset('/compare/', points, {
+        runs: runs
+    });
+};
+
+/**
+ * Poll the progress of a background run
+ * @param {String} runId - Handle returned by /run/ with status 'running'
+ */
+export const getRunProgress = async (runId) => {
+    return await getData(`/run/${runId}/progress/`);
+};
+
+/**
+ * Fetch a page of steps of a stored run
+ * @param {String} runId - Handle returned by /run/
+ * @param {Number} from - First step (inclusive)
+ * @param {Number} to - Last step (exclusive)
+ */
+export const getRunSteps = async (runId, from, to) => {
+    return await getData(`/run/${runId}/steps/`, { from: from, to: to });
+};
+
+/**
+ * Re-cluster a stored run after adding/removing points
+ * @param {String} runId - Handle returned by /run/
+ * @param {Array} add - New points
+ * @param {Array} remove - Indices of points to delete
+ */
+export const updateRun = async (runId, add = [], remove = []) => {
+    return await postData(`/run/${runId}/update/`, {
+        add: add,
+        remove: remove
+    });
+};
+
 /**
  * Generate Preset Dataset
  * @param {String} name - Preset name (moons, blobs, circles)
@@ -119,12 +309,68 @@ export const generatePreset = async (name, samples = 100) => {
     return await getData('/preset/', { name: name, samples: samples });
 };
 
+/**
+ * Upload a CSV / .npy / .npz file; the server parses it while it streams in
+ * @param {File} file - File chosen by the user
+ * @param {String} columns - Comma-separated column names or indices ('' = first two)
+ */
+export const uploadDatasetFile = async (file, columns = '') => {
+    const query = new URLSearchParams({ columns: columns }).toString();
+    const response = await fetch(`${BASE_URL}/dataset/upload/?${query}`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/octet-stream',
+            'X-CSRFToken': getCookie('csrftoken')
+        },
+        body: file
+    });
+    return await response.json();
+};
+
+/**
+ * Get the points of a stored dataset
+ * @param {String} datasetId - Handle returned by uploadDatasetFile
+ */
+export const getDatasetPoints = async (datasetId) => {
+    return await getData(`/dataset/${datasetId}/`, { points: 1 });
+};
+
 /**
  * Get Dendrogram Data
  * @param {Array} points - List of {x, y} objects
+ * @param {String} linkage - ward | single | average | complete
+ */
+export const getDendrogram = async (points, linkage = 'ward') => {
+    return await postWithDataset('/dendrogram/', points, {
+        linkage: linkage
+    });
+};
+
+/**
+ * Expand a collapsed cluster of a dendrogram
+ * @param {String} dendrogramId - Handle returned by getDendrogram
+ * @param {Number} node - Node id of the collapsed cluster
+ * @param {Array} points - Points (sent as their dataset id), used to rebuild an expired linkage
+ * @param {String} linkage - ward | single | average | complete
+ */
+export const expandDendrogram = async (dendrogramId, node, points, linkage = 'ward') => {
+    return await postWithDataset('/dendrogram/expand/', points, {
+        dendrogram_id: dendrogramId,
+        node: node,
+        linkage: linkage
+    });
+};
+
+/**
+ * Get the density tile pyramid of a stored dataset
+ * @param {String} datasetId - Handle returned by uploadDatasetFile
+ * @param {Array} labels - Optional cluster label of every point
+ * @param {Number} maxZoom - Finest level: 2^maxZoom cells per side
  */
-export const getDendrogram = async (points) => {
-    return await postData('/dendrogram/', {
-        points: points
+export const getDensityTiles = async (datasetId, labels = null, maxZoom = 7) => {
+    return await postData('/tiles/', {
+        dataset_id: datasetId,
+        labels: labels,
+        maxZoom: maxZoom
     });
 };
@@ -1,8 +1,11 @@
-import { runKMeans, runDBSCAN, runForel, runAgglomerative, runMeanShift, generatePreset, getDendrogram } from './api.js?v=5.0';
-import { initPlot, drawPoints, drawStep, convertClickToPoint } from './plot.js?v=5.0';
+import { runKMeans, runDBSCAN, runForel, runAgglomerative, runMeanShift, runBirch, runSpectral, runGMM, generatePreset, uploadDatasetFile, getDatasetPoints, getDensityTiles, getDendrogram, expandDendrogram, getRunSteps, getRunProgress, updateRun } from './api.js?v=5.0';
+import { initPlot, drawPoints, drawStep, drawDensity, convertClickToPoint } from './plot.js?v=5.0';
 
 const { createApp, ref, onMounted, watch } = Vue;
 
+// Uploaded datasets larger than this are not drawn point by point
+const MAX_UPLOAD_POINTS = 20000;
+
 const app = createApp({
     setup() {
         // State
@@ -12,17 +15,99 @@ const app = createApp({
         const minPts = ref(3);
         const radius = ref(1.0); // FOREL radius
         const bandwidth = ref(1.0); // MeanShift bandwidth
+        const linkageMethod = ref('ward'); // Agglomerative linkage
+        const threshold = ref(0); // BIRCH subcluster radius, 0 = auto
+        const neighbors = ref(10); // Spectral kNN graph degree
+        const covarianceType = ref('full'); // GMM covariance: full | diag | spherical
+        const softLabels = ref(false); // GMM: shade points by responsibility
         const points = ref([]);
-        const history = ref([]);
+        const history = ref([]); // sparse: pages are fetched on demand
+        const runId = ref(null);
+        const metrics = ref(null);
         const currentStep = ref(0);
         const isRunning = ref(false);
+        const runProgress = ref(null); // progress of a background run
         const selectedPreset = ref('');
         const showDendrogram = ref(false);
+        const dendrogramId = ref(null);
+        const dendrogramStack = ref([]); // root view first, expanded subtrees after it
+
+        // Show a run returned by /run/ or /run/<id>/update/
+        const applyRun = (data) => {
+            // Only the first page and the final step come with the run
+            const steps = new Array(data.total_steps).fill(null);
+            data.history.forEach((step, i) => { steps[i] = step; });
+            if (data.final_step) steps[data.total_steps - 1] = data.final_step;
+            history.value = steps;
+            runId.value = data.run_id;
+            metrics.value = data.metrics || null;
+            // Auto-jump to the last step
+            currentStep.value = history.value.length - 1;
+            drawStep(points.value, history.value[currentStep.value]);
+        };
+
+        const PROGRESS_POLL_MS = 500;
+
+        // Background runs return only a handle: poll until the result is ready
+        const waitForRun = async (data) => {
+            while (data && data.success && data.status === 'running') {
+                await new Promise(resolve => setTimeout(resolve, PROGRESS_POLL_MS));
+                const progress = await getRunProgress(data.run_id);
+                if (!progress.success) return progress;
+                if (progress.status === 'done') return progress.result;
+                if (progress.status === 'error') return { success: false, error: progress.error };
+                runProgress.value = progress;
+            }
+            return data;
+        };
+
+        const progressLabel = () => {
+            const p = runProgress.value;
+            if (!p || p.fraction == null) return 'Выполняется...';
+            const eta = p.eta != null ? `, осталось ~${Math.ceil(p.eta)} с` : '';
+            return `Выполняется: ${Math.round(p.fraction * 100)}%${eta}`;
+        };
+
+        const nearestPointIndex = (point) => {
+            let best = -1, bestDist = Infinity;
+            points.value.forEach((p, i) => {
+                const d = (p[0] - point[0]) ** 2 + (p[1] - point[1]) ** 2;
+                if (d < bestDist) { best = i; bestDist = d; }
+            });
+            return best;
+        };
+
+        // After a run, clicks edit the points and re-cluster incrementally:
+        // click adds a point, Shift+click removes the nearest one
+        const editRun = async (point, removeNearest) => {
+            const remove = removeNearest ? [nearestPointIndex(point)] : [];
+            const add = removeNearest ? [] : [point];
+            if (removeNearest && remove[0] < 0) return;
+            isRunning.value = true;
+            try {
+                const data = await updateRun(runId.value, add, remove);
+                if (data.success) {
+                    if (removeNearest) points.value.splice(remove[0], 1);
+                    else points.value.push(point);
+                    applyRun(data);
+                } else {
+                    alert('Ошибка: ' + data.error);
+                }
+            } catch (e) {
+                console.error(e);
+                alert('Ошибка сервера');
+            } finally {
+                isRunning.value = false;
+            }
+        };
 
         // Actions
         const handleCanvasClick = (event) => {
-            if (history.value.length > 0) return;
             const point = convertClickToPoint(event);
+            if (history.value.length > 0) {
+                if (point && runId.value && !isRunning.value) editRun(point, event.shiftKey);
+                return;
+            }
             if (point) {
                 points.value.push(point);
                 drawPoints(points.value);
@@ -37,6 +122,52 @@ const app = createApp({
                 if (data.success) {
                     points.value = data.points;
                     history.value = [];
+                    runId.value = null;
+                    currentStep.value = 0;
+                    drawPoints(points.value);
+                } else {
+                    alert('Ошибка загрузки: ' + data.error);
+                }
+            } catch (e) {
+                console.error(e);
+                alert('Ошибка сервера');
+            } finally {
+                isRunning.value = false;
+            }
+        };
+
+        // Own data: the file is stored on the server, then its points are drawn
+        const uploadFile = async (event) => {
+            const file = event.target.files[0];
+            event.target.value = '';
+            if (!file) return;
+            isRunning.value = true;
+            try {
+                const uploaded = await uploadDatasetFile(file);
+                if (!uploaded.success) {
+                    alert('Ошибка загрузки: ' + uploaded.error);
+                    return;
+                }
+                if (uploaded.n_points > MAX_UPLOAD_POINTS) {
+                    // Too many markers to draw: show the density map instead
+                    const tiles = await getDensityTiles(uploaded.dataset_id);
+                    if (!tiles.success) {
+                        alert('Ошибка загрузки: ' + tiles.error);
+                        return;
+                    }
+                    points.value = [];
+                    history.value = [];
+                    runId.value = null;
+                    currentStep.value = 0;
+                    drawDensity(tiles);
+                    alert(`Слишком много точек для интерактивного запуска: ${uploaded.n_points} (максимум ${MAX_UPLOAD_POINTS}), показана карта плотности`);
+                    return;
+                }
+                const data = await getDatasetPoints(uploaded.dataset_id);
+                if (data.success) {
+                    points.value = data.points;
+                    history.value = [];
+                    runId.value = null;
                     currentStep.value = 0;
                     drawPoints(points.value);
                 } else {
@@ -61,16 +192,20 @@ const app = createApp({
                 } else if (algorithm.value === 'forel') {
                     data = await runForel(points.value, parseFloat(radius.value));
                 } else if (algorithm.value === 'agglomerative') {
-                    data = await runAgglomerative(points.value, k.value);
+                    data = await runAgglomerative(points.value, k.value, linkageMethod.value);
                 } else if (algorithm.value === 'meanshift') {
                     data = await runMeanShift(points.value, parseFloat(bandwidth.value));
+                } else if (algorithm.value === 'birch') {
+                    data = await runBirch(points.value, k.value, parseFloat(threshold.value) || 0);
+                } else if (algorithm.value === 'spectral') {
+                    data = await runSpectral(points.value, k.value, neighbors.value);
+                } else if (algorithm.value === 'gmm') {
+                    data = await runGMM(points.value, k.value, covarianceType.value, softLabels.value);
                 }
+                data = await waitForRun(data);
 
                 if (data && data.success) {
-                    history.value = data.history;
-                    // Auto-jump to the last step
-                    currentStep.value = history.value.length - 1;
-                    drawStep(points.value, history.value[currentStep.value]);
+                    applyRun(data);
                 } else {
                     alert('Ошибка: ' + (data ? data.error : 'Неизвестная ошибка'));
                 }
@@ -78,6 +213,7 @@ const app = createApp({
                 console.error(e);
                 alert('Ошибка сервера');
             } finally {
+                runProgress.value = null;
                 isRunning.value = false;
             }
         };
@@ -89,9 +225,11 @@ const app = createApp({
             }
             isRunning.value = true;
             try {
-                const data = await getDendrogram(points.value);
+                const data = await getDendrogram(points.value, linkageMethod.value);
                 if (data.success) {
                     showDendrogram.value = true;
+                    dendrogramId.value = data.dendrogram_id;
+                    dendrogramStack.value = [data.dendrogram];
                     // Render dendrogram in modal
                     setTimeout(() => {
                         renderDendrogram(data.dendrogram);
@@ -107,16 +245,39 @@ const app = createApp({
             }
         };
 
+        // Show the top merges under a collapsed cluster
+        const expandDendrogramNode = async (node) => {
+            try {
+                const data = await expandDendrogram(dendrogramId.value, node, points.value, linkageMethod.value);
+                if (data.success) {
+                    dendrogramStack.value.push(data.dendrogram);
+                    renderDendrogram(data.dendrogram);
+                } else {
+                    alert('Ошибка: ' + data.error);
+                }
+            } catch (e) {
+                console.error(e);
+                alert('Ошибка сервера');
+            }
+        };
+
+        const dendrogramBack = () => {
+            if (dendrogramStack.value.length < 2) return;
+            dendrogramStack.value.pop();
+            renderDendrogram(dendrogramStack.value[dendrogramStack.value.length - 1]);
+        };
+
         const renderDendrogram = (dendroData) => {
-            const { icoord, dcoord } = dendroData;
+            // Coordinates come packed flat: 4 values per link
+            const { icoord, dcoord, leaf_nodes, leaf_sizes } = dendroData;
             
             const traces = [];
 
             // Draw lines (Dendrogram branches) only - cleaner look
-            for (let i = 0; i < icoord.length; i++) {
+            for (let i = 0; i < icoord.length; i += 4) {
                 traces.push({
-                    x: icoord[i],
-                    y: dcoord[i],
+                    x: icoord.slice(i, i + 4),
+                    y: dcoord.slice(i, i + 4),
                     mode: 'lines',
                     line: { color: '#3b82f6', width: 2 }, // Blue lines
                     showlegend: false,
@@ -124,6 +285,20 @@ const app = createApp({
                 });
             }
 
+            // Collapsed clusters: click to expand
+            const collapsed = leaf_sizes.map((size, i) => i).filter(i => leaf_sizes[i] > 1);
+            traces.push({
+                name: 'collapsed',
+                x: collapsed.map(i => 10 * i + 5),
+                y: collapsed.map(() => 0),
+                customdata: collapsed.map(i => leaf_nodes[i]),
+                text: collapsed.map(i => `${leaf_sizes[i]} точек — нажмите, чтобы раскрыть`),
+                mode: 'markers',
+                marker: { color: '#f59e0b', size: collapsed.map(i => 6 + 2 * Math.log2(leaf_sizes[i])) },
+                showlegend: false,
+                hoverinfo: 'text'
+            });
+
             const layout = {
                 title: {
                     text: 'Дендрограмма',
@@ -148,7 +323,13 @@ const app = createApp({
                 }
             };
 
-            Plotly.newPlot('dendrogram-plot', traces, layout, { responsive: true, displayModeBar: false });
+            Plotly.newPlot('dendrogram-plot', traces, layout, { responsive: true, displayModeBar: false }).then(plot => {
+                plot.removeAllListeners('plotly_click');
+                plot.on('plotly_click', (event) => {
+                    const pt = event.points[0];
+                    if (pt.data.name === 'collapsed') expandDendrogramNode(pt.customdata);
+                });
+            });
         };
 
         const closeDendrogram = () => {
@@ -158,19 +339,38 @@ const app = createApp({
         const clearPoints = () => {
             points.value = [];
             history.value = [];
+            runId.value = null;
+            metrics.value = null;
             currentStep.value = 0;
             selectedPreset.value = '';
             initPlot();
         };
 
+        // Fetch the page containing step i if it has not been loaded yet
+        const STEP_PAGE_SIZE = 200;
+        const ensureStep = async (i) => {
+            if (history.value[i] || !runId.value) return history.value[i];
+            const from = Math.floor(i / STEP_PAGE_SIZE) * STEP_PAGE_SIZE;
+            const data = await getRunSteps(runId.value, from, from + STEP_PAGE_SIZE);
+            if (!data.success) {
+                console.error(data.error);
+                return null;
+            }
+            data.history.forEach((step, j) => { history.value[data.from + j] = step; });
+            return history.value[i];
+        };
+
         // Navigation
         const nextStep = () => { if (currentStep.value < history.value.length - 1) currentStep.value++; };
         const prevStep = () => { if (currentStep.value > 0) currentStep.value--; };
         const setStep = (val) => { currentStep.value = val; };
 
         // Watchers
-        watch(currentStep, (newVal) => { 
-            if (history.value.length > 0) drawStep(points.value, history.value[newVal]); 
+        watch(currentStep, async (newVal) => { 
+            if (history.value.length === 0) return;
+            const step = await ensureStep(newVal);
+            // Skip stale pages if the slider moved on while fetching
+            if (step && currentStep.value === newVal) drawStep(points.value, step);
         });
         watch(algorithm, () => { clearPoints(); });
         watch(selectedPreset, () => { if (selectedPreset.value) loadPreset(); });
@@ -180,9 +380,9 @@ const app = createApp({
         });
 
         return {
-            algorithm, k, eps, minPts, radius, bandwidth, points, history, currentStep, isRunning,
-            selectedPreset, loadPreset, showDendrogram,
-            runAlgorithm, nextStep, prevStep, setStep, clearPoints, handleCanvasClick,
+            algorithm, k, eps, minPts, radius, bandwidth, linkageMethod, threshold, neighbors, covarianceType, softLabels, points, history, metrics, currentStep, isRunning,
+            selectedPreset, loadPreset, uploadFile, showDendrogram, dendrogramStack, dendrogramBack,
+            runAlgorithm, progressLabel, nextStep, prevStep, setStep, clearPoints, handleCanvasClick,
             viewDendrogram, closeDendrogram
         };
     }
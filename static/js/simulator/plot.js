@@ -1,5 +1,8 @@
 const PLOT_ID = 'plot';
 
+// Centroids come as {x, y} objects, points as [x, y] pairs
+const coord = (c, axis) => (c.x !== undefined ? [c.x, c.y][axis] : c[axis]);
+
 const getBaseLayout = () => ({
     title: false,
     paper_bgcolor: 'rgba(0,0,0,0)',
@@ -44,11 +47,20 @@ export function drawStep(points, stepData) {
     if (!stepData) return;
     const traces = [];
     const colors = ['#ef4444', '#3b82f6', '#10b981', '#f59e0b', '#8b5cf6', '#ec4899'];
+    // Spectral: the step carrying the embedding is drawn in embedding
+    // coordinates (unit-length rows), scaled into the canvas
+    const embedded = stepData.embedding && stepData.embedding.length > 0;
+    if (embedded) {
+        points = stepData.embedding.map(e => [5 + 4.5 * e[0], 5 + 4.5 * e[1]]);
+    }
 
     if (stepData.labels) {
         const maxLabel = Math.max(...stepData.labels);
         const clusters = Array.from({ length: maxLabel + 1 }, () => []);
         const noise = [];
+        // GMM soft labels: each point's largest responsibility sets its opacity
+        const confidence = stepData.confidence && stepData.confidence.length > 0 ? stepData.confidence : null;
+        const opacities = Array.from({ length: maxLabel + 1 }, () => []);
         
         points.forEach((point, index) => {
             const label = stepData.labels[index];
@@ -56,6 +68,7 @@ export function drawStep(points, stepData) {
                 noise.push(point);
             } else if (clusters[label]) {
                 clusters[label].push(point);
+                if (confidence) opacities[label].push(confidence[index]);
             }
         });
 
@@ -80,16 +93,33 @@ export function drawStep(points, stepData) {
                     mode: 'markers',
                     type: 'scatter',
                     name: `Cluster ${i+1}`,
-                    marker: { size: 10, color: colors[i % colors.length] }
+                    marker: { size: 10, color: colors[i % colors.length], opacity: confidence ? opacities[i] : 1 }
                 });
             }
         });
     }
 
-    if (stepData.centroids && stepData.centroids.length > 0) {
+    // GMM: two-sigma ellipse of every component from its semi-axes
+    if (stepData.axes && stepData.axes.length > 0 && stepData.centroids) {
+        stepData.centroids.forEach((c, j) => {
+            const [a, b] = [stepData.axes[2 * j], stepData.axes[2 * j + 1]];
+            const angles = Array.from({ length: 49 }, (_, t) => (2 * Math.PI * t) / 48);
+            traces.push({
+                x: angles.map(t => coord(c, 0) + 2 * (Math.cos(t) * a[0] + Math.sin(t) * b[0])),
+                y: angles.map(t => coord(c, 1) + 2 * (Math.cos(t) * a[1] + Math.sin(t) * b[1])),
+                mode: 'lines',
+                type: 'scatter',
+                showlegend: false,
+                hoverinfo: 'none',
+                line: { color: colors[j % colors.length], width: 2, dash: 'dot' }
+            });
+        });
+    }
+
+    if (stepData.centroids && stepData.centroids.length > 0 && !embedded) {
         traces.push({
-            x: stepData.centroids.map(c => c[0]),
-            y: stepData.centroids.map(c => c[1]),
+            x: stepData.centroids.map(c => coord(c, 0)),
+            y: stepData.centroids.map(c => coord(c, 1)),
             mode: 'markers',
             type: 'scatter',
             name: 'Centroids',
@@ -100,6 +130,33 @@ export function drawStep(points, stepData) {
     Plotly.react(PLOT_ID, traces, getBaseLayout(), { displayModeBar: false });
 }
 
+export function drawDensity(tiles) {
+    // Finest level as a heatmap; empty cells stay transparent
+    const level = tiles.levels[tiles.levels.length - 1];
+    const [xMin, xMax, yMin, yMax] = tiles.extent;
+    const z = Array.from({ length: level.size }, () => new Array(level.size).fill(null));
+    level.count.forEach((count, c) => {
+        z[level.j[c]][level.i[c]] = Math.log10(count + 1);
+    });
+    const trace = {
+        z: z,
+        x0: xMin + (xMax - xMin) / level.size / 2,
+        dx: (xMax - xMin) / level.size,
+        y0: yMin + (yMax - yMin) / level.size / 2,
+        dy: (yMax - yMin) / level.size,
+        type: 'heatmap',
+        colorscale: 'Viridis',
+        showscale: false,
+        name: 'Density',
+        hoverinfo: 'none'
+    };
+    // The axes follow the tiles' extent, not the 10×10 canvas
+    const layout = getBaseLayout();
+    layout.xaxis.range = [xMin, xMax];
+    layout.yaxis.range = [yMin, yMax];
+    Plotly.react(PLOT_ID, [trace], layout, { displayModeBar: false });
+}
+
 export function convertClickToPoint(event) {
     const plotDiv = document.getElementById(PLOT_ID);
     if (!plotDiv || !plotDiv._fullLayout) return null;